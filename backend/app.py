@@ -1,20 +1,30 @@
 # Run this file with: python app.py
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-import sqlite3
 import hashlib
 from datetime import datetime
 from models.user import User
 from models.trip import Trip
 from models.stop import Stop, StopType
+from services.route_optimizer import RouteOptimizer, METRICS, DEFAULT_TIME_BUDGET_MS
+from services.trip_service import TripService, TRIP_SEARCH_DEFAULT_LIMIT
+from services.admin_service import AdminService
+from services.stop_service import StopService
+from services.spatial_service import SpatialService, SPATIAL_DEFAULT_LIMIT
+from utils import db, migrations
+from utils.etag import listing_etag, not_modified, tag, trip_etag
+from utils.json_stream import streamed_response
 
 try:
-    from services.maps_service import MapsService
+    from services.maps_service import MapsService, GEOCODE_BATCH_LIMIT
+    from services.plan_service import PlanService
     MAPS_SERVICE_AVAILABLE = True
 except ValueError:
     MAPS_SERVICE_AVAILABLE = False
     MapsService = None
+    PlanService = None
+    GEOCODE_BATCH_LIMIT = 0
 
 app = Flask(__name__)
 # Enable CORS for all origins (including file://)
@@ -25,11 +35,6 @@ app.register_blueprint(trips_bp)
 app.register_blueprint(budget_bp)
 
 # Database helper functions
-def get_db_connection():
-    conn = sqlite3.connect('database.db')
-    conn.row_factory = sqlite3.Row
-    return conn
-
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
@@ -87,63 +92,20 @@ def admin_login():
 
 @app.route('/api/admin/users', methods=['GET'])
 def get_all_users():
-    """Get all users with their trips"""
+    """
+    Get users with their trips, streamed as JSON
+    
+    Query params: after_id and limit for keyset pagination (all users when
+    limit is omitted), email to filter by substring, min_trips to filter by
+    trip count.
+    """
     try:
-        conn = sqlite3.connect('database.db')
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # Get all users
-        users = cursor.execute('SELECT id, email FROM users ORDER BY id').fetchall()
-        
-        users_data = []
-        for user in users:
-            user_id = user['id']
-            user_email = user['email']
-            
-            # Get all trips for this user
-            trips = cursor.execute(
-                'SELECT id, name, description, image_url, created_at FROM trips WHERE user_id = ? ORDER BY created_at DESC',
-                (user_id,)
-            ).fetchall()
-            
-            trips_data = []
-            for trip in trips:
-                # Get stops for this trip
-                stops = cursor.execute(
-                    'SELECT latitude, longitude, stop_type, time_minutes, cost FROM stops WHERE trip_id = ? ORDER BY stop_order',
-                    (trip['id'],)
-                ).fetchall()
-                
-                trips_data.append({
-                    'trip_id': trip['id'],
-                    'name': trip['name'],
-                    'description': trip['description'],
-                    'image_url': trip['image_url'],
-                    'created_at': trip['created_at'],
-                    'stops': [
-                        {
-                            'latitude': s['latitude'],
-                            'longitude': s['longitude'],
-                            'type': s['stop_type'],
-                            'time': s['time_minutes'],
-                            'cost': s['cost']
-                        } for s in stops
-                    ],
-                    'total_cost': sum(s['cost'] for s in stops)
-                })
-            
-            users_data.append({
-                'user_id': user_id,
-                'email': user_email,
-                'trips': trips_data,
-                'trip_count': len(trips_data)
-            })
-        
-        conn.close()
-        return jsonify({'users': users_data}), 200
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        options = AdminService.parse_query(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return Response(stream_with_context(AdminService.stream_users_json(**options)),
+                    mimetype='application/json')
 
 @app.route('/api/trips/save', methods=['POST'])
 def save_trip():
@@ -195,21 +157,62 @@ def save_trip():
 
 @app.route('/api/trips/user/<int:user_id>', methods=['GET'])
 def get_user_trips(user_id):
-    """Get all trips for a specific user"""
+    """
+    One page of a user's trips, newest first
+    
+    Query params: cursor (next_cursor from the previous page), limit,
+    fields (comma separated listing fields), include=stops and stream=1
+    (chunked response, same JSON).
+    """
     try:
-        trips = Trip.get_user_trips(user_id)
-        trips_data = [trip.to_dict() for trip in trips]
-        return jsonify({'trips': trips_data}), 200
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        options = TripService.parse_listing_query(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    etag = listing_etag(user_id, TripService.user_version(user_id), request.args)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    
+    result = TripService.get_user_trips(user_id, id_key='trip_id', **options)
+    status = result.pop('status', 200)
+    if status != 200:
+        return jsonify(result), status
+    response = streamed_response(result) if options['stream'] else jsonify(result)
+    return tag(response, etag), status
+
+@app.route('/api/trips/search', methods=['GET'])
+def search_trips():
+    """Full-text search over trip names and descriptions, best match first"""
+    try:
+        result = TripService.search_trips(
+            request.args.get('q', ''),
+            user_id=request.args.get('user_id', type=int),
+            limit=int(request.args.get('limit', TRIP_SEARCH_DEFAULT_LIMIT)),
+            offset=int(request.args.get('offset', 0))
+        )
+        return jsonify(result), 200 if result['success'] else 400
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
 
 @app.route('/api/trips/<int:trip_id>', methods=['GET'])
 def get_trip(trip_id):
-    """Get a specific trip by ID"""
+    """Get a specific trip by ID (304 without loading stops if the client's ETag is current; stream=1 to stream)"""
     try:
+        version = TripService.trip_version(trip_id)
+        if version is None:
+            return jsonify({'error': 'Trip not found'}), 404
+        cached = not_modified(request, trip_etag(trip_id, version))
+        if cached:
+            return cached
+        
         trip = Trip.get_from_db(trip_id)
         if trip:
-            return jsonify({'trip': trip.to_dict()}), 200
+            if request.args.get('stream') == '1':
+                response = streamed_response({'trip': trip.to_dict(lazy_stops=True)})
+            else:
+                response = jsonify({'trip': trip.to_dict()})
+            return tag(response, trip_etag(trip_id, trip.version)), 200
         else:
             return jsonify({'error': 'Trip not found'}), 404
     except Exception as e:
@@ -228,6 +231,12 @@ def get_trip_directions(trip_id):
         if len(trip.stops) < 2:
             return jsonify({'error': 'At least two stops are required to get directions'}), 400
         
+        try:
+            fields = MapsService.parse_fields(request.args.get('fields'))
+            zoom = request.args.get('zoom', type=float)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         origin = trip.stops[0].get_location()
         destination = trip.stops[-1].get_location()
         waypoints = [stop.get_location() for stop in trip.stops[1:-1]]
@@ -236,10 +245,119 @@ def get_trip_directions(trip_id):
         if directions is None:
             return jsonify({'error': 'Unroutable location'}), 404
         
-        return jsonify({'directions': directions}), 200
+        return jsonify({'directions': MapsService.project_directions(directions, fields, zoom)}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+
+@app.route('/api/trips/<int:trip_id>/stops', methods=['POST'])
+def add_stop(trip_id):
+    """Add a stop to a trip at an optional position"""
+    data = request.get_json(silent=True) or {}
+    result = StopService.add_stop(trip_id, data, data.get('version'))
+    status = result.pop('status', 201)
+    return jsonify(result), status
+
+@app.route('/api/stops/<int:stop_id>', methods=['PATCH'])
+def edit_stop(stop_id):
+    """Move a stop (position) and/or change its location, type, time or cost"""
+    data = request.get_json(silent=True) or {}
+    result = StopService.edit_stop(stop_id, data, data.get('version'))
+    status = result.pop('status', 200)
+    return jsonify(result), status
+
+@app.route('/api/stops/<int:stop_id>', methods=['DELETE'])
+def delete_stop(stop_id):
+    """Delete a single stop; the remaining stops keep their order"""
+    data = request.get_json(silent=True) or {}
+    result = StopService.delete_stop(stop_id, data.get('version', request.args.get('version')))
+    status = result.pop('status', 200)
+    return jsonify(result), status
+
+
+@app.route('/api/stops/nearby', methods=['GET'])
+def nearby_stops():
+    """Saved stops (or trips, with group=trips) within radius_km of lat,lng, nearest first"""
+    try:
+        result = SpatialService.nearby(
+            float(request.args['lat']),
+            float(request.args['lng']),
+            float(request.args.get('radius_km', 25)),
+            limit=int(request.args.get('limit', SPATIAL_DEFAULT_LIMIT)),
+            user_id=request.args.get('user_id', type=int),
+            group=request.args.get('group')
+        )
+        return jsonify(result), 200
+    except KeyError as e:
+        return jsonify({'success': False, 'error': f"Missing query parameter: {e.args[0]}"}), 400
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/stops/within', methods=['GET'])
+def stops_within():
+    """Saved stops (or trips, with group=trips) inside a south/west/north/east viewport"""
+    try:
+        result = SpatialService.within(
+            float(request.args['south']),
+            float(request.args['west']),
+            float(request.args['north']),
+            float(request.args['east']),
+            limit=int(request.args.get('limit', SPATIAL_DEFAULT_LIMIT)),
+            user_id=request.args.get('user_id', type=int),
+            group=request.args.get('group')
+        )
+        return jsonify(result), 200
+    except KeyError as e:
+        return jsonify({'success': False, 'error': f"Missing query parameter: {e.args[0]}"}), 400
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/trips/<int:trip_id>/optimize', methods=['POST'])
+def optimize_trip(trip_id):
+    """Reorder a trip's intermediate stops to minimize distance or duration"""
+    try:
+        data = request.get_json(silent=True) or {}
+        metric = data.get('metric', 'distance')
+        time_budget_ms = data.get('time_budget_ms', DEFAULT_TIME_BUDGET_MS)
+        apply = data.get('apply', False)
+        
+        if metric not in METRICS:
+            return jsonify({'error': f"metric must be one of {', '.join(METRICS)}"}), 400
+        
+        trip = Trip.get_from_db(trip_id)
+        if not trip:
+            return jsonify({'error': 'Trip not found'}), 404
+        # The order is computed from this copy of the trip, so it is only
+        # applied while the trip is still at the same version
+        version = data.get('version')
+        if version is not None and int(version) != trip.version:
+            return jsonify({'error': 'Trip was changed by another edit; reload it and try again',
+                            'version': trip.version}), 409
+        
+        coordinates = [stop.get_location() for stop in trip.stops]
+        result = RouteOptimizer.optimize(coordinates, metric, int(time_budget_ms))
+        stops = [trip.stops[index].to_dict() for index in result['order']]
+        
+        applied = False
+        version = trip.version
+        if apply and result['order'] != list(range(len(coordinates))):
+            saved = TripService.reorder_stops(trip_id, result['order'], trip.version)
+            if not saved['success']:
+                status = saved.pop('status', 500)
+                return jsonify(saved), status
+            applied = True
+            version = saved['version']
+        
+        return jsonify({**result, 'success': True, 'stops': stops, 'applied': applied, 'version': version}), 200
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
     
 @app.route('/api/maps/geocode', methods=['POST'])
 def geocode_address():
@@ -260,6 +378,28 @@ def geocode_address():
             return jsonify({'error': 'Geocoding failed'}), 500
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@app.route('/api/maps/geocode/batch', methods=['POST'])
+def geocode_addresses():
+    # Geocode a list of addresses in one request; results come back in input order
+    try:
+        if not MAPS_SERVICE_AVAILABLE:
+            return jsonify({'error': 'Maps service is not configured. Please set GOOGLE_MAPS_API_KEY in .env'}), 503
+        
+        data = request.get_json()
+        addresses = data.get('addresses')
+        if not isinstance(addresses, list) or not addresses:
+            return jsonify({'error': 'A list of addresses is required'}), 400
+        if len(addresses) > GEOCODE_BATCH_LIMIT:
+            return jsonify({'error': f'At most {GEOCODE_BATCH_LIMIT} addresses per request'}), 400
+        
+        results = MapsService.geocode_batch(addresses)
+        return jsonify({
+            'results': results,
+            'resolved': sum(1 for result in results if 'error' not in result)
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
     
 @app.route('/api/maps/reverse_geocode', methods=['POST'])
 def reverse_geocode():
@@ -299,14 +439,83 @@ def get_directions():
         if not origin or not destination:
             return jsonify({'error': 'Origin and destination are required'}), 400
         
+        # Optional: fields to return instead of the raw route, and a zoom level to simplify the polyline for
+        try:
+            fields = MapsService.parse_fields(data.get('fields'))
+            zoom = float(data['zoom']) if data.get('zoom') is not None else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         directions = MapsService.get_directions(origin, destination, waypoints, mode)
 
         if directions is None:
             return jsonify({'error': 'Unroutable location'}), 404
 
-        return jsonify({'directions': directions}), 200
+        return jsonify({'directions': MapsService.project_directions(directions, fields, zoom)}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/maps/cache', methods=['GET'])
+def get_maps_cache_stats():
+    # Hit/miss counters for the maps caches and upstream latency per endpoint
+    if not MAPS_SERVICE_AVAILABLE:
+        return jsonify({'error': 'Maps service is not configured. Please set GOOGLE_MAPS_API_KEY in .env'}), 503
+    return jsonify(MapsService.cache_stats()), 200
+
+@app.route('/api/maps/cache', methods=['DELETE'])
+def clear_maps_cache():
+    # Drop cached directions, either one route (same body as /api/maps/directions) or all of them
+    try:
+        if not MAPS_SERVICE_AVAILABLE:
+            return jsonify({'error': 'Maps service is not configured. Please set GOOGLE_MAPS_API_KEY in .env'}), 503
+        
+        data = request.get_json(silent=True) or {}
+        origin = data.get('origin')
+        destination = data.get('destination')
+        
+        if origin and destination:
+            MapsService.invalidate_directions(origin, destination,
+                                              data.get('waypoints'), data.get('mode', 'driving'))
+        else:
+            MapsService.clear_directions_cache()
+        
+        return jsonify({'message': 'Directions cache cleared'}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/plan/sessions', methods=['POST'])
+def create_plan_session():
+    # Start a plan session from the map's stops; returns route and budget together
+    try:
+        if not MAPS_SERVICE_AVAILABLE:
+            return jsonify({'error': 'Maps service is not configured. Please set GOOGLE_MAPS_API_KEY in .env'}), 503
+        
+        data = request.get_json(silent=True) or {}
+        result = PlanService.create_session(data.get('stops'), data.get('mode', 'driving'), data.get('zoom'))
+        status = result.pop('status', 200)
+        return jsonify(result), status
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/plan/sessions/<session_id>', methods=['PATCH', 'DELETE'])
+def update_plan_session(session_id):
+    # PATCH applies stop changes (one op, or {"ops": [...]}) and returns the updated plan
+    try:
+        if not MAPS_SERVICE_AVAILABLE:
+            return jsonify({'error': 'Maps service is not configured. Please set GOOGLE_MAPS_API_KEY in .env'}), 503
+        
+        if request.method == 'DELETE':
+            result = PlanService.delete_session(session_id)
+        else:
+            data = request.get_json(silent=True) or {}
+            ops = data.get('ops') if 'ops' in data else [data]
+            result = PlanService.apply_ops(session_id, ops, data.get('revision'), data.get('zoom'))
+        status = result.pop('status', 200)
+        return jsonify(result), status
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
+    migrations.migrate()
+    migrations.check_query_plans()
     app.run(host='0.0.0.0', port=5001, debug=True)
@@ -0,0 +1,84 @@
+# Benchmark - directions payload size and encode time, raw route vs projected/simplified
+# Run with: python benchmarks/bench_directions_payload.py
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.maps_service import MapsService
+from utils import polyline
+
+
+def synthetic_route(points=20000, legs=10, seed=1):
+    """
+    A cross-country route shaped like a Directions API response
+
+    The overview polyline wanders from San Francisco to New York, and every
+    leg carries steps with their own polylines and instructions, which is
+    what makes real responses large.
+    """
+    rng = np.random.default_rng(seed)
+    lat = np.linspace(37.77, 40.71, points) + np.cumsum(rng.normal(0, 0.002, points))
+    lng = np.linspace(-122.42, -74.01, points) + np.cumsum(rng.normal(0, 0.002, points))
+    path = list(zip(lat.round(5).tolist(), lng.round(5).tolist()))
+
+    route_legs = []
+    for leg_path in np.array_split(np.arange(points), legs):
+        steps = []
+        for step_path in np.array_split(leg_path, 40):
+            step_points = [path[i] for i in step_path]
+            steps.append({
+                'distance': {'text': '10 km', 'value': 10000},
+                'duration': {'text': '7 mins', 'value': 420},
+                'html_instructions': 'Continue onto <b>Interstate 80 E</b>',
+                'polyline': {'points': polyline.encode(step_points)},
+                'start_location': {'lat': step_points[0][0], 'lng': step_points[0][1]},
+                'end_location': {'lat': step_points[-1][0], 'lng': step_points[-1][1]},
+                'travel_mode': 'DRIVING'
+            })
+        start, end = path[leg_path[0]], path[leg_path[-1]]
+        route_legs.append({
+            'distance': {'text': '460 km', 'value': 460000},
+            'duration': {'text': '5 hours', 'value': 18000},
+            'start_location': {'lat': start[0], 'lng': start[1]},
+            'end_location': {'lat': end[0], 'lng': end[1]},
+            'steps': steps
+        })
+
+    encoded = polyline.encode(path)
+    return {
+        'route': {'legs': route_legs, 'overview_polyline': {'points': encoded}, 'summary': 'I-80 E'},
+        'polyline': encoded,
+        'total_distance': 460000 * legs,
+        'total_duration': 18000 * legs
+    }
+
+
+def measure(directions, fields, zoom, repeat=5):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        payload = json.dumps({'directions': MapsService.project_directions(directions, fields, zoom)})
+    elapsed_ms = (time.perf_counter() - started) / repeat * 1000
+    return len(payload.encode()), elapsed_ms
+
+
+def main():
+    directions = synthetic_route()
+    full_size, full_ms = measure(directions, None, None)
+    print(f"{'variant':<40}{'bytes':>12}{'vs raw':>10}{'ms':>10}")
+    print(f"{'raw route (current response)':<40}{full_size:>12,}{'100.0%':>10}{full_ms:>10.1f}")
+
+    map_fields = ['polyline', 'total_distance', 'total_duration']
+    variants = [('fields=polyline,totals', map_fields, None)]
+    variants += [(f'fields=polyline,totals zoom={zoom}', map_fields, zoom) for zoom in (4, 8, 12, 16)]
+    for name, fields, zoom in variants:
+        size, ms = measure(directions, fields, zoom)
+        print(f"{name:<40}{size:>12,}{size / full_size:>10.1%}{ms:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
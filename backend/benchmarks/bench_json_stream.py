@@ -0,0 +1,103 @@
+# Benchmark - peak RSS and time to first byte, jsonify vs ?stream=1, on large trip payloads
+# Run with: python benchmarks/bench_json_stream.py [--stops 200000]
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def build_database(path, stops, listing_trips, listing_stops):
+    """
+    One user with a single trip of `stops` stops, and a second user with
+    listing_trips trips of listing_stops stops each
+    """
+    from init_trips_db import init_database
+    from models.stop import RANK_GAP
+    from utils import db
+
+    db.configure(path)
+    init_database()
+    with db.transaction() as conn:
+        trips = [(1, 'Cross-country survey', 'Every rest area on the way')]
+        trips += [(2, f"Weekend trip {index}", 'Road trip') for index in range(listing_trips)]
+        conn.executemany('INSERT INTO trips (user_id, name, description) VALUES (?, ?, ?)', trips)
+        trip_ids = [row[0] for row in conn.execute('SELECT id FROM trips ORDER BY id')]
+
+        def rows(trip_id, count):
+            for index in range(count):
+                yield (trip_id, 30.0 + index * 1e-4, -97.0 - index * 1e-4, 'FOOD', 15, index % 50 + 0.25,
+                       (index + 1) * RANK_GAP)
+
+        insert = '''INSERT INTO stops (trip_id, latitude, longitude, stop_type, time_minutes, cost, stop_order)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)'''
+        conn.executemany(insert, rows(trip_ids[0], stops))
+        for trip_id in trip_ids[1:]:
+            conn.executemany(insert, rows(trip_id, listing_stops))
+    return trip_ids[0]
+
+
+def measure(url):
+    """Run in a child process: request url once and report TTFB, total time and RSS growth"""
+    sys.path.insert(0, os.path.dirname(BACKEND_DIR))
+    import simple_server
+
+    client = simple_server.app.test_client()
+    client.get('/api/health')
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    started = time.perf_counter()
+    response = client.get(url, buffered=False)
+    chunks = iter(response.response)
+    size = len(next(chunks))
+    first_byte = time.perf_counter() - started
+    for chunk in chunks:
+        size += len(chunk)
+    total = time.perf_counter() - started
+    response.close()
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'ttfb_ms': first_byte * 1000, 'total_ms': total * 1000,
+                      'rss_mb': (peak_kb - baseline_kb) / 1024, 'bytes': size}))
+
+
+def run(url, database):
+    output = subprocess.run([sys.executable, __file__, '--child', url], check=True, capture_output=True,
+                            text=True, env={**os.environ, 'DATABASE_PATH': database}).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stops', type=int, default=200000, help='stops in the single large trip')
+    parser.add_argument('--listing-trips', type=int, default=200)
+    parser.add_argument('--listing-stops', type=int, default=500)
+    parser.add_argument('--child')
+    args = parser.parse_args()
+    if args.child:
+        return measure(args.child)
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, 'bench.db')
+        trip_id = build_database(database, args.stops, args.listing_trips, args.listing_stops)
+        cases = [
+            (f"trip with {args.stops:,} stops", f"/api/trips/{trip_id}"),
+            (f"listing {args.listing_trips}x{args.listing_stops} stops",
+             f"/api/trips/user/2?include=stops&limit={args.listing_trips}"),
+        ]
+        print(f"{'payload':<32}{'variant':<12}{'MB':>8}{'TTFB ms':>10}{'total ms':>10}{'peak RSS MB':>13}")
+        for name, url in cases:
+            for variant, query in (('jsonify', ''), ('stream=1', '&stream=1' if '?' in url else '?stream=1')):
+                result = run(url + query, database)
+                print(f"{name:<32}{variant:<12}{result['bytes'] / 1e6:>8.1f}{result['ttfb_ms']:>10.1f}"
+                      f"{result['total_ms']:>10.1f}{result['rss_mb']:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
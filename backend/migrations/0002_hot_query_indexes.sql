@@ -0,0 +1,7 @@
+-- Indexes for the hot lookups, which were full table scans
+
+-- A user's trips, newest first (trip listing, admin dashboard)
+CREATE INDEX IF NOT EXISTS idx_trips_user_created ON trips (user_id, created_at);
+
+-- A trip's stops in order (trip load, per-trip stop deletes, reordering)
+CREATE INDEX IF NOT EXISTS idx_stops_trip_order ON stops (trip_id, stop_order);
@@ -0,0 +1,74 @@
+-- Per-trip totals kept up to date by triggers, so listings never read stops
+
+CREATE TABLE IF NOT EXISTS trip_summary (
+    trip_id INTEGER PRIMARY KEY REFERENCES trips(id) ON DELETE CASCADE,
+    stop_count INTEGER NOT NULL DEFAULT 0,
+    total_cost REAL NOT NULL DEFAULT 0,
+    total_time INTEGER NOT NULL DEFAULT 0,
+    min_latitude REAL,
+    min_longitude REAL,
+    max_latitude REAL,
+    max_longitude REAL,
+    last_modified TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Backfill trips that already exist
+INSERT OR REPLACE INTO trip_summary
+    (trip_id, stop_count, total_cost, total_time, min_latitude, min_longitude, max_latitude, max_longitude)
+SELECT trips.id, COUNT(stops.id), COALESCE(SUM(stops.cost), 0), COALESCE(SUM(stops.time_minutes), 0),
+       MIN(stops.latitude), MIN(stops.longitude), MAX(stops.latitude), MAX(stops.longitude)
+FROM trips LEFT JOIN stops ON stops.trip_id = trips.id
+GROUP BY trips.id;
+
+CREATE TRIGGER IF NOT EXISTS trip_summary_trip_insert AFTER INSERT ON trips BEGIN
+    INSERT OR IGNORE INTO trip_summary (trip_id) VALUES (NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trip_summary_trip_update AFTER UPDATE OF name, description, image_url ON trips BEGIN
+    UPDATE trip_summary SET last_modified = CURRENT_TIMESTAMP WHERE trip_id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trip_summary_trip_delete AFTER DELETE ON trips BEGIN
+    DELETE FROM trip_summary WHERE trip_id = OLD.id;
+END;
+
+-- Inserts are applied incrementally
+CREATE TRIGGER IF NOT EXISTS trip_summary_stop_insert AFTER INSERT ON stops BEGIN
+    INSERT INTO trip_summary
+        (trip_id, stop_count, total_cost, total_time, min_latitude, min_longitude, max_latitude, max_longitude)
+    VALUES (NEW.trip_id, 1, NEW.cost, NEW.time_minutes, NEW.latitude, NEW.longitude, NEW.latitude, NEW.longitude)
+    ON CONFLICT (trip_id) DO UPDATE SET
+        stop_count = stop_count + 1,
+        total_cost = total_cost + NEW.cost,
+        total_time = total_time + NEW.time_minutes,
+        min_latitude = MIN(COALESCE(min_latitude, NEW.latitude), NEW.latitude),
+        min_longitude = MIN(COALESCE(min_longitude, NEW.longitude), NEW.longitude),
+        max_latitude = MAX(COALESCE(max_latitude, NEW.latitude), NEW.latitude),
+        max_longitude = MAX(COALESCE(max_longitude, NEW.longitude), NEW.longitude),
+        last_modified = CURRENT_TIMESTAMP;
+END;
+
+-- Updates and deletes recompute from the trip's stops (an index range scan),
+-- since a bounding box cannot be shrunk incrementally
+CREATE TRIGGER IF NOT EXISTS trip_summary_stop_update
+AFTER UPDATE OF trip_id, latitude, longitude, time_minutes, cost, stop_order ON stops BEGIN
+    UPDATE trip_summary SET
+        (stop_count, total_cost, total_time, min_latitude, min_longitude, max_latitude, max_longitude) = (
+            SELECT COUNT(*), COALESCE(SUM(cost), 0), COALESCE(SUM(time_minutes), 0),
+                   MIN(latitude), MIN(longitude), MAX(latitude), MAX(longitude)
+            FROM stops WHERE stops.trip_id = trip_summary.trip_id
+        ),
+        last_modified = CURRENT_TIMESTAMP
+    WHERE trip_id IN (OLD.trip_id, NEW.trip_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trip_summary_stop_delete AFTER DELETE ON stops BEGIN
+    UPDATE trip_summary SET
+        (stop_count, total_cost, total_time, min_latitude, min_longitude, max_latitude, max_longitude) = (
+            SELECT COUNT(*), COALESCE(SUM(cost), 0), COALESCE(SUM(time_minutes), 0),
+                   MIN(latitude), MIN(longitude), MAX(latitude), MAX(longitude)
+            FROM stops WHERE stops.trip_id = OLD.trip_id
+        ),
+        last_modified = CURRENT_TIMESTAMP
+    WHERE trip_id = OLD.trip_id;
+END;
@@ -0,0 +1,50 @@
+-- Sparse stop ranks and a trip version for optimistic concurrency
+
+-- A move only changes stop_order, which leaves the totals as they were:
+-- the summary trigger is recreated below without stop_order, and a move
+-- only touches last_modified instead of re-aggregating the trip's stops
+DROP TRIGGER IF EXISTS trip_summary_stop_update;
+
+-- Spread existing dense orders (0, 1, 2, ...) out by RANK_GAP (models/stop.py)
+-- so a stop can be inserted or moved between two others by writing one row.
+-- Only trips whose orders are still dense are rescaled, so a re-run leaves
+-- sparse ranks alone
+UPDATE stops SET stop_order = (stop_order + 1) * 1024
+WHERE trip_id IN (SELECT trip_id FROM stops GROUP BY trip_id HAVING MAX(stop_order) < COUNT(*));
+
+-- Bumped by the triggers below on every change to a trip or its stops;
+-- editors send the version they loaded and get a conflict if it moved on.
+-- migrate() skips this if trips.version already exists
+ALTER TABLE trips ADD COLUMN version INTEGER NOT NULL DEFAULT 0;
+
+CREATE TRIGGER IF NOT EXISTS trip_version_trip_update AFTER UPDATE OF name, description, image_url ON trips BEGIN
+    UPDATE trips SET version = version + 1 WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trip_version_stop_insert AFTER INSERT ON stops BEGIN
+    UPDATE trips SET version = version + 1 WHERE id = NEW.trip_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trip_version_stop_update AFTER UPDATE ON stops BEGIN
+    UPDATE trips SET version = version + 1 WHERE id IN (OLD.trip_id, NEW.trip_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trip_version_stop_delete AFTER DELETE ON stops BEGIN
+    UPDATE trips SET version = version + 1 WHERE id = OLD.trip_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trip_summary_stop_update
+AFTER UPDATE OF trip_id, latitude, longitude, time_minutes, cost ON stops BEGIN
+    UPDATE trip_summary SET
+        (stop_count, total_cost, total_time, min_latitude, min_longitude, max_latitude, max_longitude) = (
+            SELECT COUNT(*), COALESCE(SUM(cost), 0), COALESCE(SUM(time_minutes), 0),
+                   MIN(latitude), MIN(longitude), MAX(latitude), MAX(longitude)
+            FROM stops WHERE stops.trip_id = trip_summary.trip_id
+        ),
+        last_modified = CURRENT_TIMESTAMP
+    WHERE trip_id IN (OLD.trip_id, NEW.trip_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trip_summary_stop_move AFTER UPDATE OF stop_order ON stops BEGIN
+    UPDATE trip_summary SET last_modified = CURRENT_TIMESTAMP WHERE trip_id = NEW.trip_id;
+END;
@@ -0,0 +1,28 @@
+-- R*Tree over stop coordinates for bounding-box and radius lookups
+
+-- Each stop is a degenerate box (a point). R*Tree stores 32-bit floats and
+-- rounds boxes outward, so callers re-check exact coordinates from stops
+CREATE VIRTUAL TABLE IF NOT EXISTS stops_rtree USING rtree(
+    id,
+    min_latitude, max_latitude,
+    min_longitude, max_longitude
+);
+
+INSERT OR REPLACE INTO stops_rtree (id, min_latitude, max_latitude, min_longitude, max_longitude)
+SELECT id, latitude, latitude, longitude, longitude FROM stops;
+
+CREATE TRIGGER IF NOT EXISTS stops_rtree_insert AFTER INSERT ON stops BEGIN
+    INSERT OR REPLACE INTO stops_rtree (id, min_latitude, max_latitude, min_longitude, max_longitude)
+    VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+END;
+
+CREATE TRIGGER IF NOT EXISTS stops_rtree_update AFTER UPDATE OF latitude, longitude ON stops BEGIN
+    UPDATE stops_rtree SET
+        min_latitude = NEW.latitude, max_latitude = NEW.latitude,
+        min_longitude = NEW.longitude, max_longitude = NEW.longitude
+    WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS stops_rtree_delete AFTER DELETE ON stops BEGIN
+    DELETE FROM stops_rtree WHERE id = OLD.id;
+END;
@@ -0,0 +1,27 @@
+-- Full-text index over trip names and descriptions
+
+-- External-content table: the text stays in trips and the index holds only
+-- terms. Prefix indexes make two- and three-letter prefix queries cheap
+CREATE VIRTUAL TABLE IF NOT EXISTS trips_fts USING fts5(
+    name,
+    description,
+    content = 'trips',
+    content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+INSERT INTO trips_fts (trips_fts) VALUES ('rebuild');
+
+CREATE TRIGGER IF NOT EXISTS trips_fts_insert AFTER INSERT ON trips BEGIN
+    INSERT INTO trips_fts (rowid, name, description) VALUES (NEW.id, NEW.name, NEW.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trips_fts_update AFTER UPDATE OF name, description ON trips BEGIN
+    INSERT INTO trips_fts (trips_fts, rowid, name, description) VALUES ('delete', OLD.id, OLD.name, OLD.description);
+    INSERT INTO trips_fts (rowid, name, description) VALUES (NEW.id, NEW.name, NEW.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trips_fts_delete AFTER DELETE ON trips BEGIN
+    INSERT INTO trips_fts (trips_fts, rowid, name, description) VALUES ('delete', OLD.id, OLD.name, OLD.description);
+END;
@@ -0,0 +1,28 @@
+-- Per-user version counter for conditional GETs of the trip listing
+
+-- Bumped by the triggers below on every change to any of a user's trips.
+-- Stop changes bump trips.version (0004), which is itself a trips update,
+-- so they reach this counter too.
+CREATE TABLE IF NOT EXISTS user_versions (
+    user_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO user_versions (user_id, version)
+SELECT user_id, 1 FROM trips GROUP BY user_id;
+
+CREATE TRIGGER IF NOT EXISTS user_version_trip_insert AFTER INSERT ON trips BEGIN
+    INSERT INTO user_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_version_trip_update AFTER UPDATE ON trips BEGIN
+    INSERT INTO user_versions (user_id, version) VALUES (NEW.user_id, 1)
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+    UPDATE user_versions SET version = version + 1
+    WHERE user_id = OLD.user_id AND OLD.user_id != NEW.user_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS user_version_trip_delete AFTER DELETE ON trips BEGIN
+    UPDATE user_versions SET version = version + 1 WHERE user_id = OLD.user_id;
+END;
@@ -2,6 +2,10 @@
 
 from enum import Enum
 
+# Spacing between consecutive stop_order ranks; leaves room to insert or
+# move a stop between two others by writing a single row
+RANK_GAP = 1024
+
 class StopType(Enum):
     FOOD = "images/Road Runner.png" #Going to be filepaths for images later
     REST = "images/Road Runner.png" #relative from frontend folder
@@ -10,6 +14,8 @@ class StopType(Enum):
     MISC = "images/Road Runner.png"
 
 class Stop:
+    __slots__ = ('location', 'type', 'time', 'cost')
+
     def __init__(self, location, type, time=0, cost=0):
         self.location = location #lat/lng tuple
         self.type = type  # Should be of type StopType
@@ -0,0 +1,119 @@
+# Stop array - columnar storage for the stops of one or many trips
+import numpy as np
+from models.stop import Stop, StopType
+from utils.geo import leg_distances
+
+# stop_type names in code order; several StopType names are aliases of one member
+STOP_TYPE_NAMES = tuple(StopType.__members__)
+STOP_TYPE_CODES = {name: code for code, name in enumerate(STOP_TYPE_NAMES)}
+
+
+def _minutes(value):
+    """time column value back to the int the stops table holds (float if fractional)"""
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+class StopArray:
+    """
+    Stops held as parallel NumPy columns instead of one Stop object each
+
+    A stop costs about 33 bytes here against several hundred as a Stop
+    with a location tuple, and totals, bounds and leg distances are single
+    vectorized passes. Indexing with an int builds a Stop; slicing returns
+    a StopArray that shares the columns.
+
+    Totals are summed in order (cumsum) so they equal the Python loops in
+    Trip to the last bit, and values come back typed as SQLite returns them
+    (time an int, cost a float), so to_dict output does not change.
+    """
+
+    __slots__ = ('latitude', 'longitude', 'time', 'cost', 'type_code')
+
+    def __init__(self, latitude=(), longitude=(), time=(), cost=(), type_code=()):
+        self.latitude = np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.asarray(longitude, dtype=np.float64)
+        self.time = np.asarray(time, dtype=np.float64)
+        self.cost = np.asarray(cost, dtype=np.float64)
+        self.type_code = np.asarray(type_code, dtype=np.uint8)
+
+    @staticmethod
+    def from_rows(rows):
+        """
+        Build from stops rows (latitude, longitude, stop_type, time_minutes, cost)
+
+        Raises:
+            KeyError: for a stop_type that is not a StopType name
+        """
+        if not rows:
+            return StopArray()
+        columns = np.array([(row['latitude'], row['longitude'], row['time_minutes'] or 0, row['cost'] or 0)
+                            for row in rows], dtype=np.float64)
+        return StopArray(columns[:, 0], columns[:, 1], columns[:, 2], columns[:, 3],
+                         [STOP_TYPE_CODES[row['stop_type']] for row in rows])
+
+    @staticmethod
+    def from_stops(stops):
+        """Build from Stop objects"""
+        if not stops:
+            return StopArray()
+        columns = np.array([(stop.location[0], stop.location[1], stop.time or 0, stop.cost or 0)
+                            for stop in stops], dtype=np.float64)
+        return StopArray(columns[:, 0], columns[:, 1], columns[:, 2], columns[:, 3],
+                         [STOP_TYPE_CODES[stop.type.name] for stop in stops])
+
+    def __len__(self):
+        return len(self.latitude)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return StopArray(self.latitude[index], self.longitude[index], self.time[index],
+                             self.cost[index], self.type_code[index])
+        return Stop(
+            location=(float(self.latitude[index]), float(self.longitude[index])),
+            type=StopType[STOP_TYPE_NAMES[self.type_code[index]]],
+            time=_minutes(self.time[index]),
+            cost=float(self.cost[index])
+        )
+
+    def __iter__(self):
+        return iter(self.to_stops())
+
+    def to_stops(self):
+        """List of Stop objects, one per row"""
+        return [self[index] for index in range(len(self))]
+
+    def iter_dicts(self, batch_size=1024):
+        """Yield Stop.to_dict() of each row without building the Stop objects"""
+        images = [StopType[name].value for name in STOP_TYPE_NAMES]
+        for start in range(0, len(self), batch_size):
+            end = start + batch_size
+            for latitude, longitude, time, cost, code in zip(
+                    self.latitude[start:end].tolist(), self.longitude[start:end].tolist(),
+                    self.time[start:end].tolist(), self.cost[start:end].tolist(),
+                    self.type_code[start:end].tolist()):
+                yield {'location': (latitude, longitude), 'image': images[code],
+                       'time': _minutes(time), 'cost': cost}
+
+    def coordinates(self):
+        """(n, 2) array of (lat, lng)"""
+        return np.column_stack((self.latitude, self.longitude))
+
+    def total_time(self):
+        return _minutes(np.cumsum(self.time)[-1]) if len(self) else 0
+
+    def total_cost(self):
+        return float(np.cumsum(self.cost)[-1]) if len(self) else 0
+
+    def bounds(self):
+        """(south, west, north, east) around all stops, or None without stops"""
+        if not len(self):
+            return None
+        return (float(self.latitude.min()), float(self.longitude.min()),
+                float(self.latitude.max()), float(self.longitude.max()))
+
+    def leg_distances(self, circuity=1.0):
+        """Great-circle distance in km from each stop to the next"""
+        if len(self) < 2:
+            return np.zeros(0)
+        return leg_distances(self.coordinates(), circuity)
@@ -1,16 +1,58 @@
 # Trip model - defines trip data structure and methods
-import sqlite3
+import os
 from datetime import datetime
+from models.stop import RANK_GAP
+from models.stop_array import StopArray
+from utils import db
+from utils.cache import VersionedCache
+
+# trip_summary columns, maintained by triggers (migrations/0003_trip_summary.sql)
+SUMMARY_COLUMNS = ('stop_count', 'total_cost', 'total_time', 'min_latitude', 'min_longitude',
+                   'max_latitude', 'max_longitude', 'last_modified')
+SUMMARY_SELECT = ', '.join(f"trip_summary.{column}" for column in SUMMARY_COLUMNS)
+
+TRIP_CACHE_MAX_ENTRIES = int(os.getenv('TRIP_CACHE_MAX_ENTRIES', 1024))
+# Set with several worker processes (e.g. gunicorn): every cache hit is then
+# checked against trips.version, so another worker's writes are never missed
+TRIP_CACHE_VALIDATE = os.getenv('TRIP_CACHE_VALIDATE', '0') == '1'
 
 class Trip:
     def __init__(self, user_id=None, trip_id=None, name="Unnamed Trip", description="No description", image_url=""):
         self.trip_id = trip_id
         self.user_id = user_id
-        self.stops = []
+        # Stops loaded from the database stay in columns (_stop_array) until
+        # something needs Stop objects; then the list becomes the only copy
+        self._stops = []
+        self._stop_array = None
         self.name = name
         self.description = description
         self.image_url = image_url
         self.created_at = None
+        self.version = None
+
+    @property
+    def stops(self):
+        """List of Stop objects, built from the loaded columns on first access"""
+        if self._stops is None:
+            self._stops = self._stop_array.to_stops()
+            self._stop_array = None
+        return self._stops
+
+    @stops.setter
+    def stops(self, stops):
+        self._stops = list(stops)
+        self._stop_array = None
+
+    def set_stop_array(self, stop_array):
+        """Replace the stops with columnar ones (see StopArray)"""
+        self._stop_array = stop_array
+        self._stops = None
+
+    def stop_array(self):
+        """The stops as a StopArray, for vectorized computations"""
+        if self._stop_array is not None:
+            return self._stop_array
+        return StopArray.from_stops(self._stops)
 
     def add_stop(self, stop):
         self.stops.append(stop)
@@ -45,24 +87,48 @@ class Trip:
         self.image_url = image_url
 
     def total_stops(self):
+        if self._stop_array is not None:
+            return len(self._stop_array)
         return len(self.stops)
     
     def total_time(self):
+        if self._stop_array is not None:
+            return self._stop_array.total_time()
         total = 0
         for stop in self.stops:
             total += stop.get_time()
         return total
 
     def total_cost(self):
+        if self._stop_array is not None:
+            return self._stop_array.total_cost()
         total = 0
         for stop in self.stops:
             total += stop.get_cost()
         return total
     
+    def bounds(self):
+        """(south, west, north, east) around the stops, or None without stops"""
+        return self.stop_array().bounds()
+    
+    def leg_distances(self, circuity=1.0):
+        """Great-circle distance in km between consecutive stops"""
+        return self.stop_array().leg_distances(circuity)
+    
     def sum_time(self):
         pass
 
-    def to_dict(self):
+    def iter_stop_dicts(self):
+        """Yield each stop's to_dict(), straight from the columns when they are loaded"""
+        if self._stop_array is not None:
+            return self._stop_array.iter_dicts()
+        return (stop.to_dict() for stop in self._stops)
+
+    def to_dict(self, lazy_stops=False):
+        """
+        Args:
+            lazy_stops: Give stops as a generator (for utils.json_stream) instead of a list
+        """
         trip_dict = {
             'trip_id': self.trip_id,
             'user_id': self.user_id,
@@ -70,7 +136,8 @@ class Trip:
             'description': self.description,
             'image_url': self.image_url,
             'created_at': self.created_at,
-            'stops': [stop.to_dict() for stop in self.stops],
+            'version': self.version,
+            'stops': self.iter_stop_dicts() if lazy_stops else [stop.to_dict() for stop in self.stops],
             'total_cost': self.total_cost()
         }
         return trip_dict
@@ -78,98 +145,140 @@ class Trip:
     def save_to_db(self):
         """Save trip and all its stops to database"""
         try:
-            conn = sqlite3.connect('database.db')
-            cursor = conn.cursor()
-            
-            # Insert trip
-            cursor.execute('''
-                INSERT INTO trips (user_id, name, description, image_url)
-                VALUES (?, ?, ?, ?)
-            ''', (self.user_id, self.name, self.description, self.image_url))
-            
-            trip_id = cursor.lastrowid
-            self.trip_id = trip_id
-            
-            # Insert all stops
-            for index, stop in enumerate(self.stops):
+            with db.transaction() as conn:
+                cursor = conn.cursor()
+                
+                # Insert trip
                 cursor.execute('''
+                    INSERT INTO trips (user_id, name, description, image_url)
+                    VALUES (?, ?, ?, ?)
+                ''', (self.user_id, self.name, self.description, self.image_url))
+                
+                trip_id = cursor.lastrowid
+                
+                # Insert all stops
+                cursor.executemany('''
                     INSERT INTO stops (trip_id, latitude, longitude, stop_type, time_minutes, cost, stop_order)
                     VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (trip_id, stop.location[0], stop.location[1], stop.type.name, 
-                      stop.time, stop.cost, index))
+                ''', [(trip_id, stop.location[0], stop.location[1], stop.type.name,
+                       stop.time, stop.cost, (index + 1) * RANK_GAP) for index, stop in enumerate(self.stops)])
             
-            conn.commit()
-            conn.close()
+            invalidate_trip(trip_id)
+            self.trip_id = trip_id
             return {'success': True, 'trip_id': trip_id}
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
     @staticmethod
     def get_from_db(trip_id):
-        """Get a specific trip by ID"""
+        """
+        Get a specific trip by ID
+        
+        Served from trip_cache after the first load; the caller gets its own
+        copy and may change it freely.
+        """
+        return trip_cache.get_or_load(_cache_key(trip_id), lambda: Trip.load_from_db(trip_id))
+    
+    @staticmethod
+    def load_from_db(trip_id):
+        """Get a specific trip by ID straight from the database"""
         try:
-            conn = sqlite3.connect('database.db')
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            # Get trip
-            trip_row = cursor.execute('SELECT * FROM trips WHERE id = ?', (trip_id,)).fetchone()
-            if not trip_row:
-                return None
-            
-            trip = Trip(
-                user_id=trip_row['user_id'],
-                trip_id=trip_row['id'],
-                name=trip_row['name'],
-                description=trip_row['description'],
-                image_url=trip_row['image_url']
-            )
-            trip.created_at = trip_row['created_at']
+            with db.connection() as conn:
+                # Get trip
+                trip_row = conn.execute('SELECT * FROM trips WHERE id = ?', (trip_id,)).fetchone()
+                if not trip_row:
+                    return None
+                
+                # Get stops for this trip
+                stops_rows = conn.execute(
+                    'SELECT * FROM stops WHERE trip_id = ? ORDER BY stop_order', 
+                    (trip_id,)
+                ).fetchall()
             
-            # Get stops for this trip
-            stops_rows = cursor.execute(
-                'SELECT * FROM stops WHERE trip_id = ? ORDER BY stop_order', 
-                (trip_id,)
-            ).fetchall()
+            trip = Trip.from_row(trip_row)
+            trip.set_stop_array(StopArray.from_rows(stops_rows))
             
-            for stop_row in stops_rows:
-                # Import Stop here to avoid circular imports
-                from models.stop import Stop, StopType
-                stop = Stop(
-                    location=(stop_row['latitude'], stop_row['longitude']),
-                    type=StopType[stop_row['stop_type']],
-                    time=stop_row['time_minutes'],
-                    cost=stop_row['cost']
-                )
-                trip.add_stop(stop)
-            
-            conn.close()
             return trip
         except Exception as e:
             print(f"Error getting trip from DB: {e}")
             return None
+    
+    @staticmethod
+    def stored_version(trip_id):
+        """Current trips.version of a trip, or None if it does not exist"""
+        with db.connection() as conn:
+            row = conn.execute('SELECT version FROM trips WHERE id = ?', (trip_id,)).fetchone()
+        return row['version'] if row else None
 
     @staticmethod
-    def get_user_trips(user_id):
-        """Get all trips for a specific user"""
-        try:
-            conn = sqlite3.connect('database.db')
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            trips_rows = cursor.execute(
-                'SELECT * FROM trips WHERE user_id = ? ORDER BY created_at DESC', 
-                (user_id,)
-            ).fetchall()
-            
-            trips = []
-            for trip_row in trips_rows:
-                trip = Trip.get_from_db(trip_row['id'])
-                if trip:
-                    trips.append(trip)
-            
-            conn.close()
-            return trips
-        except Exception as e:
-            print(f"Error getting user trips: {e}")
-            return []
+    def from_row(trip_row):
+        """Build a Trip (without stops) from a trips row"""
+        trip = Trip(
+            user_id=trip_row['user_id'],
+            trip_id=trip_row['id'],
+            name=trip_row['name'],
+            description=trip_row['description'],
+            image_url=trip_row['image_url']
+        )
+        trip.created_at = trip_row['created_at']
+        trip.version = trip_row['version'] if 'version' in trip_row.keys() else None
+        return trip
+
+    @staticmethod
+    def stop_from_row(stop_row):
+        """Build a Stop from a stops row"""
+        # Import Stop here to avoid circular imports
+        from models.stop import Stop, StopType
+        return Stop(
+            location=(stop_row['latitude'], stop_row['longitude']),
+            type=StopType[stop_row['stop_type']],
+            time=stop_row['time_minutes'],
+            cost=stop_row['cost']
+        )
+
+    @staticmethod
+    def summary_from_row(row):
+        """
+        Totals for a trip from a row that includes the SUMMARY_SELECT columns
+        
+        Returns:
+            Dictionary with stop_count, total_cost, total_time, bounds
+            (Google-style southwest/northeast, None without stops) and last_modified
+        """
+        bounds = None
+        if row['min_latitude'] is not None:
+            bounds = {
+                'southwest': {'lat': row['min_latitude'], 'lng': row['min_longitude']},
+                'northeast': {'lat': row['max_latitude'], 'lng': row['max_longitude']}
+            }
+        return {
+            'stop_count': row['stop_count'] or 0,
+            'total_cost': round(row['total_cost'] or 0, 2),
+            'total_time': row['total_time'] or 0,
+            'bounds': bounds,
+            'last_modified': row['last_modified']
+        }
+
+    @staticmethod
+    def listing_from_row(row):
+        """Plain dictionary of a trips row joined with trip_summary, with its totals"""
+        listing = {key: row[key] for key in row.keys() if key not in SUMMARY_COLUMNS}
+        listing.update(Trip.summary_from_row(row))
+        return listing
+
+
+def _cache_key(trip_id):
+    # The database path is part of the key so pointing db at another file
+    # (as the tests do) never serves trips from the previous one
+    return (db.DATABASE_PATH, int(trip_id))
+
+
+trip_cache = VersionedCache(
+    TRIP_CACHE_MAX_ENTRIES,
+    version_of=(lambda key: Trip.stored_version(key[1])) if TRIP_CACHE_VALIDATE else None
+)
+
+
+def invalidate_trip(trip_id):
+    """Drop a trip from trip_cache; call once the write to it has committed"""
+    trip_cache.invalidate(_cache_key(trip_id))
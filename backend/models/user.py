@@ -2,6 +2,7 @@
 from flask import jsonify
 import sqlite3
 import hashlib
+from utils import db
 
 class User:
     def __init__(self, email, password):
@@ -18,13 +19,9 @@ class User:
 
     def save_to_db(self):
             try:
-                conn = sqlite3.connect('database.db')
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                cursor.execute('INSERT INTO users (email, password) VALUES (?, ?)', 
-                      (self.email, self.password))
-                conn.commit()
-                conn.close()
+                with db.transaction() as conn:
+                    conn.execute('INSERT INTO users (email, password) VALUES (?, ?)', 
+                          (self.email, self.password))
                 return jsonify({'message': 'User registered successfully'}), 201
             except sqlite3.IntegrityError:
                 return jsonify({'error': 'Email already exists'}), 400
@@ -34,12 +31,9 @@ class User:
     @staticmethod
     def get_from_db(email, password):
         try:
-            conn = sqlite3.connect('database.db')
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            user = cursor.execute('SELECT * FROM users WHERE email = ? AND password = ?', 
-                                (email, User.hash_password(password))).fetchone()
-            conn.close()
+            with db.connection() as conn:
+                user = conn.execute('SELECT * FROM users WHERE email = ? AND password = ?', 
+                                    (email, User.hash_password(password))).fetchone()
             
             if user:
                 return jsonify({
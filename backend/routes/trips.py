@@ -1,6 +1,8 @@
 # Trip routes - handles trip creation, retrieval, updates, and deletion
 from flask import request, jsonify, Blueprint
 from services.trip_service import TripService
+from utils.etag import listing_etag, not_modified, tag, trip_etag
+from utils.json_stream import streamed_response
 
 trips_bp = Blueprint('trips', __name__, url_prefix='/api/trips')
 
@@ -32,12 +34,19 @@ def save_trip():
 
 @trips_bp.route('/<int:trip_id>', methods=['GET'])
 def get_trip(trip_id):
-    """Get a specific trip by ID"""
+    """Get a specific trip by ID (304 without loading stops if the client's ETag is current; stream=1 to stream)"""
     try:
-        result = TripService.get_trip(trip_id)
+        version = TripService.trip_version(trip_id)
+        cached = version is not None and not_modified(request, trip_etag(trip_id, version))
+        if cached:
+            return cached
+        
+        stream = request.args.get('stream') == '1'
+        result = TripService.get_trip(trip_id, stream=stream)
         
         if result['success']:
-            return jsonify(result), 200
+            response = streamed_response(result) if stream else jsonify(result)
+            return tag(response, trip_etag(trip_id, result['trip']['version'])), 200
         else:
             return jsonify(result), 404
     except Exception as e:
@@ -45,16 +54,29 @@ def get_trip(trip_id):
 
 @trips_bp.route('/user/<int:user_id>', methods=['GET'])
 def get_user_trips(user_id):
-    """Get all trips for a specific user"""
+    """
+    One page of a user's trips, newest first
+    
+    Query params: cursor (next_cursor from the previous page), limit,
+    fields (comma separated listing fields), include=stops and stream=1
+    (chunked response, same JSON).
+    """
     try:
-        result = TripService.get_user_trips(user_id)
-        
-        if result['success']:
-            return jsonify(result), 200
-        else:
-            return jsonify(result), 400
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        options = TripService.parse_listing_query(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    etag = listing_etag(user_id, TripService.user_version(user_id), request.args)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    
+    result = TripService.get_user_trips(user_id, id_key='trip_id', **options)
+    status = result.pop('status', 200)
+    if status != 200:
+        return jsonify(result), status
+    response = streamed_response(result) if options['stream'] else jsonify(result)
+    return tag(response, etag), status
 
 @trips_bp.route('/<int:trip_id>', methods=['PUT'])
 def update_trip(trip_id):
@@ -0,0 +1,182 @@
+# Admin service - paginated, streamed user listing for the admin dashboard
+import os
+from models.trip import Trip, SUMMARY_SELECT
+from utils import db
+from utils.json_stream import stream_json
+
+ADMIN_BATCH_SIZE = int(os.getenv('ADMIN_BATCH_SIZE', 200))
+ADMIN_MAX_PAGE_SIZE = int(os.getenv('ADMIN_MAX_PAGE_SIZE', 1000))
+
+
+class AdminService:
+
+    @staticmethod
+    def parse_query(args):
+        """
+        Read the listing options from request query parameters
+
+        Args:
+            args: Mapping with optional after_id, limit, email, min_trips and stops (0 to omit stops)
+
+        Returns:
+            Keyword arguments for stream_users_json
+
+        Raises:
+            ValueError: if a parameter is not a valid number
+        """
+        options = {'after_id': int(args.get('after_id', 0))}
+        if args.get('limit'):
+            limit = int(args['limit'])
+            if not 1 <= limit <= ADMIN_MAX_PAGE_SIZE:
+                raise ValueError(f"limit must be between 1 and {ADMIN_MAX_PAGE_SIZE}")
+            options['limit'] = limit
+        if args.get('email'):
+            options['email'] = args['email']
+        if args.get('min_trips'):
+            options['min_trips'] = int(args['min_trips'])
+        if args.get('stops') in ('0', 'false'):
+            options['include_stops'] = False
+        return options
+
+    @staticmethod
+    def get_stats():
+        """Total users, trips and stops"""
+        with db.connection() as conn:
+            row = conn.execute('''
+                SELECT (SELECT COUNT(*) FROM users) AS total_users,
+                       (SELECT COUNT(*) FROM trips) AS total_trips,
+                       (SELECT COALESCE(SUM(stop_count), 0) FROM trip_summary) AS total_stops
+            ''').fetchone()
+        return dict(row)
+
+    @staticmethod
+    def iter_users(after_id=0, limit=None, email=None, min_trips=None, include_stops=True,
+                   batch_size=ADMIN_BATCH_SIZE):
+        """
+        Yield users with their trips and stops in id order
+
+        Users are read in keyset batches (id > last id seen), and each batch
+        costs three queries whatever its size: users, their trips with totals
+        from trip_summary, and those trips' stops (skipped when include_stops
+        is False). A pooled connection is only held while a batch loads.
+
+        Args:
+            after_id: Only users with a larger id
+            limit: Maximum number of users; None for all
+            email: Case-insensitive substring the email must contain
+            min_trips: Only users with at least this many trips
+            include_stops: Include each trip's stops, not just its totals
+            batch_size: Users loaded per round of queries
+        """
+        filters = ''
+        filter_params = []
+        if email:
+            filters += " AND email LIKE ? ESCAPE '\\'"
+            escaped = email.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            filter_params.append(f"%{escaped}%")
+        if min_trips:
+            filters += ' AND (SELECT COUNT(*) FROM trips WHERE trips.user_id = users.id) >= ?'
+            filter_params.append(min_trips)
+
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            users = AdminService._load_batch(after_id, size, filters, filter_params, include_stops)
+            if not users:
+                return
+            for user in users:
+                yield user
+            after_id = users[-1]['user_id']
+            if remaining is not None:
+                remaining -= len(users)
+            if len(users) < size:
+                return
+
+    @staticmethod
+    def _load_batch(after_id, size, filters, filter_params, include_stops):
+        with db.connection() as conn:
+            user_rows = conn.execute(
+                f'SELECT id, email FROM users WHERE id > ?{filters} ORDER BY id LIMIT ?',
+                [after_id, *filter_params, size]
+            ).fetchall()
+            if not user_rows:
+                return []
+
+            user_ids = [row['id'] for row in user_rows]
+            placeholders = ','.join('?' * len(user_ids))
+            trip_rows = conn.execute(f'''
+                SELECT id, user_id, name, description, image_url, created_at, {SUMMARY_SELECT} FROM trips
+                LEFT JOIN trip_summary ON trip_summary.trip_id = trips.id
+                WHERE user_id IN ({placeholders})
+                ORDER BY user_id, created_at DESC
+            ''', user_ids).fetchall()
+            stop_rows = []
+            if include_stops:
+                stop_rows = conn.execute(f'''
+                    SELECT stops.trip_id, latitude, longitude, stop_type, time_minutes, cost FROM stops
+                    JOIN trips ON trips.id = stops.trip_id
+                    WHERE trips.user_id IN ({placeholders})
+                    ORDER BY stops.trip_id, stops.stop_order
+                ''', user_ids).fetchall()
+
+        stops_by_trip = {}
+        for s in stop_rows:
+            stops_by_trip.setdefault(s['trip_id'], []).append({
+                'latitude': s['latitude'],
+                'longitude': s['longitude'],
+                'type': s['stop_type'],
+                'time': s['time_minutes'],
+                'cost': s['cost']
+            })
+
+        trips_by_user = {}
+        for trip in trip_rows:
+            trip_data = {
+                'trip_id': trip['id'],
+                'name': trip['name'],
+                'description': trip['description'] or '',
+                'image_url': trip['image_url'] or '',
+                'created_at': trip['created_at']
+            }
+            if include_stops:
+                trip_data['stops'] = stops_by_trip.get(trip['id'], [])
+            trip_data.update(Trip.summary_from_row(trip))
+            trips_by_user.setdefault(trip['user_id'], []).append(trip_data)
+
+        users = []
+        for row in user_rows:
+            trips = trips_by_user.get(row['id'], [])
+            users.append({
+                'user_id': row['id'],
+                'email': row['email'],
+                'trips': trips,
+                'trip_count': len(trips)
+            })
+        return users
+
+    @staticmethod
+    def stream_users_json(after_id=0, limit=None, email=None, min_trips=None, include_stops=True):
+        """
+        Stream {"stats": ..., "users": [...], "next_after_id": ...} in chunks
+
+        Users are encoded one at a time as iter_users produces them, so memory
+        stays flat however many users are listed. next_after_id is the cursor
+        for the next page, or null when there are no more users.
+        """
+        seen = {'last_id': None, 'count': 0}
+
+        def users():
+            for user in AdminService.iter_users(after_id, limit, email, min_trips, include_stops):
+                seen['last_id'] = user['user_id']
+                seen['count'] += 1
+                yield user
+
+        def next_after_id():
+            has_more = limit is not None and seen['count'] == limit and seen['last_id'] is not None
+            return seen['last_id'] if has_more else None
+
+        yield from stream_json({
+            'stats': AdminService.get_stats(),
+            'users': users(),
+            'next_after_id': next_after_id
+        })
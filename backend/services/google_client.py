@@ -0,0 +1,238 @@
+# Google client - shared HTTP client for the Maps and Places web services
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+load_dotenv()
+GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
+# Values from the example .env that mean "no key configured"
+PLACEHOLDER_API_KEYS = ('your-api-key-here', 'put_your_key_here')
+# Every Google Maps Platform key has this prefix (googlemaps.Client enforced it too)
+GOOGLE_MAPS_KEY_PREFIX = 'AIza'
+GOOGLE_MAPS_BASE_URL = os.getenv('GOOGLE_MAPS_BASE_URL', 'https://maps.googleapis.com')
+GOOGLE_MAPS_TIMEOUT = float(os.getenv('GOOGLE_MAPS_TIMEOUT', 10))
+GOOGLE_MAPS_MAX_RETRIES = int(os.getenv('GOOGLE_MAPS_MAX_RETRIES', 3))
+GOOGLE_MAPS_POOL_SIZE = int(os.getenv('GOOGLE_MAPS_POOL_SIZE', 32))
+
+
+class GoogleMapsError(Exception):
+    """Non-OK status returned by a Google web service"""
+
+    def __init__(self, status, message=None):
+        super().__init__(f"{status}: {message}" if message else status)
+        self.status = status
+        self.message = message
+
+
+class GoogleMapsClient:
+    """
+    Thread-safe client for the Google Maps web services
+
+    One instance is shared by MapsService and PricingService. Requests go
+    through a pooled requests.Session, so connections are kept alive across
+    calls. Every call has a timeout, transient failures (connection errors,
+    timeouts, 5xx, OVER_QUERY_LIMIT) are retried with full-jitter
+    exponential backoff, and latency is recorded per endpoint.
+
+    The public methods mirror googlemaps.Client, so callers did not change
+    when it was swapped in. Coroutines can use call_async().
+    """
+
+    ENDPOINTS = {
+        'geocode': '/maps/api/geocode/json',
+        'directions': '/maps/api/directions/json',
+        'places_nearby': '/maps/api/place/nearbysearch/json',
+        'place': '/maps/api/place/details/json',
+    }
+
+    RETRIABLE_STATUSES = ('OVER_QUERY_LIMIT', 'UNKNOWN_ERROR')
+    RETRIABLE_HTTP_CODES = (429, 500, 502, 503, 504)
+
+    def __init__(self, key, base_url=GOOGLE_MAPS_BASE_URL, timeout=GOOGLE_MAPS_TIMEOUT,
+                 max_retries=GOOGLE_MAPS_MAX_RETRIES, pool_size=GOOGLE_MAPS_POOL_SIZE,
+                 backoff_base=0.25, backoff_max=4.0):
+        self.key = key
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.ENDPOINTS), pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+
+    def request(self, endpoint, params, timeout=None):
+        """
+        Call an endpoint and return its decoded JSON body
+
+        Args:
+            endpoint: Key of ENDPOINTS
+            params: Query parameters (the API key is added here)
+            timeout: Seconds per attempt; defaults to the client timeout
+
+        Returns:
+            Response body with status OK or ZERO_RESULTS
+
+        Raises:
+            GoogleMapsError: for any other status, or once retries run out
+        """
+        url = self.base_url + self.ENDPOINTS[endpoint]
+        params = dict(params, key=self.key)
+        timeout = self.timeout if timeout is None else timeout
+
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                response = self.session.get(url, params=params, timeout=timeout)
+                if response.status_code in self.RETRIABLE_HTTP_CODES:
+                    raise GoogleMapsError(f"HTTP_{response.status_code}")
+                if response.status_code >= 400:
+                    body = {'status': f"HTTP_{response.status_code}"}
+                else:
+                    body = response.json()
+                status = body.get('status', 'OK')
+                if status in self.RETRIABLE_STATUSES:
+                    raise GoogleMapsError(status, body.get('error_message'))
+            except (requests.ConnectionError, requests.Timeout, GoogleMapsError) as e:
+                self._record(endpoint, time.monotonic() - started, error=True)
+                if attempt >= self.max_retries:
+                    if isinstance(e, GoogleMapsError):
+                        raise
+                    raise GoogleMapsError('TRANSPORT_ERROR', str(e)) from e
+                attempt += 1
+                self._record_retry(endpoint)
+                time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+                continue
+
+            self._record(endpoint, time.monotonic() - started, error=status not in ('OK', 'ZERO_RESULTS'))
+            if status not in ('OK', 'ZERO_RESULTS'):
+                raise GoogleMapsError(status, body.get('error_message'))
+            return body
+
+    async def call_async(self, method, *args, **kwargs):
+        """Run one of the client methods from a coroutine without blocking the event loop"""
+        return await asyncio.to_thread(getattr(self, method), *args, **kwargs)
+
+    def geocode(self, address, timeout=None):
+        return self.request('geocode', {'address': address}, timeout).get('results', [])
+
+    def reverse_geocode(self, latlng, timeout=None):
+        return self.request('geocode', {'latlng': format_location(latlng)}, timeout).get('results', [])
+
+    def directions(self, origin, destination, waypoints=None, mode='driving', timeout=None):
+        params = {
+            'origin': format_location(origin),
+            'destination': format_location(destination),
+            'mode': mode
+        }
+        if waypoints:
+            params['waypoints'] = '|'.join(format_location(waypoint) for waypoint in waypoints)
+        return self.request('directions', params, timeout).get('routes', [])
+
+    def places_nearby(self, location, radius, type=None, timeout=None):
+        params = {'location': format_location(location), 'radius': radius}
+        if type:
+            params['type'] = type
+        return self.request('places_nearby', params, timeout)
+
+    def place(self, place_id, fields=None, timeout=None):
+        params = {'place_id': place_id}
+        if fields:
+            params['fields'] = ','.join(fields)
+        return self.request('place', params, timeout)
+
+    def stats(self):
+        """Per-endpoint call counts, error and retry counts, and latency percentiles in ms"""
+        with self._stats_lock:
+            snapshot = {endpoint: (dict(entry), sorted(entry['latencies']))
+                        for endpoint, entry in self._stats.items()}
+
+        stats = {}
+        for endpoint, (entry, latencies) in snapshot.items():
+            stats[endpoint] = {
+                'calls': entry['calls'],
+                'errors': entry['errors'],
+                'retries': entry['retries'],
+                'avg_ms': round(entry['total_seconds'] / entry['calls'] * 1000, 1) if entry['calls'] else 0,
+                'p50_ms': _percentile_ms(latencies, 0.5),
+                'p95_ms': _percentile_ms(latencies, 0.95),
+            }
+        return stats
+
+    def _entry(self, endpoint):
+        if endpoint not in self._stats:
+            self._stats[endpoint] = {'calls': 0, 'errors': 0, 'retries': 0, 'total_seconds': 0.0,
+                                     'latencies': deque(maxlen=1000)}
+        return self._stats[endpoint]
+
+    def _record(self, endpoint, seconds, error=False):
+        with self._stats_lock:
+            entry = self._entry(endpoint)
+            entry['calls'] += 1
+            entry['errors'] += int(error)
+            entry['total_seconds'] += seconds
+            entry['latencies'].append(seconds)
+
+    def _record_retry(self, endpoint):
+        with self._stats_lock:
+            self._entry(endpoint)['retries'] += 1
+
+
+def format_location(location):
+    """Format a location as the web services expect: "lat,lng" for coordinates, addresses unchanged"""
+    if isinstance(location, dict):
+        if 'latitude' in location:
+            return f"{location['latitude']},{location['longitude']}"
+        return f"{location['lat']},{location['lng']}"
+    if isinstance(location, (list, tuple)):
+        return f"{location[0]},{location[1]}"
+    return str(location)
+
+
+def _percentile_ms(sorted_latencies, fraction):
+    if not sorted_latencies:
+        return 0
+    index = min(len(sorted_latencies) - 1, int(fraction * len(sorted_latencies)))
+    return round(sorted_latencies[index] * 1000, 1)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    The shared client, created on first use
+
+    Returns None when GOOGLE_MAPS_API_KEY is missing, is an example
+    placeholder, or is not shaped like a Maps key, so services fall back to
+    their offline behavior. A rejected key is reported once.
+    """
+    global _client
+    if not GOOGLE_MAPS_API_KEY:
+        return None
+    with _client_lock:
+        if _client is None:
+            if GOOGLE_MAPS_API_KEY in PLACEHOLDER_API_KEYS:
+                print("Warning: GOOGLE_MAPS_API_KEY is the example placeholder; Google Maps calls are disabled")
+                _client = False
+            elif not GOOGLE_MAPS_API_KEY.startswith(GOOGLE_MAPS_KEY_PREFIX):
+                print(f"Warning: GOOGLE_MAPS_API_KEY does not start with '{GOOGLE_MAPS_KEY_PREFIX}'; "
+                      f"Google Maps calls are disabled")
+                _client = False
+            else:
+                _client = GoogleMapsClient(GOOGLE_MAPS_API_KEY)
+        return _client or None
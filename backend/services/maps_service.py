@@ -1,25 +1,144 @@
 # Maps service - handles Google Maps API integration
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
+from services.google_client import get_client
+from services.road_graph import RoadGraph
+from utils import polyline as polyline_codec
+from utils.cache import PersistentCache
+from utils.helpers import normalize_address, snap_coordinates
 
 load_dotenv()
-GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
 
-gmaps = None
-if GOOGLE_MAPS_API_KEY and GOOGLE_MAPS_API_KEY != 'your-api-key-here':
+# Directions are cached on route geometry rounded to this many decimal places
+DIRECTIONS_CACHE_PRECISION = int(os.getenv('DIRECTIONS_CACHE_PRECISION', 5))  # ~1m
+DIRECTIONS_CACHE_TTL = int(os.getenv('DIRECTIONS_CACHE_TTL', 7 * 24 * 3600))
+DIRECTIONS_CACHE_NEGATIVE_TTL = int(os.getenv('DIRECTIONS_CACHE_NEGATIVE_TTL', 300))
+DIRECTIONS_CACHE_MAX_ENTRIES = int(os.getenv('DIRECTIONS_CACHE_MAX_ENTRIES', 20000))
+DIRECTIONS_CACHE_MEMORY_ENTRIES = int(os.getenv('DIRECTIONS_CACHE_MEMORY_ENTRIES', 512))
+
+# Geocodes are cached on the normalized address; reverse geocodes on a coordinate grid
+GEOCODE_CACHE_TTL = int(os.getenv('GEOCODE_CACHE_TTL', 30 * 24 * 3600))
+GEOCODE_CACHE_NEGATIVE_TTL = int(os.getenv('GEOCODE_CACHE_NEGATIVE_TTL', 24 * 3600))
+GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv('GEOCODE_CACHE_MAX_ENTRIES', 50000))
+GEOCODE_CACHE_MEMORY_ENTRIES = int(os.getenv('GEOCODE_CACHE_MEMORY_ENTRIES', 1024))
+REVERSE_GEOCODE_GRID_PRECISION = int(os.getenv('REVERSE_GEOCODE_GRID_PRECISION', 4))  # ~11m
+
+geocode_cache = PersistentCache(
+    'geocode',
+    ttl=GEOCODE_CACHE_TTL,
+    stale_ttl=GEOCODE_CACHE_TTL,
+    negative_ttl=GEOCODE_CACHE_NEGATIVE_TTL,
+    max_entries=GEOCODE_CACHE_MAX_ENTRIES,
+    memory_entries=GEOCODE_CACHE_MEMORY_ENTRIES
+)
+reverse_geocode_cache = PersistentCache(
+    'reverse_geocode',
+    ttl=GEOCODE_CACHE_TTL,
+    stale_ttl=GEOCODE_CACHE_TTL,
+    negative_ttl=GEOCODE_CACHE_NEGATIVE_TTL,
+    max_entries=GEOCODE_CACHE_MAX_ENTRIES,
+    memory_entries=GEOCODE_CACHE_MEMORY_ENTRIES
+)
+
+# Upstream statuses that mean "this query will never succeed", cached as misses
+PERMANENT_FAILURE_STATUSES = ('ZERO_RESULTS', 'NOT_FOUND', 'INVALID_REQUEST')
+
+# Batch geocoding: request size limit and concurrent upstream lookups per batch
+GEOCODE_BATCH_LIMIT = int(os.getenv('GEOCODE_BATCH_LIMIT', 300))
+GEOCODE_BATCH_MAX_WORKERS = int(os.getenv('GEOCODE_BATCH_MAX_WORKERS', 8))
+geocode_executor = ThreadPoolExecutor(max_workers=GEOCODE_BATCH_MAX_WORKERS, thread_name_prefix='geocode')
+
+# Missing route legs are fetched in parallel on this pool
+LEG_FETCH_MAX_WORKERS = int(os.getenv('LEG_FETCH_MAX_WORKERS', 8))
+leg_executor = ThreadPoolExecutor(max_workers=LEG_FETCH_MAX_WORKERS, thread_name_prefix='legs')
+
+directions_cache = PersistentCache(
+    'directions',
+    ttl=DIRECTIONS_CACHE_TTL,
+    stale_ttl=0,
+    negative_ttl=DIRECTIONS_CACHE_NEGATIVE_TTL,
+    max_entries=DIRECTIONS_CACHE_MAX_ENTRIES,
+    memory_entries=DIRECTIONS_CACHE_MEMORY_ENTRIES
+)
+
+# Shared upstream client (None when no API key is configured)
+gmaps = get_client()
+
+# Routing backend: 'google', 'local' (offline road graph only), or 'auto'
+# (Google, falling back to the road graph when there is no key or the call fails)
+ROUTING_BACKEND = os.getenv('ROUTING_BACKEND', 'auto')
+ROAD_GRAPH_PATH = os.getenv('ROAD_GRAPH_PATH')
+
+road_graph = None
+if ROAD_GRAPH_PATH:
     try:
-        import googlemaps
-        gmaps = googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
+        road_graph = RoadGraph.load(ROAD_GRAPH_PATH)
     except Exception as e:
-        print(f"Warning: Could not initialize Google Maps: {e}")
+        print(f"Warning: Could not load road graph from {ROAD_GRAPH_PATH}: {e}")
 
 class MapsService:
     @staticmethod
     def geocode(address):
         if not gmaps:
             return None
-        result = gmaps.geocode(address)
+        key = normalize_address(address)
+        if not key:
+            return None
+        return geocode_cache.get_or_load(key, lambda: MapsService.fetch_geocode(address))
+
+    @staticmethod
+    def geocode_batch(addresses):
+        """
+        Geocode many addresses at once
+        
+        Addresses that normalize to the same cache key are resolved once, and
+        distinct ones are resolved concurrently through geocode(), so cached
+        entries are reused.
+        
+        Args:
+            addresses: List of address strings
+            
+        Returns:
+            List in input order of {'address', 'latitude', 'longitude'} or
+            {'address', 'error'} dictionaries
+        """
+        unique = {}
+        for address in addresses:
+            if isinstance(address, str) and normalize_address(address):
+                unique.setdefault(normalize_address(address), address)
+        
+        def resolve(address):
+            try:
+                return MapsService.geocode(address), None
+            except Exception as e:
+                return None, str(e)
+        
+        resolved = dict(zip(unique, geocode_executor.map(resolve, unique.values())))
+        
+        results = []
+        for address in addresses:
+            key = normalize_address(address) if isinstance(address, str) else ''
+            if not key:
+                results.append({'address': address, 'error': 'Address is required'})
+                continue
+            latlng, error = resolved[key]
+            if latlng:
+                results.append({'address': address, 'latitude': latlng[0], 'longitude': latlng[1]})
+            else:
+                results.append({'address': address, 'error': error or 'Geocoding failed'})
+        return results
+
+    @staticmethod
+    def fetch_geocode(address):
+        """Geocode through the API directly; permanent failures return None"""
+        try:
+            result = gmaps.geocode(address)
+        except Exception as e:
+            if getattr(e, 'status', None) in PERMANENT_FAILURE_STATUSES:
+                return None
+            raise
         if result:
             location = result[0]['geometry']['location']
             return [location['lat'], location['lng']]
@@ -29,18 +148,193 @@ class MapsService:
     def reverse_geocode(latitude, longitude):
         if not gmaps:
             return None
-        result = gmaps.reverse_geocode((latitude, longitude))
+        key = snap_coordinates(latitude, longitude, REVERSE_GEOCODE_GRID_PRECISION)
+        return reverse_geocode_cache.get_or_load(key, lambda: MapsService.fetch_reverse_geocode(key))
+
+    @staticmethod
+    def fetch_reverse_geocode(latlng):
+        """Reverse geocode a "lat,lng" grid point through the API; permanent failures return None"""
+        latitude, longitude = (float(value) for value in latlng.split(','))
+        try:
+            result = gmaps.reverse_geocode((latitude, longitude))
+        except Exception as e:
+            if getattr(e, 'status', None) in PERMANENT_FAILURE_STATUSES:
+                return None
+            raise
         if result:
             return result[0]['formatted_address']
         return None
 
     @staticmethod
     def get_directions(origin, destination, waypoints=[], mode='driving'):
+        """
+        Directions from origin to destination through waypoints
+
+        Uses the Google Directions API or the offline road graph depending on
+        ROUTING_BACKEND. Both return the same response shape.
+        """
+        use_local = ROUTING_BACKEND == 'local' or (ROUTING_BACKEND == 'auto' and not gmaps)
+        if use_local:
+            return MapsService.get_local_directions(origin, destination, waypoints, mode)
         if not gmaps:
             return None
-        directions_result = gmaps.directions(origin,
-                                            destination,
-                                            waypoints=waypoints,
+        try:
+            return MapsService.get_google_directions(origin, destination, waypoints, mode)
+        except Exception as e:
+            if ROUTING_BACKEND != 'auto' or road_graph is None:
+                raise
+            print(f"Directions upstream failed, routing on the offline road graph: {e}")
+            return MapsService.get_local_directions(origin, destination, waypoints, mode)
+
+    @staticmethod
+    def get_google_directions(origin, destination, waypoints=[], mode='driving'):
+        """
+        Directions API route, split into legs between consecutive points
+
+        Each leg is cached on its own, so adding, moving or removing one stop
+        only fetches the legs that changed. Missing legs are fetched in
+        parallel and stitched into a single response.
+        """
+        points = [origin] + list(waypoints or []) + [destination]
+        results = MapsService.get_google_legs(list(zip(points, points[1:])), mode)
+        if any(directions is None for directions in results):
+            return None
+        return MapsService.stitch_legs(results)
+
+    @staticmethod
+    def get_google_legs(legs, mode='driving'):
+        """Directions API result for each (start, end) pair, None where a leg has no route"""
+        results = [None] * len(legs)
+        missing = []
+        for index, (start, end) in enumerate(legs):
+            hit, directions = directions_cache.peek(MapsService.directions_cache_key(start, end, None, mode))
+            if hit:
+                results[index] = directions
+            else:
+                missing.append(index)
+        
+        if missing:
+            fetched = leg_executor.map(
+                lambda index: MapsService.get_leg_directions(legs[index][0], legs[index][1], mode),
+                missing
+            )
+            for index, directions in zip(missing, fetched):
+                results[index] = directions
+        return results
+
+    @staticmethod
+    def get_local_directions(origin, destination, waypoints=[], mode='driving'):
+        """
+        Route on the offline road graph (driving only)
+
+        Returns:
+            Directions in the get_directions shape, or None if no graph is
+            loaded, a point is not a coordinate, or the points are not connected
+        """
+        if road_graph is None or mode != 'driving':
+            return None
+        points = [origin] + list(waypoints or []) + [destination]
+        legs = MapsService.get_local_legs(list(zip(points, points[1:])), mode)
+        if any(leg is None for leg in legs):
+            return None
+        return MapsService.stitch_legs(legs)
+
+    @staticmethod
+    def get_local_legs(legs, mode='driving'):
+        """Road graph route for each (start, end) pair, None where a leg has no route"""
+        if road_graph is None or mode != 'driving':
+            return [None] * len(legs)
+        results = []
+        for start, end in legs:
+            start, end = MapsService.to_coordinates(start), MapsService.to_coordinates(end)
+            results.append(road_graph.route_leg(start, end) if start and end else None)
+        return results
+
+    @staticmethod
+    def get_legs(legs, mode='driving'):
+        """
+        Directions for each (start, end) pair in legs, chosen by backend as in get_directions
+
+        The pairs need not join up, so a caller that already holds most legs
+        of a route can ask for only the ones that changed.
+
+        Returns:
+            List with one directions response per pair (None where a leg has
+            no route), or None when no routing backend is available
+        """
+        legs = list(legs)
+        use_local = ROUTING_BACKEND == 'local' or (ROUTING_BACKEND == 'auto' and not gmaps)
+        if use_local:
+            return MapsService.get_local_legs(legs, mode) if road_graph is not None else None
+        if not gmaps:
+            return None
+        try:
+            return MapsService.get_google_legs(legs, mode)
+        except Exception as e:
+            if ROUTING_BACKEND != 'auto' or road_graph is None:
+                raise
+            print(f"Directions upstream failed, routing on the offline road graph: {e}")
+            return MapsService.get_local_legs(legs, mode)
+
+    @staticmethod
+    def to_coordinates(location):
+        """(lat, lng) floats for a coordinate location, or None for an address"""
+        location = MapsService.to_latlng(location)
+        if isinstance(location, dict):
+            location = (location.get('lat'), location.get('lng'))
+        if isinstance(location, (list, tuple)) and len(location) == 2:
+            try:
+                return float(location[0]), float(location[1])
+            except (TypeError, ValueError):
+                return None
+        return None
+
+    @staticmethod
+    def get_leg_directions(origin, destination, mode='driving'):
+        """Cached directions for a single origin->destination leg"""
+        return directions_cache.get_or_load(
+            MapsService.directions_cache_key(origin, destination, None, mode),
+            lambda: MapsService.fetch_directions(origin, destination, None, mode)
+        )
+
+    @staticmethod
+    def stitch_legs(leg_directions):
+        """Combine per-leg directions into the response shape of a single multi-waypoint route"""
+        if len(leg_directions) == 1:
+            return leg_directions[0]
+        
+        routes = [directions['route'] for directions in leg_directions]
+        legs = [leg for route in routes for leg in route.get('legs', [])]
+        polyline = polyline_codec.join(directions['polyline'] for directions in leg_directions)
+        
+        route = {
+            'summary': ' / '.join(route.get('summary', '') for route in routes if route.get('summary')),
+            'legs': legs,
+            'overview_polyline': {'points': polyline},
+            'warnings': [warning for route in routes for warning in route.get('warnings', [])],
+            'waypoint_order': list(range(len(leg_directions) - 1)),
+            'copyrights': routes[0].get('copyrights', '')
+        }
+        bounds = [route['bounds'] for route in routes if route.get('bounds')]
+        if bounds:
+            route['bounds'] = {
+                'northeast': {'lat': max(b['northeast']['lat'] for b in bounds),
+                              'lng': max(b['northeast']['lng'] for b in bounds)},
+                'southwest': {'lat': min(b['southwest']['lat'] for b in bounds),
+                              'lng': min(b['southwest']['lng'] for b in bounds)}
+            }
+        
+        return {'route': route,
+                'polyline': polyline,
+                'total_distance': sum(directions['total_distance'] for directions in leg_directions),
+                'total_duration': sum(directions['total_duration'] for directions in leg_directions)}
+
+    @staticmethod
+    def fetch_directions(origin, destination, waypoints=[], mode='driving'):
+        """Call the Directions API directly, bypassing the cache"""
+        directions_result = gmaps.directions(MapsService.to_latlng(origin),
+                                            MapsService.to_latlng(destination),
+                                            waypoints=[MapsService.to_latlng(wp) for wp in waypoints or []],
                                             mode=mode)
         
         if not directions_result:
@@ -55,4 +349,117 @@ class MapsService:
                 'polyline': polyline, 
                 'total_distance': total_distance,
                 'total_duration': total_duration}
-    
+
+    # Fields a client can request instead of the raw route
+    DIRECTIONS_FIELDS = ('polyline', 'total_distance', 'total_duration', 'legs', 'bounds', 'route')
+
+    @staticmethod
+    def project_directions(directions, fields=None, zoom=None):
+        """
+        Shrink a directions response for the client
+
+        Args:
+            directions: Response from get_directions
+            fields: Iterable of DIRECTIONS_FIELDS to return; None keeps the
+                full response. 'legs' is a per-leg distance/duration summary.
+            zoom: Map zoom level; when given the polyline is simplified with
+                Douglas-Peucker to one pixel at that zoom
+
+        Returns:
+            New directions dictionary
+        """
+        if directions is None:
+            return None
+        
+        projected = dict(directions)
+        if zoom is not None:
+            projected['polyline'] = polyline_codec.simplify_for_zoom(directions['polyline'], float(zoom))
+        
+        if fields is None:
+            return projected
+        
+        route = directions.get('route', {})
+        result = {}
+        for field in fields:
+            if field == 'legs':
+                result['legs'] = [{
+                    'distance': leg.get('distance', {}).get('value', 0),
+                    'duration': leg.get('duration', {}).get('value', 0),
+                    'start_location': leg.get('start_location'),
+                    'end_location': leg.get('end_location')
+                } for leg in route.get('legs', [])]
+            elif field == 'bounds':
+                result['bounds'] = route.get('bounds')
+            elif field in MapsService.DIRECTIONS_FIELDS:
+                result[field] = projected[field]
+        return result
+
+    @staticmethod
+    def parse_fields(fields):
+        """Parse a fields list or comma-separated string, rejecting unknown names"""
+        if fields is None:
+            return None
+        if isinstance(fields, str):
+            fields = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = [field for field in fields if field not in MapsService.DIRECTIONS_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown directions fields: {', '.join(unknown)}")
+        return fields
+
+    @staticmethod
+    def to_latlng(location):
+        """Convert a {latitude, longitude} dict into a (lat, lng) tuple; other forms pass through"""
+        if isinstance(location, dict) and 'latitude' in location:
+            return (location['latitude'], location['longitude'])
+        return location
+
+    @staticmethod
+    def normalize_location(location, precision=None):
+        """
+        Canonical string for a location, used in cache keys
+
+        Coordinates (tuples, lists, lat/lng or latitude/longitude dicts) are
+        rounded to precision decimal places; addresses are lowercased and
+        whitespace-collapsed.
+        """
+        precision = DIRECTIONS_CACHE_PRECISION if precision is None else precision
+        location = MapsService.to_latlng(location)
+        if isinstance(location, dict):
+            location = (location.get('lat'), location.get('lng'))
+        if isinstance(location, (list, tuple)) and len(location) == 2:
+            lat, lng = (round(float(value), precision) for value in location)
+            return f"{lat:.{precision}f},{lng:.{precision}f}"
+        return ' '.join(str(location).lower().split())
+
+    @staticmethod
+    def directions_cache_key(origin, destination, waypoints=None, mode='driving'):
+        """Cache key for a route: mode plus normalized origin, waypoints and destination"""
+        points = [origin] + list(waypoints or []) + [destination]
+        return f"{mode}|" + '|'.join(MapsService.normalize_location(point) for point in points)
+
+    @staticmethod
+    def invalidate_directions(origin, destination, waypoints=None, mode='driving'):
+        """Drop the cached legs of one route"""
+        points = [origin] + list(waypoints or []) + [destination]
+        for start, end in zip(points, points[1:]):
+            directions_cache.delete(MapsService.directions_cache_key(start, end, None, mode))
+
+    @staticmethod
+    def clear_directions_cache():
+        """Drop every cached route"""
+        directions_cache.clear()
+
+    @staticmethod
+    def directions_cache_stats():
+        """Hit/miss counters for the directions cache"""
+        return directions_cache.stats()
+
+    @staticmethod
+    def cache_stats():
+        """Hit/miss counters for every maps cache plus upstream latency per endpoint"""
+        return {
+            'directions': directions_cache.stats(),
+            'geocode': geocode_cache.stats(),
+            'reverse_geocode': reverse_geocode_cache.stats(),
+            'upstream': gmaps.stats() if gmaps else {}
+        }
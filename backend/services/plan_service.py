@@ -0,0 +1,275 @@
+# Plan service - per-session trip planning that returns the route and budget together
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from models.stop import StopType
+from services.maps_service import MapsService
+from services.pricing_service import BUDGET_ROAD_CIRCUITY, PricingService
+from utils.geo import leg_distances
+
+# Sessions live in this process only; an expired or evicted session answers
+# 404 and the client starts a new one from its full stop list
+PLAN_SESSION_TTL = int(os.getenv('PLAN_SESSION_TTL', 2 * 3600))
+PLAN_SESSION_MAX = int(os.getenv('PLAN_SESSION_MAX', 1000))
+PLAN_MAX_STOPS = int(os.getenv('PLAN_MAX_STOPS', 100))
+
+PLAN_OPS = ('add', 'move', 'remove')
+PLAN_DIRECTIONS_FIELDS = ['polyline', 'total_distance', 'total_duration', 'legs']
+
+
+class PlanSession:
+    """Stops being planned in one map session, with the route legs already fetched for them"""
+
+    __slots__ = ('stops', 'mode', 'legs', 'revision', 'touched', 'lock')
+
+    def __init__(self, stops, mode='driving'):
+        self.stops = stops
+        self.mode = mode
+        self.legs = {}          # (start, end) -> per-leg directions
+        self.revision = 0
+        self.touched = time.monotonic()
+        self.lock = threading.Lock()
+
+
+_sessions = OrderedDict()   # session id -> PlanSession, least recently used first
+_sessions_lock = threading.Lock()
+
+
+class PlanService:
+    """
+    Incremental trip planning for the map page
+
+    The map used to send every marker to /api/maps/directions and again to
+    /api/budget/calculate on each change. A plan session keeps the stop list
+    on the server: the client sends only the change (a stop added, moved or
+    removed) and gets the route and budget back from one request.
+
+    Legs between unchanged neighbours are reused from the session, so a
+    change fetches at most the two legs touching the stop. The budget is
+    priced with the real leg distances (prices come from the shared price
+    cache), and falls back to great-circle estimates for legs with no route.
+    """
+
+    @staticmethod
+    def create_session(stops=None, mode='driving', zoom=None):
+        """
+        Start a plan session
+
+        Args:
+            stops: Initial list of stop dictionaries with location and type
+            mode: Travel mode for every leg
+            zoom: Map zoom level used to simplify the returned polyline
+
+        Returns:
+            Plan dictionary (see plan()) with status 201, or an error with
+            status 400 (or 413 past PLAN_MAX_STOPS)
+        """
+        try:
+            zoom = PlanService.parse_zoom(zoom)
+            if not isinstance(stops or [], list):
+                raise ValueError('stops must be a list')
+            if len(stops or []) > PLAN_MAX_STOPS:
+                return PlanService.too_many_stops()
+            parsed = [PlanService.parse_stop(stop) for stop in stops or []]
+        except ValueError as e:
+            return {'success': False, 'error': str(e), 'status': 400}
+
+        session_id = secrets.token_urlsafe(16)
+        session = PlanSession(parsed, mode)
+        with _sessions_lock:
+            PlanService.expire_sessions()
+            _sessions[session_id] = session
+            while len(_sessions) > PLAN_SESSION_MAX:
+                _sessions.popitem(last=False)
+
+        with session.lock:
+            result = PlanService.plan(session_id, session, zoom)
+        result['status'] = 201
+        return result
+
+    @staticmethod
+    def apply_ops(session_id, ops, revision=None, zoom=None):
+        """
+        Apply changes to a session's stops and return the updated plan
+
+        Args:
+            session_id: Id returned by create_session
+            ops: List of changes, applied in order:
+                {'op': 'add', 'location': [lat, lng], 'type': 'FOOD', 'index': i}
+                    (index is optional and defaults to the end)
+                {'op': 'move', 'from': i, 'to': j}
+                {'op': 'remove', 'index': i}
+            revision: Revision the client last saw; a mismatch means the
+                client missed a change and is answered with 409
+            zoom: Map zoom level used to simplify the returned polyline
+
+        Returns:
+            Plan dictionary, or an error with status 400, 404, 409 or 413
+        """
+        session = PlanService.get_session(session_id)
+        if session is None:
+            return {'success': False, 'error': 'Plan session not found', 'status': 404}
+
+        with session.lock:
+            if revision is not None and revision != session.revision:
+                return {'success': False, 'error': 'Plan session has changed', 'status': 409,
+                        'revision': session.revision}
+            try:
+                zoom = PlanService.parse_zoom(zoom)
+                if not isinstance(ops, list):
+                    raise ValueError('ops must be a list')
+                stops = list(session.stops)
+                for op in ops:
+                    PlanService.apply_op(stops, op)
+            except ValueError as e:
+                return {'success': False, 'error': str(e), 'status': 400}
+            if len(stops) > PLAN_MAX_STOPS:
+                return PlanService.too_many_stops()
+            session.stops = stops
+            session.revision += 1
+            return PlanService.plan(session_id, session, zoom)
+
+    @staticmethod
+    def too_many_stops():
+        """
+        Error for a plan over PLAN_MAX_STOPS
+
+        Status 413 with max_stops tells the client to plan this trip through
+        /api/maps/directions and /api/budget/calculate instead, which take
+        any number of stops.
+        """
+        return {'success': False, 'error': f"A plan session holds at most {PLAN_MAX_STOPS} stops",
+                'status': 413, 'max_stops': PLAN_MAX_STOPS}
+
+    @staticmethod
+    def delete_session(session_id):
+        with _sessions_lock:
+            removed = _sessions.pop(session_id, None)
+        if removed is None:
+            return {'success': False, 'error': 'Plan session not found', 'status': 404}
+        return {'success': True}
+
+    @staticmethod
+    def get_session(session_id):
+        """Live session for session_id, marked as recently used, or None"""
+        with _sessions_lock:
+            PlanService.expire_sessions()
+            session = _sessions.get(session_id)
+            if session is not None:
+                session.touched = time.monotonic()
+                _sessions.move_to_end(session_id)
+            return session
+
+    @staticmethod
+    def expire_sessions():
+        """Drop sessions idle for longer than PLAN_SESSION_TTL (caller holds _sessions_lock)"""
+        cutoff = time.monotonic() - PLAN_SESSION_TTL
+        while _sessions:
+            session_id, session = next(iter(_sessions.items()))
+            if session.touched >= cutoff:
+                break
+            del _sessions[session_id]
+
+    @staticmethod
+    def parse_stop(stop):
+        """
+        Validate a stop dictionary
+
+        Returns:
+            {'location': (lat, lng), 'type': stop type name}
+
+        Raises:
+            ValueError: for a location that is not a coordinate or an unknown type
+        """
+        if not isinstance(stop, dict):
+            raise ValueError('Each stop must be an object')
+        location = MapsService.to_coordinates(stop.get('location'))
+        if location is None or not (-90 <= location[0] <= 90 and -180 <= location[1] <= 180):
+            raise ValueError('Each stop needs a [latitude, longitude] location')
+        stop_type = stop.get('type') or 'MISC'
+        if stop_type not in StopType.__members__:
+            raise ValueError(f"Unknown stop type: {stop_type}")
+        return {'location': location, 'type': stop_type}
+
+    @staticmethod
+    def parse_zoom(zoom):
+        if zoom is None:
+            return None
+        try:
+            return float(zoom)
+        except (TypeError, ValueError):
+            raise ValueError('zoom must be a number')
+
+    @staticmethod
+    def apply_op(stops, op):
+        """Apply one change to a list of parsed stops in place, raising ValueError if it is invalid"""
+        if not isinstance(op, dict) or op.get('op') not in PLAN_OPS:
+            raise ValueError(f"op must be one of: {', '.join(PLAN_OPS)}")
+
+        def position(name, upper):
+            value = op.get(name)
+            if not isinstance(value, int) or isinstance(value, bool) or not 0 <= value <= upper:
+                raise ValueError(f"{name} must be an integer between 0 and {upper}")
+            return value
+
+        if op['op'] == 'add':
+            stop = PlanService.parse_stop(op)
+            index = position('index', len(stops)) if op.get('index') is not None else len(stops)
+            stops.insert(index, stop)
+        elif op['op'] == 'move':
+            stop = stops.pop(position('from', len(stops) - 1))
+            stops.insert(position('to', len(stops)), stop)
+        else:
+            stops.pop(position('index', len(stops) - 1))
+
+    @staticmethod
+    def plan(session_id, session, zoom=None):
+        """
+        Route and budget for the session's current stops (caller holds session.lock)
+
+        Returns:
+            Dictionary with the stops, directions (polyline, totals and
+            per-leg distance/duration, or None when a leg has no route) and
+            the budget priced with those leg distances
+        """
+        stops = session.stops
+        pairs = [(start['location'], end['location']) for start, end in zip(stops, stops[1:])]
+
+        missing = [pair for pair in pairs if pair not in session.legs]
+        if missing:
+            try:
+                fetched = MapsService.get_legs(missing, session.mode) or [None] * len(missing)
+            except Exception as e:
+                print(f"Plan session leg lookup failed: {e}")
+                fetched = [None] * len(missing)
+            for pair, leg in zip(missing, fetched):
+                if leg is not None:
+                    session.legs[pair] = leg
+        # Forget legs the route no longer uses
+        session.legs = {pair: session.legs[pair] for pair in pairs if pair in session.legs}
+
+        legs = [session.legs.get(pair) for pair in pairs]
+        directions = None
+        if legs and all(leg is not None for leg in legs):
+            directions = MapsService.project_directions(MapsService.stitch_legs(legs),
+                                                        PLAN_DIRECTIONS_FIELDS, zoom)
+
+        budget = None
+        if stops:
+            # Meters traveled to reach each stop; legs without a route use the
+            # same great-circle estimate as the budget endpoint
+            estimates = leg_distances([stop['location'] for stop in stops], BUDGET_ROAD_CIRCUITY) * 1000
+            distances = [0] + [leg['total_distance'] if leg is not None else float(estimate)
+                               for leg, estimate in zip(legs, estimates)]
+            budget = PricingService.calculate_trip_budget(stops, distances)
+
+        return {
+            'success': True,
+            'session_id': session_id,
+            'revision': session.revision,
+            'stops': [{'location': list(stop['location']), 'type': stop['type']} for stop in stops],
+            'directions': directions,
+            'budget': budget
+        }
@@ -1,20 +1,45 @@
 # Pricing service - handles budget and price calculations
-import googlemaps
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from dotenv import load_dotenv
+from services.google_client import get_client
+from utils.cache import PersistentCache
+from utils.geo import DEFAULT_CIRCUITY, arrival_distances, geohash_encode
 
 # Load environment variables
 load_dotenv()
-GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
 
-# Initialize Google Maps client if API key exists
-gmaps = None
-if GOOGLE_MAPS_API_KEY:
-    try:
-        gmaps = googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
-    except Exception as e:
-        print(f"Warning: Could not initialize Google Maps client. Using fallback pricing. Error: {e}")
-        gmaps = None
+# Place price lookups are cached per geohash cell and stop type
+PRICE_CACHE_PRECISION = int(os.getenv('PRICE_CACHE_PRECISION', 7))   # ~150m cells
+PRICE_CACHE_TTL = int(os.getenv('PRICE_CACHE_TTL', 7 * 24 * 3600))
+PRICE_CACHE_STALE_TTL = int(os.getenv('PRICE_CACHE_STALE_TTL', 24 * 3600))
+PRICE_CACHE_NEGATIVE_TTL = int(os.getenv('PRICE_CACHE_NEGATIVE_TTL', 24 * 3600))
+PRICE_CACHE_MAX_ENTRIES = int(os.getenv('PRICE_CACHE_MAX_ENTRIES', 50000))
+
+price_cache = PersistentCache(
+    'place_prices',
+    ttl=PRICE_CACHE_TTL,
+    stale_ttl=PRICE_CACHE_STALE_TTL,
+    negative_ttl=PRICE_CACHE_NEGATIVE_TTL,
+    max_entries=PRICE_CACHE_MAX_ENTRIES
+)
+
+# Concurrent stop pricing: the pool size caps lookups across all requests,
+# the per-request limit keeps one long trip from taking every worker
+PRICING_MAX_WORKERS = int(os.getenv('PRICING_MAX_WORKERS', 16))
+PRICING_MAX_WORKERS_PER_REQUEST = int(os.getenv('PRICING_MAX_WORKERS_PER_REQUEST', 8))
+PRICING_DEADLINE_SECONDS = float(os.getenv('PRICING_DEADLINE_SECONDS', 5))
+
+pricing_executor = ThreadPoolExecutor(max_workers=PRICING_MAX_WORKERS,
+                                      thread_name_prefix='pricing')
+
+# Road distance / great-circle distance, used when the client sends no distances
+BUDGET_ROAD_CIRCUITY = float(os.getenv('BUDGET_ROAD_CIRCUITY', DEFAULT_CIRCUITY))
+
+# Shared upstream client (None when no API key is configured, so default pricing is used)
+gmaps = get_client()
 
 class PricingService:
     
@@ -40,7 +65,8 @@ class PricingService:
     def get_place_price_level(latitude, longitude, stop_type='MISC'):
         """
         Get price level for a place near coordinates
-        Uses Places API to find nearby places and get price level
+        Uses Places API to find nearby places and get price level.
+        Results are cached per geohash cell and stop type.
         
         Args:
             latitude: Latitude of the stop
@@ -55,35 +81,19 @@ class PricingService:
             return PricingService.get_default_price(stop_type)
         
         try:
-            # Get query type for this stop
-            query_type = PricingService.STOP_TYPE_QUERIES.get(stop_type, 'point_of_interest')
+            latitude = float(latitude)
+            longitude = float(longitude)
+            cache_key = f"{geohash_encode(latitude, longitude, PRICE_CACHE_PRECISION)}:{stop_type}"
             
-            # Search for nearby places
-            places_result = gmaps.places_nearby(
-                location=(latitude, longitude),
-                radius=1000,  # 1km radius
-                type=query_type
+            # A cached None means the lookup found no priced place nearby
+            price_level = price_cache.get_or_load(
+                cache_key,
+                lambda: PricingService.fetch_price_level(latitude, longitude, stop_type)
             )
             
-            if not places_result.get('results'):
-                return PricingService.get_default_price(stop_type)
-            
-            # Get the first result's price level
-            first_place = places_result['results'][0]
-            place_id = first_place.get('place_id')
-            
-            # Get detailed place info including price_level
-            if place_id:
-                place_details = gmaps.place(
-                    place_id,
-                    fields=['price_level', 'name', 'rating']
-                )
-                
-                price_level = place_details.get('result', {}).get('price_level')
-                
-                if price_level is not None:
-                    return PricingService.PRICE_MAP.get(price_level, 
-                                                       PricingService.get_default_price(stop_type))
+            if price_level is not None:
+                return PricingService.PRICE_MAP.get(price_level,
+                                                   PricingService.get_default_price(stop_type))
             
             return PricingService.get_default_price(stop_type)
             
@@ -91,6 +101,47 @@ class PricingService:
             print(f"Error getting price level: {e}")
             return PricingService.get_default_price(stop_type)
     
+    @staticmethod
+    def fetch_price_level(latitude, longitude, stop_type='MISC'):
+        """
+        Look up the Places API price level near coordinates, bypassing the cache
+        
+        Args:
+            latitude: Latitude of the stop
+            longitude: Longitude of the stop
+            stop_type: Type of stop (FOOD, REST, FUEL, ENTERTAINMENT, MISC)
+            
+        Returns:
+            Price level (0-4), or None if no nearby place has one
+        """
+        # Get query type for this stop
+        query_type = PricingService.STOP_TYPE_QUERIES.get(stop_type, 'point_of_interest')
+        
+        # Search for nearby places
+        places_result = gmaps.places_nearby(
+            location=(latitude, longitude),
+            radius=1000,  # 1km radius
+            type=query_type
+        )
+        
+        if not places_result.get('results'):
+            return None
+        
+        # Get the first result's price level
+        first_place = places_result['results'][0]
+        place_id = first_place.get('place_id')
+        
+        if not place_id:
+            return None
+        
+        # Get detailed place info including price_level
+        place_details = gmaps.place(
+            place_id,
+            fields=['price_level', 'name', 'rating']
+        )
+        
+        return place_details.get('result', {}).get('price_level')
+    
     @staticmethod
     def get_default_price(stop_type):
         """
@@ -129,22 +180,34 @@ class PricingService:
         # Get base price from Places API or default
         base_price = PricingService.get_place_price_level(latitude, longitude, stop_type)
         
-        # Add distance surcharge (more remote = more expensive)
-        # Add $0.05 per km over 100km
-        distance_surcharge = max(0, (distance_km - 100) * 0.05)
-        
-        total_price = base_price + distance_surcharge
+        total_price = base_price + PricingService.get_distance_surcharge(distance_km)
         
         return round(total_price, 2)
     
     @staticmethod
-    def calculate_trip_budget(stops_data, distances=None):
+    def get_distance_surcharge(distance_km):
+        """
+        Surcharge for remote stops (more remote = more expensive)
+        Adds $0.05 per km over 100km
+        """
+        return max(0, (distance_km - 100) * 0.05)
+    
+    @staticmethod
+    def calculate_trip_budget(stops_data, distances=None, parallel=True,
+                              max_workers=None, deadline=None):
         """
         Calculate total trip budget from stops
         
         Args:
             stops_data: List of stop dictionaries with location and type
-            distances: Optional list of distances for each stop
+            distances: Optional list of distances for each stop (meters).
+                When omitted, great-circle distances between consecutive
+                stops scaled by BUDGET_ROAD_CIRCUITY are used.
+            parallel: Price stops concurrently on the shared pricing pool
+            max_workers: Concurrent lookups for this request
+                (defaults to PRICING_MAX_WORKERS_PER_REQUEST)
+            deadline: Seconds to wait for lookups before falling back to
+                default prices (defaults to PRICING_DEADLINE_SECONDS)
             
         Returns:
             Dictionary with total cost and breakdown by stop
@@ -152,28 +215,36 @@ class PricingService:
         if not stops_data:
             return {'total_cost': 0, 'stops': [], 'error': 'No stops provided'}
         
-        total_cost = 0
-        stops_breakdown = []
+        if not distances:
+            coordinates = [stop.get('location') for stop in stops_data]
+            distances = (arrival_distances(coordinates, BUDGET_ROAD_CIRCUITY) * 1000).tolist()
         
+        jobs = []
         for index, stop in enumerate(stops_data):
             latitude = stop.get('location')[0]
             longitude = stop.get('location')[1]
             stop_type = stop.get('type', 'MISC')
             distance = distances[index] if distances and index < len(distances) else 0
-            
-            # Calculate price for this stop
-            stop_price = PricingService.calculate_stop_price(
-                latitude, 
-                longitude, 
-                stop_type, 
-                distance / 1000  # Convert meters to km
+            jobs.append((latitude, longitude, stop_type, distance / 1000))  # Convert meters to km
+        
+        if parallel and len(jobs) > 1:
+            prices = PricingService.price_stops_concurrently(
+                jobs,
+                max_workers or PRICING_MAX_WORKERS_PER_REQUEST,
+                PRICING_DEADLINE_SECONDS if deadline is None else deadline
             )
-            
+        else:
+            prices = [PricingService.calculate_stop_price(*job) for job in jobs]
+        
+        total_cost = 0
+        stops_breakdown = []
+        
+        for index, (stop, stop_price) in enumerate(zip(stops_data, prices)):
             total_cost += stop_price
             
             stops_breakdown.append({
                 'location': stop.get('location'),
-                'type': stop_type,
+                'type': stop.get('type', 'MISC'),
                 'estimated_price': stop_price,
                 'index': index
             })
@@ -184,3 +255,51 @@ class PricingService:
             'stops': stops_breakdown,
             'currency': 'USD'
         }
+    
+    @staticmethod
+    def price_stops_concurrently(jobs, max_workers, deadline):
+        """
+        Price stops in parallel on the shared pricing pool
+        
+        At most max_workers lookups from this call are in flight at once.
+        Stops that are not priced before the deadline get the default
+        price for their type plus the distance surcharge.
+        
+        Args:
+            jobs: List of (latitude, longitude, stop_type, distance_km) tuples
+            max_workers: Concurrent lookups allowed for this call
+            deadline: Seconds until remaining lookups are abandoned
+            
+        Returns:
+            List of prices in the same order as jobs
+        """
+        deadline_at = time.monotonic() + deadline
+        slots = threading.BoundedSemaphore(max(1, max_workers))
+        futures = [None] * len(jobs)
+        
+        for index, job in enumerate(jobs):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0 or not slots.acquire(timeout=remaining):
+                break
+            future = pricing_executor.submit(PricingService.calculate_stop_price, *job)
+            future.add_done_callback(lambda _: slots.release())
+            futures[index] = future
+        
+        submitted = [future for future in futures if future is not None]
+        wait(submitted, timeout=max(0, deadline_at - time.monotonic()))
+        
+        prices = []
+        for job, future in zip(jobs, futures):
+            if future is not None and future.done() and not future.cancelled() \
+                    and future.exception() is None:
+                prices.append(future.result())
+                continue
+            
+            if future is not None:
+                future.cancel()
+            _, _, stop_type, distance_km = job
+            fallback = PricingService.get_default_price(stop_type) \
+                + PricingService.get_distance_surcharge(distance_km)
+            prices.append(round(fallback, 2))
+        
+        return prices
@@ -0,0 +1,226 @@
+# Road graph - offline routing over a local road network
+import heapq
+import json
+import math
+import os
+from array import array
+
+import numpy as np
+from utils import polyline as polyline_codec
+from utils.geo import EARTH_RADIUS_KM
+
+DEFAULT_SPEED_KPH = 80
+# Points farther than this from every node are off the graph: route_leg
+# returns None for them instead of routing from a far-away node
+ROAD_GRAPH_MAX_SNAP_M = float(os.getenv('ROAD_GRAPH_MAX_SNAP_M', 2000))
+
+
+def _haversine_m(lat1, lng1, lat2, lng2):
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * 1000 * math.asin(min(1.0, math.sqrt(a)))
+
+
+class RoadGraph:
+    """
+    Road network stored as compact adjacency arrays (CSR)
+
+    Node i's outgoing edges are targets[offsets[i]:offsets[i + 1]], with the
+    matching lengths (meters) and durations (seconds). Coordinates and edges
+    live in typed arrays rather than per-node Python objects, so large
+    networks stay small in memory and load quickly.
+
+    Graph files are JSON:
+
+        {"nodes": [[lat, lng], ...],
+         "edges": [[from, to, length_m, speed_kph, oneway], ...]}
+
+    length_m defaults to the great-circle distance between the endpoints,
+    speed_kph to DEFAULT_SPEED_KPH and oneway to false. A graph can also be
+    saved to and loaded from .npz, which skips the parsing.
+    """
+
+    def __init__(self, lats, lngs, offsets, targets, lengths, durations):
+        self.lats = array('d', lats)
+        self.lngs = array('d', lngs)
+        self.offsets = array('i', offsets)
+        self.targets = array('i', targets)
+        self.lengths = array('f', lengths)
+        self.durations = array('f', durations)
+        self.max_speed_mps = max(
+            (length / duration for length, duration in zip(self.lengths, self.durations) if duration > 0),
+            default=DEFAULT_SPEED_KPH / 3.6
+        )
+
+    @staticmethod
+    def from_edges(nodes, edges):
+        """
+        Build a graph from node coordinates and an edge list
+
+        Args:
+            nodes: List of (lat, lng)
+            edges: List of (from, to[, length_m[, speed_kph[, oneway]]])
+        """
+        directed = []
+        for edge in edges:
+            source, target = int(edge[0]), int(edge[1])
+            length = edge[2] if len(edge) > 2 and edge[2] is not None else _haversine_m(
+                nodes[source][0], nodes[source][1], nodes[target][0], nodes[target][1])
+            speed = edge[3] if len(edge) > 3 and edge[3] else DEFAULT_SPEED_KPH
+            duration = length / (speed / 3.6)
+            directed.append((source, target, length, duration))
+            if not (len(edge) > 4 and edge[4]):
+                directed.append((target, source, length, duration))
+
+        directed.sort(key=lambda edge: edge[0])
+        counts = [0] * (len(nodes) + 1)
+        for source, _, _, _ in directed:
+            counts[source + 1] += 1
+        offsets = list(np.cumsum(counts))
+
+        return RoadGraph(
+            [float(lat) for lat, _ in nodes],
+            [float(lng) for _, lng in nodes],
+            offsets,
+            [edge[1] for edge in directed],
+            [edge[2] for edge in directed],
+            [edge[3] for edge in directed]
+        )
+
+    @staticmethod
+    def load(path):
+        """Load a graph from a .json or .npz file"""
+        if path.endswith('.npz'):
+            data = np.load(path)
+            return RoadGraph(data['lats'], data['lngs'], data['offsets'], data['targets'],
+                             data['lengths'], data['durations'])
+        with open(path) as graph_file:
+            data = json.load(graph_file)
+        return RoadGraph.from_edges(data['nodes'], data['edges'])
+
+    def save_npz(self, path):
+        np.savez_compressed(
+            path,
+            lats=np.frombuffer(self.lats, dtype=np.float64),
+            lngs=np.frombuffer(self.lngs, dtype=np.float64),
+            offsets=np.frombuffer(self.offsets, dtype=np.int32),
+            targets=np.frombuffer(self.targets, dtype=np.int32),
+            lengths=np.frombuffer(self.lengths, dtype=np.float32),
+            durations=np.frombuffer(self.durations, dtype=np.float32)
+        )
+
+    def __len__(self):
+        return len(self.lats)
+
+    def nearest_node(self, latitude, longitude, max_distance_m=None):
+        """
+        Index of the node closest to a coordinate (vectorized over all nodes)
+
+        Returns None when max_distance_m is given and the closest node is
+        farther away than that.
+        """
+        lats = np.frombuffer(self.lats, dtype=np.float64)
+        lngs = np.frombuffer(self.lngs, dtype=np.float64)
+        dx = (lngs - longitude) * math.cos(math.radians(latitude))
+        dy = lats - latitude
+        node = int(np.argmin(dx * dx + dy * dy))
+        if max_distance_m is not None and \
+                _haversine_m(latitude, longitude, self.lats[node], self.lngs[node]) > max_distance_m:
+            return None
+        return node
+
+    def shortest_path(self, source, target):
+        """
+        A* search for the fastest path between two nodes
+
+        The heuristic is straight-line distance at the graph's top speed,
+        which never overestimates, so the result is optimal.
+
+        Returns:
+            (node list, length in meters, duration in seconds), or None if unreachable
+        """
+        offsets, targets, lengths, durations = self.offsets, self.targets, self.lengths, self.durations
+        lats, lngs = self.lats, self.lngs
+        goal_lat, goal_lng = lats[target], lngs[target]
+        speed = self.max_speed_mps
+
+        best = {source: 0.0}
+        parents = {source: (-1, 0.0)}
+        heap = [(_haversine_m(lats[source], lngs[source], goal_lat, goal_lng) / speed, 0.0, source)]
+        closed = set()
+
+        while heap:
+            _, cost, node = heapq.heappop(heap)
+            if node == target:
+                break
+            if node in closed:
+                continue
+            closed.add(node)
+            for edge in range(offsets[node], offsets[node + 1]):
+                neighbor = targets[edge]
+                new_cost = cost + durations[edge]
+                if new_cost < best.get(neighbor, math.inf):
+                    best[neighbor] = new_cost
+                    parents[neighbor] = (node, lengths[edge])
+                    estimate = _haversine_m(lats[neighbor], lngs[neighbor], goal_lat, goal_lng) / speed
+                    heapq.heappush(heap, (new_cost + estimate, new_cost, neighbor))
+        else:
+            return None
+
+        path = []
+        length = 0.0
+        node = target
+        while node != -1:
+            path.append(node)
+            node, edge_length = parents[node]
+            length += edge_length
+        path.reverse()
+        return path, length, best[target]
+
+    def route_leg(self, origin, destination):
+        """
+        Directions between two (lat, lng) points in the same shape as a
+        single-leg MapsService.fetch_directions response
+
+        Returns:
+            Directions dictionary, or None if the points are not connected
+            or either one is more than ROAD_GRAPH_MAX_SNAP_M from the graph
+        """
+        source = self.nearest_node(*origin, max_distance_m=ROAD_GRAPH_MAX_SNAP_M)
+        target = self.nearest_node(*destination, max_distance_m=ROAD_GRAPH_MAX_SNAP_M)
+        if source is None or target is None:
+            return None
+        result = self.shortest_path(source, target)
+        if result is None:
+            return None
+
+        path, length, duration = result
+        points = [(self.lats[node], self.lngs[node]) for node in path]
+        encoded = polyline_codec.encode(points)
+        distance = int(round(length))
+        seconds = int(round(duration))
+
+        leg = {
+            'distance': {'text': f"{distance / 1000:.1f} km", 'value': distance},
+            'duration': {'text': f"{seconds // 60} mins", 'value': seconds},
+            'start_location': {'lat': points[0][0], 'lng': points[0][1]},
+            'end_location': {'lat': points[-1][0], 'lng': points[-1][1]},
+            'steps': []
+        }
+        route = {
+            'summary': 'Offline road graph',
+            'legs': [leg],
+            'overview_polyline': {'points': encoded},
+            'bounds': {
+                'northeast': {'lat': max(lat for lat, _ in points), 'lng': max(lng for _, lng in points)},
+                'southwest': {'lat': min(lat for lat, _ in points), 'lng': min(lng for _, lng in points)}
+            },
+            'warnings': ['Computed offline from the local road graph'],
+            'waypoint_order': [],
+            'copyrights': ''
+        }
+        return {'route': route,
+                'polyline': encoded,
+                'total_distance': distance,
+                'total_duration': seconds}
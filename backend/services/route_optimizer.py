@@ -0,0 +1,175 @@
+# Route optimizer - reorders trip stops to shorten the route
+import os
+import time
+import numpy as np
+from utils.geo import DEFAULT_CIRCUITY, haversine_matrix
+
+# Used to turn road distance estimates into drive times
+AVERAGE_SPEED_KPH = float(os.getenv('ROUTE_OPTIMIZER_AVERAGE_SPEED_KPH', 80))
+ROUTE_OPTIMIZER_CIRCUITY = float(os.getenv('ROUTE_OPTIMIZER_CIRCUITY', DEFAULT_CIRCUITY))
+DEFAULT_TIME_BUDGET_MS = int(os.getenv('ROUTE_OPTIMIZER_TIME_BUDGET_MS', 200))
+
+METRICS = ('distance', 'duration')
+
+
+class RouteOptimizer:
+    """
+    Open-path TSP heuristics with fixed origin and destination
+
+    A nearest-neighbour tour is built first, then improved with 2-opt and
+    Or-opt moves until no move helps or the time budget runs out. Each
+    improvement pass scores every candidate move for a segment with one
+    NumPy expression, which keeps 100+ stop trips interactive.
+    """
+
+    @staticmethod
+    def cost_matrix(coordinates, metric='distance'):
+        """
+        Pairwise travel cost between stops
+
+        Args:
+            coordinates: List of (lat, lng) pairs
+            metric: 'distance' (km) or 'duration' (seconds, estimated from
+                road distance at AVERAGE_SPEED_KPH)
+
+        Returns:
+            (n, n) NumPy array
+        """
+        if metric not in METRICS:
+            raise ValueError(f"metric must be one of {', '.join(METRICS)}")
+        matrix = haversine_matrix(coordinates, ROUTE_OPTIMIZER_CIRCUITY)
+        if metric == 'duration':
+            matrix = matrix / AVERAGE_SPEED_KPH * 3600
+        return matrix
+
+    @staticmethod
+    def tour_cost(matrix, order):
+        order = np.asarray(order)
+        return float(matrix[order[:-1], order[1:]].sum())
+
+    @staticmethod
+    def optimize(coordinates, metric='distance', time_budget_ms=DEFAULT_TIME_BUDGET_MS):
+        """
+        Reorder the intermediate stops to minimize total cost
+
+        Args:
+            coordinates: List of (lat, lng) pairs; the first and last stay fixed
+            metric: 'distance' or 'duration'
+            time_budget_ms: Return the best order found within this many milliseconds
+
+        Returns:
+            Dictionary with the new order (indices into coordinates) and costs
+        """
+        started = time.monotonic()
+        deadline = started + max(0, time_budget_ms) / 1000
+        matrix = RouteOptimizer.cost_matrix(coordinates, metric)
+        n = len(coordinates)
+
+        initial_order = list(range(n))
+        initial_cost = RouteOptimizer.tour_cost(matrix, initial_order) if n > 1 else 0.0
+
+        order = initial_order
+        if n > 3:
+            candidate = RouteOptimizer.nearest_neighbour(matrix)
+            if RouteOptimizer.tour_cost(matrix, candidate) < initial_cost:
+                order = candidate
+            order = RouteOptimizer.improve(matrix, order, deadline)
+
+        optimized_cost = RouteOptimizer.tour_cost(matrix, order) if n > 1 else 0.0
+        return {
+            'order': [int(index) for index in order],
+            'metric': metric,
+            'initial_cost': round(initial_cost, 3),
+            'optimized_cost': round(optimized_cost, 3),
+            'elapsed_ms': round((time.monotonic() - started) * 1000, 1)
+        }
+
+    @staticmethod
+    def nearest_neighbour(matrix):
+        """Greedy tour from the first stop, always visiting the closest unvisited stop next"""
+        n = len(matrix)
+        unvisited = np.ones(n, dtype=bool)
+        unvisited[[0, n - 1]] = False
+        order = [0]
+        for _ in range(n - 2):
+            distances = np.where(unvisited, matrix[order[-1]], np.inf)
+            nearest = int(np.argmin(distances))
+            unvisited[nearest] = False
+            order.append(nearest)
+        order.append(n - 1)
+        return order
+
+    @staticmethod
+    def improve(matrix, order, deadline):
+        """Alternate 2-opt and Or-opt passes until neither improves or time is up"""
+        order = np.asarray(order)
+        while time.monotonic() < deadline:
+            improved = RouteOptimizer.two_opt_pass(matrix, order, deadline)
+            improved = RouteOptimizer.or_opt_pass(matrix, order, deadline) or improved
+            if not improved:
+                break
+        return order.tolist()
+
+    @staticmethod
+    def two_opt_pass(matrix, order, deadline):
+        """
+        Reverse order[i:j + 1] wherever that shortens the tour (in place)
+
+        Returns:
+            True if any reversal was applied
+        """
+        n = len(order)
+        improved = False
+        for i in range(1, n - 2):
+            if time.monotonic() >= deadline:
+                break
+            js = np.arange(i + 1, n - 1)
+            a, b = order[i - 1], order[i]
+            c, d = order[js], order[js + 1]
+            delta = matrix[a, c] + matrix[b, d] - matrix[a, b] - matrix[c, d]
+            best = int(np.argmin(delta))
+            if delta[best] < -1e-9:
+                j = js[best]
+                order[i:j + 1] = order[i:j + 1][::-1].copy()
+                improved = True
+        return improved
+
+    @staticmethod
+    def or_opt_pass(matrix, order, deadline, max_segment=3):
+        """
+        Move segments of 1..max_segment stops (optionally reversed) to a
+        better position in the tour (in place)
+
+        Returns:
+            True if any segment was moved
+        """
+        n = len(order)
+        improved = False
+        for length in range(1, max_segment + 1):
+            i = 1
+            while i + length <= n - 1:
+                if time.monotonic() >= deadline:
+                    return improved
+                segment = order[i:i + length].copy()
+                first, last = segment[0], segment[-1]
+                prev, nxt = order[i - 1], order[i + length]
+                removal_gain = matrix[prev, first] + matrix[last, nxt] - matrix[prev, nxt]
+
+                rest = np.concatenate((order[:i], order[i + length:]))
+                left, right = rest[:-1], rest[1:]
+                insert_cost = matrix[left, first] + matrix[last, right] - matrix[left, right]
+                insert_reversed = matrix[left, last] + matrix[first, right] - matrix[left, right]
+                best_forward = int(np.argmin(insert_cost))
+                best_reversed = int(np.argmin(insert_reversed))
+
+                if insert_reversed[best_reversed] < insert_cost[best_forward]:
+                    position, cost, segment = best_reversed, insert_reversed[best_reversed], segment[::-1]
+                else:
+                    position, cost = best_forward, insert_cost[best_forward]
+
+                if cost - removal_gain < -1e-9:
+                    order[:] = np.concatenate((rest[:position + 1], segment, rest[position + 1:]))
+                    improved = True
+                else:
+                    i += 1
+        return improved
@@ -0,0 +1,201 @@
+# Spatial service - nearby and in-viewport lookups of saved stops and trips
+import math
+import os
+import numpy as np
+from utils import db
+from utils.geo import bounding_box, distances_from
+
+SPATIAL_DEFAULT_LIMIT = int(os.getenv('SPATIAL_DEFAULT_LIMIT', 50))
+SPATIAL_MAX_LIMIT = int(os.getenv('SPATIAL_MAX_LIMIT', 500))
+SPATIAL_MAX_RADIUS_KM = float(os.getenv('SPATIAL_MAX_RADIUS_KM', 500))
+# Candidates fetched per result, nearest first by a flat-earth offset; the
+# spare ones cover where that order and great-circle distance disagree
+SPATIAL_CANDIDATE_FACTOR = int(os.getenv('SPATIAL_CANDIDATE_FACTOR', 4))
+
+
+class SpatialService:
+    """
+    Location queries over saved stops, served by the stops_rtree index
+
+    The R*Tree narrows the search to the stops inside a bounding box without
+    touching the rest of the table. SQL orders those by their squared
+    offset from the center and returns only limit * SPATIAL_CANDIDATE_FACTOR
+    of them (of trips, when grouping), which are then ranked by
+    great-circle distance in one NumPy pass.
+    """
+
+    @staticmethod
+    def nearby(latitude, longitude, radius_km, limit=SPATIAL_DEFAULT_LIMIT, user_id=None, group=None):
+        """
+        Saved stops (or trips) within radius_km of a point, nearest first
+
+        Args:
+            latitude: Latitude of the point
+            longitude: Longitude of the point
+            radius_km: Search radius in kilometers
+            limit: Maximum number of results
+            user_id: Only stops on this user's trips
+            group: 'trips' to return trips ranked by their nearest stop
+
+        Returns:
+            Result dictionary with stops (or trips), each with distance_km
+        """
+        SpatialService._validate(latitude=latitude, longitude=longitude, limit=limit)
+        if not 0 < radius_km <= SPATIAL_MAX_RADIUS_KM:
+            raise ValueError(f"radius_km must be between 0 and {SPATIAL_MAX_RADIUS_KM}")
+
+        south, west, north, east = bounding_box(latitude, longitude, radius_km)
+        candidates = SpatialService._candidates(south, west, north, east, latitude, longitude,
+                                                limit, user_id, group)
+        return SpatialService._rank(candidates, latitude, longitude, limit, group, radius_km=radius_km)
+
+    @staticmethod
+    def within(south, west, north, east, limit=SPATIAL_DEFAULT_LIMIT, user_id=None, group=None):
+        """
+        Saved stops (or trips) inside a map viewport, nearest to its center first
+
+        A box with west > east crosses the antimeridian.
+
+        Args:
+            south, west, north, east: Viewport bounds in degrees
+            limit: Maximum number of results
+            user_id: Only stops on this user's trips
+            group: 'trips' to return trips ranked by their nearest stop
+
+        Returns:
+            Result dictionary with stops (or trips), each with distance_km from the center
+        """
+        SpatialService._validate(latitude=south, longitude=west, limit=limit)
+        SpatialService._validate(latitude=north, longitude=east)
+        if south > north:
+            raise ValueError('south must not be greater than north')
+
+        if west > east:
+            east += 360
+        center_lat, center_lng = (south + north) / 2, (west + east) / 2
+        candidates = SpatialService._candidates(south, west, north, east, center_lat, center_lng,
+                                                limit, user_id, group)
+        return SpatialService._rank(candidates, center_lat, center_lng, limit, group)
+
+    @staticmethod
+    def _validate(latitude, longitude, limit=None):
+        if not -90 <= latitude <= 90:
+            raise ValueError('latitude must be between -90 and 90')
+        if not -180 <= longitude <= 180:
+            raise ValueError('longitude must be between -180 and 180')
+        if limit is not None and not 1 <= limit <= SPATIAL_MAX_LIMIT:
+            raise ValueError(f"limit must be between 1 and {SPATIAL_MAX_LIMIT}")
+
+    @staticmethod
+    def _longitude_ranges(west, east):
+        """Split a longitude span that may leave [-180, 180] into ranges inside it"""
+        if east - west >= 360:
+            return [(-180.0, 180.0)]
+        if west < -180:
+            return [(west + 360, 180.0), (-180.0, east)]
+        if east > 180:
+            return [(west, 180.0), (-180.0, east - 360)]
+        return [(west, east)]
+
+    @staticmethod
+    def _candidates(south, west, north, east, latitude, longitude, limit, user_id, group):
+        """
+        Stops inside the bounds nearest to (latitude, longitude), at most
+        limit * SPATIAL_CANDIDATE_FACTOR of them, or with group='trips' all
+        the matching stops of that many trips
+        """
+        # Squared offset in degrees with longitude scaled to the center's
+        # latitude: cheap in SQL and nearest-first close to great-circle order
+        offset = '(stops.latitude - ?) * (stops.latitude - ?) + (stops.longitude - ?) * (stops.longitude - ?) * ?'
+        scale = math.cos(math.radians(latitude)) ** 2
+        user_filter = ' AND trips.user_id = ?' if user_id is not None else ''
+        rows = []
+        with db.connection() as conn:
+            for range_west, range_east in SpatialService._longitude_ranges(west, east):
+                # The center's longitude on the same side of the antimeridian as this range
+                center_lng = longitude + 360 * round(((range_west + range_east) / 2 - longitude) / 360)
+                offset_params = [latitude, latitude, center_lng, center_lng, scale]
+                # The stops columns drop what only the R*Tree's outward-rounded boxes let in
+                where = f'''
+                    stops_rtree.min_latitude <= ? AND stops_rtree.max_latitude >= ?
+                      AND stops_rtree.min_longitude <= ? AND stops_rtree.max_longitude >= ?
+                      AND stops.latitude BETWEEN ? AND ? AND stops.longitude BETWEEN ? AND ?{user_filter}
+                '''
+                where_params = [north, south, range_east, range_west, south, north, range_west, range_east]
+                if user_id is not None:
+                    where_params.append(user_id)
+
+                if group == 'trips':
+                    rows += conn.execute(f'''
+                        SELECT stops.id, stops.trip_id, stops.latitude, stops.longitude, stops.stop_type,
+                               stops.time_minutes, stops.cost, trips.user_id, trips.name AS trip_name
+                        FROM stops_rtree
+                        JOIN stops ON stops.id = stops_rtree.id
+                        JOIN trips ON trips.id = stops.trip_id
+                        WHERE {where} AND stops.trip_id IN (
+                            SELECT stops.trip_id FROM stops_rtree
+                            JOIN stops ON stops.id = stops_rtree.id
+                            JOIN trips ON trips.id = stops.trip_id
+                            WHERE {where}
+                            GROUP BY stops.trip_id ORDER BY MIN({offset}) LIMIT ?
+                        )
+                    ''', where_params + where_params + offset_params
+                       + [limit * SPATIAL_CANDIDATE_FACTOR]).fetchall()
+                else:
+                    rows += conn.execute(f'''
+                        SELECT stops.id, stops.trip_id, stops.latitude, stops.longitude, stops.stop_type,
+                               stops.time_minutes, stops.cost, trips.user_id, trips.name AS trip_name
+                        FROM stops_rtree
+                        JOIN stops ON stops.id = stops_rtree.id
+                        JOIN trips ON trips.id = stops.trip_id
+                        WHERE {where}
+                        ORDER BY {offset} LIMIT ?
+                    ''', where_params + offset_params + [limit * SPATIAL_CANDIDATE_FACTOR]).fetchall()
+        return rows
+
+    @staticmethod
+    def _rank(rows, latitude, longitude, limit, group, radius_km=None):
+        if not rows:
+            return {'success': True, 'trips' if group == 'trips' else 'stops': [], 'count': 0}
+
+        distances = distances_from(latitude, longitude, [(row['latitude'], row['longitude']) for row in rows])
+        order = np.argsort(distances, kind='stable')
+        if radius_km is not None:
+            order = order[distances[order] <= radius_km]
+
+        if group == 'trips':
+            trips = {}
+            for index in order:
+                row = rows[index]
+                trip = trips.get(row['trip_id'])
+                if trip is None:
+                    if len(trips) >= limit:
+                        continue
+                    trips[row['trip_id']] = trip = {
+                        'trip_id': row['trip_id'],
+                        'name': row['trip_name'],
+                        'user_id': row['user_id'],
+                        'distance_km': round(float(distances[index]), 3),
+                        'nearest_stop_id': row['id'],
+                        'matching_stops': 0
+                    }
+                trip['matching_stops'] += 1
+            results = list(trips.values())
+            return {'success': True, 'trips': results, 'count': len(results)}
+
+        stops = []
+        for index in order[:limit]:
+            row = rows[index]
+            stops.append({
+                'id': row['id'],
+                'trip_id': row['trip_id'],
+                'trip_name': row['trip_name'],
+                'user_id': row['user_id'],
+                'latitude': row['latitude'],
+                'longitude': row['longitude'],
+                'stop_type': row['stop_type'],
+                'time_minutes': row['time_minutes'],
+                'cost': row['cost'],
+                'distance_km': round(float(distances[index]), 3)
+            })
+        return {'success': True, 'stops': stops, 'count': len(stops)}
@@ -0,0 +1,218 @@
+# Stop service - add, move, edit and delete single stops of a saved trip
+from models.stop import StopType, RANK_GAP
+from models.trip import invalidate_trip
+from utils import db
+
+
+class StopService:
+    """
+    Single-stop edits that write one stops row each
+
+    Stops are ordered by sparse integer ranks (stop_order), RANK_GAP apart
+    when freshly numbered. Placing a stop between two others gives it the
+    midpoint of their ranks, so nothing else is renumbered. Only when two
+    neighbours end up adjacent is the trip rebalanced back to even gaps.
+
+    Every edit may carry the trip version the client last saw. If the trip
+    has changed since (triggers bump trips.version on any change), the edit
+    is refused with status 409 and the current version.
+    """
+
+    @staticmethod
+    def add_stop(trip_id, data, version=None):
+        """
+        Insert a stop into a trip
+
+        Args:
+            trip_id: Trip to add to
+            data: Stop fields (location or latitude/longitude, type, time, cost)
+                  and an optional position (index in the trip; default last)
+            version: Trip version the client expects, or None to skip the check
+
+        Returns:
+            Result dictionary with the new stop and trip version
+        """
+        try:
+            fields = StopService.parse_fields(data)
+            if 'latitude' not in fields:
+                return {'success': False, 'error': 'location is required', 'status': 400}
+
+            with db.transaction() as conn:
+                error = StopService.check_version(conn, trip_id, version)
+                if error:
+                    return error
+                fields.setdefault('stop_type', 'MISC')
+                fields['stop_order'] = StopService._rank_at(conn, trip_id, data.get('position'))
+                columns = ', '.join(fields)
+                cursor = conn.execute(
+                    f"INSERT INTO stops (trip_id, {columns}) VALUES (?{', ?' * len(fields)})",
+                    [trip_id, *fields.values()]
+                )
+                result = StopService._result(conn, cursor.lastrowid, trip_id)
+            invalidate_trip(trip_id)
+            return result
+        except ValueError as e:
+            return {'success': False, 'error': str(e), 'status': 400}
+        except Exception as e:
+            return {'success': False, 'error': str(e), 'status': 500}
+
+    @staticmethod
+    def edit_stop(stop_id, data, version=None):
+        """
+        Move a stop and/or change its fields
+
+        Args:
+            stop_id: Stop to edit
+            data: Any of position (new index in the trip), location,
+                  latitude/longitude, type, time and cost
+            version: Trip version the client expects, or None to skip the check
+
+        Returns:
+            Result dictionary with the updated stop and trip version
+        """
+        try:
+            fields = StopService.parse_fields(data)
+            if not fields and data.get('position') is None:
+                return {'success': False, 'error': 'No fields to update', 'status': 400}
+
+            with db.transaction() as conn:
+                stop = conn.execute('SELECT trip_id FROM stops WHERE id = ?', (stop_id,)).fetchone()
+                if not stop:
+                    return {'success': False, 'error': 'Stop not found', 'status': 404}
+                error = StopService.check_version(conn, stop['trip_id'], version)
+                if error:
+                    return error
+                if data.get('position') is not None:
+                    fields['stop_order'] = StopService._rank_at(conn, stop['trip_id'], data['position'], stop_id)
+                assignments = ', '.join(f"{column} = ?" for column in fields)
+                conn.execute(f"UPDATE stops SET {assignments} WHERE id = ?", [*fields.values(), stop_id])
+                result = StopService._result(conn, stop_id, stop['trip_id'])
+            invalidate_trip(stop['trip_id'])
+            return result
+        except ValueError as e:
+            return {'success': False, 'error': str(e), 'status': 400}
+        except Exception as e:
+            return {'success': False, 'error': str(e), 'status': 500}
+
+    @staticmethod
+    def move_stop(stop_id, position, version=None):
+        """Move a stop to a new index in its trip"""
+        return StopService.edit_stop(stop_id, {'position': position}, version)
+
+    @staticmethod
+    def delete_stop(stop_id, version=None):
+        """Delete a stop; the remaining stops keep their ranks"""
+        try:
+            with db.transaction() as conn:
+                stop = conn.execute('SELECT trip_id FROM stops WHERE id = ?', (stop_id,)).fetchone()
+                if not stop:
+                    return {'success': False, 'error': 'Stop not found', 'status': 404}
+                error = StopService.check_version(conn, stop['trip_id'], version)
+                if error:
+                    return error
+                conn.execute('DELETE FROM stops WHERE id = ?', (stop_id,))
+                version = StopService._version(conn, stop['trip_id'])
+            invalidate_trip(stop['trip_id'])
+            return {'success': True, 'message': 'Stop deleted successfully', 'version': version}
+        except ValueError as e:
+            return {'success': False, 'error': str(e), 'status': 400}
+        except Exception as e:
+            return {'success': False, 'error': str(e), 'status': 500}
+
+    @staticmethod
+    def rebalance(conn, trip_id):
+        """Renumber a trip's stops RANK_GAP apart, keeping their order"""
+        stop_ids = [row['id'] for row in conn.execute(
+            'SELECT id FROM stops WHERE trip_id = ? ORDER BY stop_order, id', (trip_id,)
+        ).fetchall()]
+        conn.executemany('UPDATE stops SET stop_order = ? WHERE id = ?',
+                         [((index + 1) * RANK_GAP, stop_id) for index, stop_id in enumerate(stop_ids)])
+
+    @staticmethod
+    def parse_fields(data):
+        """
+        Stop columns to write from request data
+
+        Raises:
+            ValueError: for an unknown stop type or a malformed location
+        """
+        fields = {}
+        if data.get('location') is not None:
+            location = data['location']
+            if not isinstance(location, (list, tuple)) or len(location) != 2:
+                raise ValueError('location must be [latitude, longitude]')
+            fields['latitude'], fields['longitude'] = float(location[0]), float(location[1])
+        elif data.get('latitude') is not None and data.get('longitude') is not None:
+            fields['latitude'], fields['longitude'] = float(data['latitude']), float(data['longitude'])
+        if data.get('type') is not None:
+            stop_type = str(data['type']).upper()
+            if stop_type not in StopType.__members__:
+                raise ValueError(f"Unknown stop type: {data['type']}")
+            fields['stop_type'] = stop_type
+        if data.get('time') is not None:
+            fields['time_minutes'] = int(data['time'])
+        if data.get('cost') is not None:
+            fields['cost'] = float(data['cost'])
+        return fields
+
+    @staticmethod
+    def _rank_at(conn, trip_id, position, exclude_id=None):
+        """
+        Rank that places a stop at index position among the trip's other stops
+
+        Only the two neighbouring ranks are read. If they are adjacent the
+        trip is rebalanced first, which is the one case that writes more
+        than one row.
+        """
+        exclude_id = exclude_id or -1
+        for _ in range(2):
+            if position is None:
+                before = conn.execute(
+                    'SELECT MAX(stop_order) FROM stops WHERE trip_id = ? AND id != ?', (trip_id, exclude_id)
+                ).fetchone()[0]
+                after = None
+            else:
+                position = max(0, int(position))
+                ranks = [row[0] for row in conn.execute(
+                    'SELECT stop_order FROM stops WHERE trip_id = ? AND id != ? ORDER BY stop_order LIMIT ? OFFSET ?',
+                    (trip_id, exclude_id, 2 if position else 1, max(0, position - 1))
+                ).fetchall()]
+                if position == 0:
+                    before, after = None, (ranks[0] if ranks else None)
+                elif not ranks:
+                    return StopService._rank_at(conn, trip_id, None, exclude_id)
+                else:
+                    before, after = ranks[0], (ranks[1] if len(ranks) > 1 else None)
+
+            if before is None and after is None:
+                return RANK_GAP
+            if before is None:
+                return after - RANK_GAP
+            if after is None:
+                return before + RANK_GAP
+            if after - before >= 2:
+                return (before + after) // 2
+            StopService.rebalance(conn, trip_id)
+        raise RuntimeError('Could not find a free rank after rebalancing')
+
+    @staticmethod
+    def _version(conn, trip_id):
+        return conn.execute('SELECT version FROM trips WHERE id = ?', (trip_id,)).fetchone()['version']
+
+    @staticmethod
+    def check_version(conn, trip_id, expected):
+        """Error result (404, or 409 with the current version) unless trip_id is at version expected"""
+        row = conn.execute('SELECT version FROM trips WHERE id = ?', (trip_id,)).fetchone()
+        if not row:
+            return {'success': False, 'error': 'Trip not found', 'status': 404}
+        if expected is not None and int(expected) != row['version']:
+            return {'success': False,
+                    'error': 'Trip was changed by another edit; reload it and try again',
+                    'status': 409,
+                    'version': row['version']}
+        return None
+
+    @staticmethod
+    def _result(conn, stop_id, trip_id):
+        stop = conn.execute('SELECT * FROM stops WHERE id = ?', (stop_id,)).fetchone()
+        return {'success': True, 'stop': dict(stop), 'version': StopService._version(conn, trip_id)}
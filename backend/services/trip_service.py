@@ -1,8 +1,27 @@
 # Trip service - business logic for trip operations
-import sqlite3
-from models.trip import Trip
-from models.stop import Stop, StopType
+from models.trip import Trip, SUMMARY_SELECT, invalidate_trip
+from models.stop import Stop, StopType, RANK_GAP
+from models.stop_array import StopArray
+from services.stop_service import StopService
+import base64
+import binascii
+import json
+import os
+import re
 from datetime import datetime
+from utils import db
+
+TRIP_PAGE_DEFAULT_LIMIT = int(os.getenv('TRIP_PAGE_DEFAULT_LIMIT', 24))
+TRIP_PAGE_MAX_LIMIT = int(os.getenv('TRIP_PAGE_MAX_LIMIT', 200))
+# Trips (and their stops) loaded per round while a listing is streamed
+TRIP_STREAM_BATCH = int(os.getenv('TRIP_STREAM_BATCH', 50))
+TRIP_SEARCH_DEFAULT_LIMIT = int(os.getenv('TRIP_SEARCH_DEFAULT_LIMIT', 20))
+TRIP_SEARCH_MAX_LIMIT = int(os.getenv('TRIP_SEARCH_MAX_LIMIT', 100))
+
+# Fields the trip listing can return: trips columns, then totals from trip_summary
+TRIP_COLUMNS = ('id', 'user_id', 'name', 'description', 'image_url', 'created_at', 'version')
+TRIP_LISTING_FIELDS = TRIP_COLUMNS + ('stop_count', 'total_cost', 'total_time', 'bounds', 'last_modified')
+
 
 class TripService:
     
@@ -18,7 +37,7 @@ class TripService:
                 time = stop_data.get('time', 0)
                 cost = stop_data.get('cost', 0)
                 
-                stop = Stop(location=location, stop_type=stop_type, time=time, cost=cost)
+                stop = Stop(location=location, type=stop_type, time=time, cost=cost)
                 trip.add_stop(stop)
             
             trip.save_to_db()
@@ -27,85 +46,250 @@ class TripService:
             return {'success': False, 'error': str(e)}
     
     @staticmethod
-    def get_trip(trip_id):
-        """Fetch a trip by ID"""
+    def trip_version(trip_id):
+        """Current trips.version of a trip, or None if it does not exist"""
+        return Trip.stored_version(trip_id)
+    
+    @staticmethod
+    def user_version(user_id):
+        """Counter bumped on every change to any of the user's trips (0 before the first one)"""
+        with db.connection() as conn:
+            row = conn.execute('SELECT version FROM user_versions WHERE user_id = ?', (user_id,)).fetchone()
+        return row['version'] if row else 0
+    
+    @staticmethod
+    def get_trip(trip_id, stream=False):
+        """Fetch a trip by ID (with stream, its stops are a generator for stream_json)"""
         try:
-            conn = sqlite3.connect('database.db')
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+            trip = Trip.get_from_db(trip_id)
+            if not trip:
+                return {'success': False, 'error': 'Trip not found'}
+            return {'success': True, 'trip': trip.to_dict(lazy_stops=stream)}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+    
+    @staticmethod
+    def parse_listing_query(args):
+        """
+        Read the trip listing options from request query parameters
+        
+        Args:
+            args: Mapping with optional cursor, limit, fields (comma separated),
+                  include (stops to add each trip's stops) and stream (1 to stream)
+        
+        Returns:
+            Keyword arguments for get_user_trips
+        
+        Raises:
+            ValueError: for a bad limit, cursor or field name
+        """
+        options = {'cursor': args.get('cursor') or None}
+        if args.get('limit'):
+            options['limit'] = int(args['limit'])
+        if args.get('fields'):
+            options['fields'] = [field.strip() for field in args['fields'].split(',') if field.strip()]
+        includes = {part.strip() for part in (args.get('include') or '').split(',')}
+        options['include_stops'] = 'stops' in includes
+        options['stream'] = args.get('stream') in ('1', 'true')
+        return options
+    
+    @staticmethod
+    def get_user_trips(user_id, cursor=None, limit=TRIP_PAGE_DEFAULT_LIMIT, fields=None, include_stops=False,
+                       stream=False, id_key='id'):
+        """
+        One page of a user's trips, newest first
+        
+        Pages are keyed on (created_at, id) rather than an offset, so each
+        page is one range read of idx_trips_user_created however many trips
+        the user has. Only the requested fields are selected, and trip_summary
+        is joined only when a total is asked for.
+        
+        Args:
+            user_id: Owner of the trips
+            cursor: next_cursor from the previous page, or None for the first page
+            limit: Page size
+            fields: Listing fields to return (default all); id is always included
+            include_stops: Add each trip's stops, in order, shaped as in Trip.to_dict()
+            stream: Return trips as a generator for stream_json, which loads
+                    stops TRIP_STREAM_BATCH trips at a time as it is consumed
+            id_key: Key the trip id is returned under ('trip_id' matches
+                    Trip.to_dict(), which app.py and the trips blueprint return)
+        
+        Returns:
+            Result dictionary with trips and next_cursor (None on the last page)
+        """
+        try:
+            if not 1 <= limit <= TRIP_PAGE_MAX_LIMIT:
+                raise ValueError(f"limit must be between 1 and {TRIP_PAGE_MAX_LIMIT}")
+            fields = ['id' if field == id_key else field for field in fields or TRIP_LISTING_FIELDS]
+            unknown = [field for field in fields if field not in TRIP_LISTING_FIELDS]
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+            if 'id' not in fields:
+                fields.insert(0, 'id')
             
-            # Get trip
-            cursor.execute('SELECT * FROM trips WHERE id = ?', (trip_id,))
-            trip_row = cursor.fetchone()
+            columns = ', '.join(f"trips.{field}" for field in fields if field in TRIP_COLUMNS)
+            summary_fields = [field for field in fields if field not in TRIP_COLUMNS]
+            summary_join = ''
+            if summary_fields:
+                columns += f", {SUMMARY_SELECT}"
+                summary_join = 'LEFT JOIN trip_summary ON trip_summary.trip_id = trips.id'
             
-            if not trip_row:
-                return {'success': False, 'error': 'Trip not found'}
+            where, params = 'trips.user_id = ?', [user_id]
+            if cursor:
+                where += ' AND (trips.created_at, trips.id) < (?, ?)'
+                params += TripService.decode_cursor(cursor)
             
-            # Get stops for this trip
-            cursor.execute('SELECT * FROM stops WHERE trip_id = ? ORDER BY stop_order', (trip_id,))
-            stops_rows = cursor.fetchall()
-            
-            conn.close()
-            
-            # Build trip object
-            trip = Trip(
-                user_id=trip_row['user_id'],
-                trip_id=trip_row['id'],
-                name=trip_row['name'],
-                description=trip_row['description'],
-                image_url=trip_row['image_url']
-            )
-            trip.created_at = trip_row['created_at']
-            
-            # Add stops
-            for stop_row in stops_rows:
-                stop = Stop(
-                    location=[stop_row['latitude'], stop_row['longitude']],
-                    stop_type=StopType[stop_row['stop_type']],
-                    time=stop_row['time_minutes'],
-                    cost=stop_row['cost']
-                )
-                trip.add_stop(stop)
+            with db.connection() as conn:
+                rows = conn.execute(f'''
+                    SELECT {columns}, trips.created_at AS cursor_created_at FROM trips {summary_join}
+                    WHERE {where}
+                    ORDER BY trips.created_at DESC, trips.id DESC
+                    LIMIT ?
+                ''', params + [limit + 1]).fetchall()
+            rows, more = rows[:limit], len(rows) > limit
             
-            return {'success': True, 'trip': trip.to_dict()}
+            trips = TripService._listing_items(rows, fields, summary_fields, include_stops, id_key)
+            if not stream:
+                trips = list(trips)
+            
+            next_cursor = None
+            if more:
+                next_cursor = TripService.encode_cursor(rows[-1]['cursor_created_at'], rows[-1]['id'])
+            return {'success': True, 'trips': trips, 'next_cursor': next_cursor}
+        except ValueError as e:
+            return {'success': False, 'error': str(e), 'status': 400}
         except Exception as e:
-            return {'success': False, 'error': str(e)}
+            return {'success': False, 'error': str(e), 'status': 500}
+    
+    @staticmethod
+    def _listing_items(rows, fields, summary_fields, include_stops, id_key='id'):
+        """
+        Listing dictionaries for trips rows, with stops loaded one batch of trips at a time
+        
+        Each batch's stops are one query into a StopArray that every trip
+        gets a slice of, so no Stop objects are built for the listing.
+        """
+        for start in range(0, len(rows), TRIP_STREAM_BATCH):
+            batch = rows[start:start + TRIP_STREAM_BATCH]
+            stops_by_trip = {}
+            if include_stops:
+                trip_ids = [row['id'] for row in batch]
+                with db.connection() as conn:
+                    stops_rows = conn.execute(f'''
+                        SELECT * FROM stops WHERE trip_id IN ({', '.join('?' * len(trip_ids))})
+                        ORDER BY trip_id, stop_order
+                    ''', trip_ids).fetchall()
+                stops = StopArray.from_rows(stops_rows)
+                first = 0
+                for end in range(1, len(stops_rows) + 1):
+                    if end == len(stops_rows) or stops_rows[end]['trip_id'] != stops_rows[first]['trip_id']:
+                        stops_by_trip[stops_rows[first]['trip_id']] = stops[first:end]
+                        first = end
+            
+            for row in batch:
+                trip = {id_key if field == 'id' else field: row[field]
+                        for field in fields if field in TRIP_COLUMNS}
+                if summary_fields:
+                    summary = Trip.summary_from_row(row)
+                    trip.update((field, summary[field]) for field in summary_fields)
+                if include_stops:
+                    trip['stops'] = list(stops_by_trip.pop(row['id'], StopArray()).iter_dicts())
+                yield trip
     
     @staticmethod
-    def get_user_trips(user_id):
-        """Fetch all trips for a user"""
+    def iter_stop_rows(trip_id, batch_size=TRIP_STREAM_BATCH):
+        """Yield a trip's stops rows as dictionaries, in order, fetching batch_size rows at a time"""
+        with db.connection() as conn:
+            cursor = conn.execute('SELECT * FROM stops WHERE trip_id = ? ORDER BY stop_order', (trip_id,))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                for row in rows:
+                    yield dict(row)
+    
+    @staticmethod
+    def encode_cursor(created_at, trip_id):
+        """Opaque cursor for the trip after which the next page starts"""
+        return base64.urlsafe_b64encode(json.dumps([created_at, trip_id]).encode()).decode()
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        """
+        (created_at, id) from a cursor made by encode_cursor
+        
+        Raises:
+            ValueError: if the cursor was not made by encode_cursor
+        """
         try:
-            conn = sqlite3.connect('database.db')
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute('SELECT * FROM trips WHERE user_id = ? ORDER BY created_at DESC', (user_id,))
-            trips_rows = cursor.fetchall()
-            conn.close()
-            
-            trips = []
-            for trip_row in trips_rows:
-                trip = Trip(
-                    user_id=trip_row['user_id'],
-                    trip_id=trip_row['id'],
-                    name=trip_row['name'],
-                    description=trip_row['description'],
-                    image_url=trip_row['image_url']
-                )
-                trip.created_at = trip_row['created_at']
-                trips.append(trip.to_dict())
+            created_at, trip_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return [str(created_at), int(trip_id)]
+        except (TypeError, ValueError, binascii.Error):
+            raise ValueError('Invalid cursor')
+    
+    @staticmethod
+    def search_trips(query, user_id=None, limit=TRIP_SEARCH_DEFAULT_LIMIT, offset=0):
+        """
+        Full-text search over trip names and descriptions
+        
+        Every word must match, and the last one also matches as a prefix, so
+        "gra can" finds "Grand Canyon". Results are ranked with bm25, with
+        name matches weighted above description matches.
+        
+        Args:
+            query: Search text typed by the user
+            user_id: Only this user's trips
+            limit: Page size
+            offset: Number of results to skip
+        
+        Returns:
+            Result dictionary with a page of trips (with totals) and next_offset
+        """
+        try:
+            match = TripService.build_match_query(query)
+            if not match:
+                return {'success': False, 'error': 'Search query is empty'}
+            if not 1 <= limit <= TRIP_SEARCH_MAX_LIMIT:
+                return {'success': False, 'error': f"limit must be between 1 and {TRIP_SEARCH_MAX_LIMIT}"}
+            
+            user_filter = 'AND trips.user_id = ?' if user_id is not None else ''
+            params = [match] + ([user_id] if user_id is not None else []) + [limit + 1, max(0, offset)]
+            with db.connection() as conn:
+                rows = conn.execute(f'''
+                    SELECT trips.*, {SUMMARY_SELECT} FROM trips_fts
+                    JOIN trips ON trips.id = trips_fts.rowid
+                    LEFT JOIN trip_summary ON trip_summary.trip_id = trips.id
+                    WHERE trips_fts MATCH ? {user_filter}
+                    ORDER BY bm25(trips_fts, 10.0, 1.0), trips.created_at DESC, trips.id DESC
+                    LIMIT ? OFFSET ?
+                ''', params).fetchall()
             
-            return {'success': True, 'trips': trips}
+            trips = [Trip.listing_from_row(row) for row in rows[:limit]]
+            next_offset = offset + limit if len(rows) > limit else None
+            return {'success': True, 'trips': trips, 'next_offset': next_offset}
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    @staticmethod
+    def build_match_query(query):
+        """
+        Turn free text into an FTS5 MATCH expression
+        
+        Each word is quoted so FTS5 operators typed by the user are treated
+        as text, and the last word gets a * for prefix matching.
+        """
+        words = re.findall(r'\w+', query or '')
+        if not words:
+            return ''
+        terms = [f'"{word}"' for word in words]
+        terms[-1] += '*'
+        return ' '.join(terms)
+    
     @staticmethod
     def update_trip(trip_id, name=None, description=None, image_url=None):
         """Update trip details"""
         try:
-            conn = sqlite3.connect('database.db')
-            cursor = conn.cursor()
-            
             updates = []
             params = []
             
@@ -120,33 +304,64 @@ class TripService:
                 params.append(image_url)
             
             if not updates:
-                conn.close()
                 return {'success': False, 'error': 'No fields to update'}
             
             params.append(trip_id)
             query = f"UPDATE trips SET {', '.join(updates)} WHERE id = ?"
-            cursor.execute(query, params)
-            conn.commit()
-            conn.close()
+            with db.transaction() as conn:
+                conn.execute(query, params)
+            invalidate_trip(trip_id)
             
             return {'success': True, 'message': 'Trip updated successfully'}
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    @staticmethod
+    def reorder_stops(trip_id, order, version=None):
+        """
+        Persist a new stop order for a trip
+        
+        Args:
+            trip_id: Trip to reorder
+            order: List of current stop positions in their new order
+            version: Trip version the order was computed from, or None to
+                skip the check; a mismatch is answered with status 409
+        """
+        try:
+            with db.transaction() as conn:
+                error = StopService.check_version(conn, trip_id, version)
+                if error:
+                    return error
+                stop_ids = [row[0] for row in conn.execute(
+                    'SELECT id FROM stops WHERE trip_id = ? ORDER BY stop_order', (trip_id,)
+                ).fetchall()]
+                
+                if sorted(order) != list(range(len(stop_ids))):
+                    return {'success': False, 'error': 'Order must be a permutation of the trip stops', 'status': 400}
+                
+                conn.executemany(
+                    'UPDATE stops SET stop_order = ? WHERE id = ?',
+                    [((new_position + 1) * RANK_GAP, stop_ids[old_position]) for new_position, old_position in enumerate(order)]
+                )
+                new_version = conn.execute('SELECT version FROM trips WHERE id = ?', (trip_id,)).fetchone()['version']
+            invalidate_trip(trip_id)
+            
+            return {'success': True, 'message': 'Stops reordered successfully', 'version': new_version}
+        except (TypeError, ValueError) as e:
+            return {'success': False, 'error': str(e), 'status': 400}
+        except Exception as e:
+            return {'success': False, 'error': str(e), 'status': 500}
+    
     @staticmethod
     def delete_trip(trip_id):
         """Delete a trip and its stops"""
         try:
-            conn = sqlite3.connect('database.db')
-            cursor = conn.cursor()
-            
-            # Delete stops first
-            cursor.execute('DELETE FROM stops WHERE trip_id = ?', (trip_id,))
-            # Delete trip
-            cursor.execute('DELETE FROM trips WHERE id = ?', (trip_id,))
-            
-            conn.commit()
-            conn.close()
+            with db.transaction() as conn:
+                # Delete stops first
+                conn.execute('DELETE FROM stops WHERE trip_id = ?', (trip_id,))
+                # Delete trip
+                conn.execute('DELETE FROM trips WHERE id = ?', (trip_id,))
+            invalidate_trip(trip_id)
             
             return {'success': True, 'message': 'Trip deleted successfully'}
         except Exception as e:
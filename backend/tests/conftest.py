@@ -0,0 +1,41 @@
+import pytest
+
+from init_trips_db import init_database
+from models.stop import Stop, StopType
+from models.trip import Trip
+from utils import db
+
+
+@pytest.fixture
+def empty_database(tmp_path):
+    """Point utils.db at an empty file for the test and back at the original afterwards"""
+    original = db.DATABASE_PATH
+    db.configure(str(tmp_path / 'test.db'))
+    try:
+        yield
+    finally:
+        db.configure(original)
+
+
+@pytest.fixture
+def database(empty_database):
+    """Temporary database with every migration applied"""
+    init_database()
+
+
+@pytest.fixture
+def make_trip(database):
+    """
+    Factory that saves a trip and returns its id
+
+    Stops are Stop objects, or (latitude, longitude) pairs for FOOD stops
+    with no time or cost.
+    """
+    def make(stops=(), user_id=1, name='Trip', description=None):
+        trip = Trip(user_id=user_id, name=name, description=description)
+        for stop in stops:
+            if not isinstance(stop, Stop):
+                stop = Stop(location=tuple(stop), type=StopType.FOOD)
+            trip.add_stop(stop)
+        return trip.save_to_db()['trip_id']
+    return make
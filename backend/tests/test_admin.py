@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from models.stop import Stop, StopType
+from services.admin_service import AdminService
+from utils import db
+
+
+@pytest.fixture
+def users(make_trip):
+    with db.transaction() as conn:
+        conn.executemany('INSERT INTO users (email, password) VALUES (?, ?)',
+                         [(f"user{index}@{'gmail' if index % 2 else 'yahoo'}.com", 'x') for index in range(1, 8)])
+    for user_id in range(1, 8):
+        for index in range(user_id % 3):
+            make_trip([Stop(location=(30.0, -97.0), type=StopType.FOOD, cost=user_id),
+                       Stop(location=(31.0, -97.0), type=StopType.FUEL, cost=1)],
+                      user_id=user_id, name=f"Trip {user_id}.{index}")
+
+
+def test_stream_matches_full_listing(users):
+    """Test that the streamed listing has every user, their trips and stops, and totals"""
+    data = json.loads(''.join(AdminService.stream_users_json()))
+
+    assert data['stats'] == {'total_users': 7, 'total_trips': 7, 'total_stops': 14}
+    assert [user['user_id'] for user in data['users']] == list(range(1, 8))
+    assert data['next_after_id'] is None
+    user = data['users'][4]
+    assert user['trip_count'] == 2
+    assert user['trips'][0]['total_cost'] == 6
+    assert [stop['cost'] for stop in user['trips'][0]['stops']] == [5, 1]
+
+
+def test_keyset_pages_cover_all_users(users):
+    """Test that following next_after_id walks every user exactly once"""
+    seen = []
+    after_id = 0
+    while after_id is not None:
+        page = json.loads(''.join(AdminService.stream_users_json(after_id=after_id, limit=3)))
+        seen += [user['user_id'] for user in page['users']]
+        after_id = page['next_after_id']
+    assert seen == list(range(1, 8))
+
+
+def test_small_batches_give_same_users(users):
+    """Test that batch size does not change what iter_users returns"""
+    assert list(AdminService.iter_users(batch_size=2)) == list(AdminService.iter_users())
+
+
+def test_filters(users):
+    """Test the email and min_trips filters"""
+    users = list(AdminService.iter_users(email='GMAIL', min_trips=2))
+    assert [user['user_id'] for user in users] == [5]
+
+
+def test_parse_query_rejects_bad_limit():
+    """Test that out-of-range or non-numeric limits are rejected"""
+    with pytest.raises(ValueError):
+        AdminService.parse_query({'limit': '0'})
+    with pytest.raises(ValueError):
+        AdminService.parse_query({'limit': 'abc'})
+    assert AdminService.parse_query({'limit': '10', 'email': 'a'}) == {'after_id': 0, 'limit': 10, 'email': 'a'}
@@ -13,3 +13,82 @@ def test_calculate_food_cost():
 def test_total_trip_cost():
     """Test total trip cost calculation"""
     assert True
+
+def test_place_price_lookups_are_cached(tmp_path, monkeypatch):
+    """Test that repeat pricing of the same stop makes no new Places calls"""
+    from services import pricing_service
+    from services.pricing_service import PricingService
+    from utils.cache import PersistentCache
+
+    calls = []
+
+    class FakeGmaps:
+        def places_nearby(self, **kwargs):
+            calls.append('nearby')
+            return {'results': [{'place_id': 'abc'}]}
+
+        def place(self, place_id, fields=None):
+            calls.append('place')
+            return {'result': {'price_level': 2}}
+
+    monkeypatch.setattr(pricing_service, 'gmaps', FakeGmaps())
+    monkeypatch.setattr(pricing_service, 'price_cache',
+                        PersistentCache('place_prices', db_path=str(tmp_path / 'cache.db')))
+
+    assert PricingService.get_place_price_level('38.9072', '-77.0369', 'FOOD') == 25
+    assert PricingService.get_place_price_level(38.90721, -77.03691, 'FOOD') == 25
+    assert calls == ['nearby', 'place']
+
+
+def test_concurrent_budget_keeps_stop_order(monkeypatch):
+    """Test that concurrently priced stops come back in input order"""
+    import time
+    from services.pricing_service import PricingService
+
+    def fake_price(latitude, longitude, stop_type='MISC'):
+        time.sleep(0.05 * (5 - latitude))  # later stops finish first
+        return latitude
+
+    monkeypatch.setattr(PricingService, 'get_place_price_level', staticmethod(fake_price))
+    stops = [{'location': [i, 0], 'type': 'FOOD'} for i in range(5)]
+
+    result = PricingService.calculate_trip_budget(stops, [0] * 5, max_workers=5, deadline=5)
+
+    assert [s['estimated_price'] for s in result['stops']] == [0, 1, 2, 3, 4]
+    assert result['total_cost'] == 10
+
+
+def test_concurrent_budget_falls_back_after_deadline(monkeypatch):
+    """Test that stops missing the deadline get the default price"""
+    import time
+    from services.pricing_service import PricingService
+
+    def fake_price(latitude, longitude, stop_type='MISC'):
+        if latitude == 1:
+            time.sleep(0.5)
+        return 1
+
+    monkeypatch.setattr(PricingService, 'get_place_price_level', staticmethod(fake_price))
+    stops = [{'location': [i, 0], 'type': 'REST'} for i in range(3)]
+
+    result = PricingService.calculate_trip_budget(stops, [0] * 3, max_workers=3, deadline=0.1)
+
+    prices = [s['estimated_price'] for s in result['stops']]
+    assert prices == [1, PricingService.get_default_price('REST'), 1]
+
+
+def test_budget_uses_great_circle_distances_by_default(monkeypatch):
+    """Test that missing distances are filled in from stop coordinates"""
+    from services import pricing_service
+    from services.pricing_service import PricingService
+
+    monkeypatch.setattr(PricingService, 'get_place_price_level',
+                        staticmethod(lambda latitude, longitude, stop_type='MISC': 10))
+    monkeypatch.setattr(pricing_service, 'BUDGET_ROAD_CIRCUITY', 1.0)
+    # Austin -> Dallas is ~293km great-circle, so a $9.65 surcharge
+    stops = [{'location': ['30.2672', '-97.7431']}, {'location': ['32.7767', '-96.7970']}]
+
+    result = PricingService.calculate_trip_budget(stops, parallel=False)
+
+    assert result['stops'][0]['estimated_price'] == 10
+    assert abs(result['stops'][1]['estimated_price'] - 19.65) < 0.05
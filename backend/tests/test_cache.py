@@ -0,0 +1,155 @@
+import time
+
+from utils.cache import PersistentCache
+from utils.geo import geohash_encode
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_cache(tmp_path, **kwargs):
+    return PersistentCache('test', db_path=str(tmp_path / 'cache.db'), **kwargs)
+
+
+def test_cache_hit_skips_loader(tmp_path):
+    """Test that a cached value is returned without calling the loader again"""
+    cache = make_cache(tmp_path)
+    calls = []
+    loader = lambda: calls.append(1) or 42
+
+    assert cache.get_or_load('a', loader) == 42
+    assert cache.get_or_load('a', loader) == 42
+    assert len(calls) == 1
+
+
+def test_cache_survives_reopen(tmp_path):
+    """Test that entries persist across cache instances"""
+    make_cache(tmp_path).set('a', {'price': 25})
+    assert make_cache(tmp_path).get_or_load('a', lambda: None) == {'price': 25}
+
+
+def test_cache_stores_negative_results(tmp_path):
+    """Test that a None result is cached like any other value"""
+    cache = make_cache(tmp_path)
+    calls = []
+    loader = lambda: calls.append(1)
+
+    assert cache.get_or_load('missing', loader) is None
+    assert cache.get_or_load('missing', loader) is None
+    assert len(calls) == 1
+
+
+def test_cache_lru_eviction(tmp_path):
+    """Test that the least recently used entry is evicted at the size cap"""
+    clock = FakeClock()
+    cache = make_cache(tmp_path, max_entries=2, clock=clock)
+    cache.set('a', 1)
+    clock.now += 1
+    cache.set('b', 2)
+    clock.now += 1
+    cache.get_or_load('a', lambda: 0)  # touch a so b becomes the oldest
+    clock.now += 1
+    cache.set('c', 3)
+
+    assert len(cache) == 2
+    assert cache.get_or_load('a', lambda: 'reloaded') == 1
+    assert cache.get_or_load('b', lambda: 'reloaded') == 'reloaded'
+
+
+def test_cache_expired_entry_reloads(tmp_path):
+    """Test that entries past TTL and stale window are reloaded"""
+    clock = FakeClock()
+    cache = make_cache(tmp_path, ttl=10, stale_ttl=0, clock=clock)
+    cache.set('a', 1)
+    clock.now += 11
+    assert cache.get_or_load('a', lambda: 2) == 2
+
+
+def test_cache_stale_while_revalidate(tmp_path):
+    """Test that stale entries are served while being refreshed"""
+    clock = FakeClock()
+    cache = make_cache(tmp_path, ttl=10, stale_ttl=100, clock=clock)
+    cache.set('a', 1)
+    clock.now += 11
+
+    assert cache.get_or_load('a', lambda: 2) == 1
+    for _ in range(100):  # wait for the background refresh
+        if not cache._refreshing:
+            break
+        time.sleep(0.01)
+    assert cache.get_or_load('a', lambda: 3) == 2
+
+
+def test_disk_hits_do_not_write(tmp_path):
+    """Test that disk-tier reads run no UPDATE until the access batch is flushed"""
+    cache = make_cache(tmp_path)
+    cache.set('a', 1)
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+
+    for _ in range(5):
+        assert cache.get_or_load('a', lambda: None) == 1
+    assert not [sql for sql in statements if sql.lstrip().upper().startswith(('UPDATE', 'COMMIT'))]
+
+    cache.flush()
+    assert any(sql.lstrip().upper().startswith('UPDATE') for sql in statements)
+
+
+def test_processes_sharing_a_file_evict_by_table_size(tmp_path):
+    """Test that two cache instances on one file keep the namespace at max_entries"""
+    clock = FakeClock()
+    first = make_cache(tmp_path, max_entries=3, clock=clock)
+    second = make_cache(tmp_path, max_entries=3, clock=clock)
+
+    for index, key in enumerate('abcd'):
+        clock.now += 1
+        (first if index % 2 else second).set(key, index)
+
+    assert len(first) == len(second) == 3
+    assert second.stats()['entries'] == 3
+    assert first.peek('a') == (False, None)
+
+
+def test_memory_hits_keep_hot_keys_from_eviction(tmp_path):
+    """Test that a key served from the memory tier still counts as recently used on disk"""
+    clock = FakeClock()
+    cache = make_cache(tmp_path, max_entries=2, memory_entries=4, clock=clock)
+    cache.set('hot', 1)
+    clock.now += 1
+    cache.set('cold', 2)
+    clock.now += 1
+    assert cache.get_or_load('hot', lambda: 0) == 1   # memory hit
+    clock.now += 1
+    cache.set('new', 3)
+
+    reopened = make_cache(tmp_path, clock=clock)
+    assert reopened.peek('hot') == (True, 1)
+    assert reopened.peek('cold') == (False, None)
+
+
+def test_sets_use_the_stored_count(tmp_path):
+    """Test that inserts read the trigger-kept count instead of counting the namespace"""
+    cache = make_cache(tmp_path, max_entries=100)
+    for key in 'abc':
+        cache.set(key, key)
+    cache.set('a', 'again')
+    cache.delete('b')
+
+    statements = []
+    cache._conn.set_trace_callback(statements.append)
+    cache.set('d', 'd')
+    assert not [sql for sql in statements if 'COUNT(' in sql.upper()]
+    assert len(cache) == 3
+    assert len(make_cache(tmp_path)) == 3
+
+
+def test_geohash_buckets_nearby_points():
+    """Test that nearby points share a geohash cell and distant ones do not"""
+    assert geohash_encode(57.64911, 10.40744, 11) == 'u4pruydqqvj'
+    assert geohash_encode(38.90720, -77.03690) == geohash_encode(38.90725, -77.03695)
+    assert geohash_encode(38.9072, -77.0369) != geohash_encode(40.7128, -74.0060)
@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+
+from utils import db
+
+
+@pytest.fixture
+def database(empty_database):
+    with db.transaction() as conn:
+        conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)')
+
+
+def test_connections_use_wal(database):
+    """Test that pooled connections run in WAL mode with rows as sqlite3.Row"""
+    with db.connection() as conn:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        conn.execute("INSERT INTO items (name) VALUES ('a')")
+        assert conn.execute('SELECT name FROM items').fetchone()['name'] == 'a'
+
+
+def test_connection_is_reused(database):
+    """Test that a returned connection is handed out again instead of reopened"""
+    with db.connection() as first:
+        pass
+    with db.connection() as second:
+        assert second is first
+
+
+def test_nested_calls_share_connection(database):
+    """Test that nested connection and transaction blocks share the outer connection"""
+    with db.transaction() as outer:
+        with db.connection() as inner:
+            assert inner is outer
+        outer.execute("INSERT INTO items (name) VALUES ('a')")
+        with db.transaction() as inner:
+            assert inner.in_transaction
+    with db.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM items').fetchone()[0] == 1
+
+
+def test_transaction_rolls_back_on_error(database):
+    """Test that an exception inside a transaction discards its writes"""
+    with pytest.raises(ValueError):
+        with db.transaction() as conn:
+            conn.execute("INSERT INTO items (name) VALUES ('a')")
+            raise ValueError('boom')
+    with db.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM items').fetchone()[0] == 0
+
+
+def test_threads_get_separate_connections(database):
+    """Test that concurrent threads each check out their own connection"""
+    seen = []
+    barrier = threading.Barrier(2)
+
+    def worker():
+        with db.connection() as conn:
+            barrier.wait()
+            seen.append(id(conn))
+
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(seen)) == 2
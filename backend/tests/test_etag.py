@@ -0,0 +1,64 @@
+from flask import Flask, request
+from werkzeug.datastructures import MultiDict
+
+from utils.etag import listing_etag, not_modified, tag, trip_etag
+
+
+def test_user_version_bumps_on_every_trip_write(make_trip):
+    """Test that trip inserts, renames, stop edits and deletes all bump the user's version"""
+    from services.stop_service import StopService
+    from services.trip_service import TripService
+    from utils import db
+
+    assert TripService.user_version(1) == 0
+
+    trip_id = make_trip([(30.0, -97.0)])
+    seen = [TripService.user_version(1)]
+    trip_versions = [TripService.trip_version(trip_id)]
+
+    stop_id = StopService.add_stop(trip_id, {'location': [31.0, -97.0]})['stop']['id']
+    seen.append(TripService.user_version(1))
+    trip_versions.append(TripService.trip_version(trip_id))
+    with db.transaction() as conn:
+        conn.execute("UPDATE trips SET name = 'Renamed' WHERE id = ?", (trip_id,))
+    seen.append(TripService.user_version(1))
+    trip_versions.append(TripService.trip_version(trip_id))
+    StopService.delete_stop(stop_id)
+    seen.append(TripService.user_version(1))
+    trip_versions.append(TripService.trip_version(trip_id))
+    with db.transaction() as conn:
+        conn.execute('DELETE FROM trips WHERE id = ?', (trip_id,))
+    seen.append(TripService.user_version(1))
+
+    assert seen == sorted(set(seen)) and seen[0] > 0
+    assert trip_versions == sorted(set(trip_versions))
+    assert TripService.user_version(2) == 0
+    assert TripService.trip_version(trip_id) is None
+
+
+def test_not_modified_only_for_matching_etag():
+    """Test that a matching If-None-Match gets an empty 304 and anything else falls through"""
+    app = Flask(__name__)
+    etag = trip_etag(5, 3)
+
+    with app.test_request_context(headers={'If-None-Match': f'"{etag}"'}):
+        response = not_modified(request, etag)
+        assert response.status_code == 304 and response.get_etag() == (etag, False)
+        assert not_modified(request, trip_etag(5, 4)) is None
+
+    with app.test_request_context():
+        assert not_modified(request, etag) is None
+        response = tag(app.response_class('{}'), etag)
+        assert response.headers['ETag'] == f'"{etag}"'
+
+
+def test_listing_etag_depends_on_query():
+    """Test that different pages or projections of the same version get different tags"""
+    app = Flask(__name__)
+    with app.test_request_context('/?limit=5&fields=name'):
+        first = listing_etag(1, 7, request.args)
+    with app.test_request_context('/?fields=name&limit=5'):
+        assert listing_etag(1, 7, request.args) == first
+    with app.test_request_context('/?fields=name&limit=5&cursor=abc'):
+        assert listing_etag(1, 7, request.args) != first
+    assert listing_etag(1, 8, MultiDict()) != listing_etag(1, 7, MultiDict())
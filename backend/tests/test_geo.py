@@ -0,0 +1,49 @@
+import numpy as np
+
+from utils.geo import (arrival_distances, batch_arrival_distances, bounding_box, distances_from,
+                       haversine_matrix, leg_distances)
+
+AUSTIN = (30.2672, -97.7431)
+DALLAS = (32.7767, -96.7970)
+HOUSTON = (29.7604, -95.3698)
+
+
+def test_haversine_matrix_known_distances():
+    """Test the matrix against known city-to-city distances"""
+    matrix = haversine_matrix([AUSTIN, DALLAS, HOUSTON])
+
+    assert matrix.shape == (3, 3)
+    assert np.allclose(np.diag(matrix), 0)
+    assert np.allclose(matrix, matrix.T)
+    assert abs(matrix[0, 1] - 293) < 3
+    assert abs(matrix[0, 2] - 235) < 3
+
+
+def test_circuity_scales_distances():
+    """Test that the circuity factor scales every distance"""
+    plain = leg_distances([AUSTIN, DALLAS, HOUSTON])
+    road = leg_distances([AUSTIN, DALLAS, HOUSTON], circuity=1.2)
+    assert np.allclose(road, plain * 1.2)
+
+
+def test_batch_matches_per_trip_distances():
+    """Test that batch distances never join the end of one trip to the next"""
+    trips = [[AUSTIN, DALLAS], [], [HOUSTON], [DALLAS, HOUSTON, AUSTIN]]
+
+    batch = batch_arrival_distances(trips)
+
+    assert len(batch) == len(trips)
+    for trip, distances in zip(trips, batch):
+        assert np.allclose(distances, arrival_distances(trip))
+
+
+def test_distances_from_and_bounding_box():
+    """Test point-to-many distances and that the radius box contains the circle"""
+    distances = distances_from(*AUSTIN, [AUSTIN, (32.7767, -96.7970)])
+    assert distances[0] == 0
+    assert 290 < distances[1] < 296
+
+    south, west, north, east = bounding_box(30.0, -97.0, 100)
+    edge_points = [(south, -97.0), (north, -97.0), (30.0, west), (30.0, east)]
+    assert all(distance >= 99.9 for distance in distances_from(30.0, -97.0, edge_points))
+    assert bounding_box(89.5, 0, 100)[1:4:2] == (-180.0, 180.0)
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from services.google_client import GoogleMapsClient, GoogleMapsError
+
+
+class StubGoogleHandler(BaseHTTPRequestHandler):
+    """Mimics the Google web service endpoints used by the services"""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+    failures_left = 0
+    requests_seen = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        StubGoogleHandler.requests_seen.append((url.path, params))
+
+        if StubGoogleHandler.failures_left > 0:
+            StubGoogleHandler.failures_left -= 1
+            return self.reply(503, {})
+        if params.get('key') != 'test-key':
+            return self.reply(200, {'status': 'REQUEST_DENIED', 'error_message': 'bad key'})
+
+        if url.path == '/maps/api/geocode/json':
+            if params.get('address') == 'slow':
+                time.sleep(0.5)
+            if params.get('address') == 'nowhere':
+                return self.reply(200, {'status': 'ZERO_RESULTS', 'results': []})
+            return self.reply(200, {'status': 'OK', 'results': [
+                {'geometry': {'location': {'lat': 30.27, 'lng': -97.74}}, 'formatted_address': 'Austin, TX'}
+            ]})
+        if url.path == '/maps/api/directions/json':
+            return self.reply(200, {'status': 'OK', 'routes': [{'legs': [], 'params': params}]})
+        if url.path == '/maps/api/place/nearbysearch/json':
+            return self.reply(200, {'status': 'OK', 'results': [{'place_id': 'p1'}]})
+        if url.path == '/maps/api/place/details/json':
+            return self.reply(200, {'status': 'OK', 'result': {'price_level': 2}})
+        return self.reply(404, {})
+
+    def reply(self, code, body):
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class QuietServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        pass  # clients that time out close the socket mid-response
+
+
+@pytest.fixture
+def stub_server():
+    StubGoogleHandler.failures_left = 0
+    StubGoogleHandler.requests_seen = []
+    server = QuietServer(('127.0.0.1', 0), StubGoogleHandler)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(base_url, key='test-key'):
+    return GoogleMapsClient(key, base_url=base_url, timeout=2, max_retries=2, backoff_base=0.01)
+
+
+def test_client_methods_match_googlemaps_shapes(stub_server):
+    """Test that client methods return what the services expect"""
+    client = make_client(stub_server)
+
+    assert client.geocode('Austin')[0]['geometry']['location']['lat'] == 30.27
+    assert client.reverse_geocode((30.27, -97.74))[0]['formatted_address'] == 'Austin, TX'
+    assert client.geocode('nowhere') == []
+    assert client.places_nearby(location=(30.27, -97.74), radius=1000, type='restaurant')['results']
+    assert client.place('p1', fields=['price_level'])['result']['price_level'] == 2
+
+    routes = client.directions({'latitude': 30, 'longitude': -97}, (32, -96), waypoints=[(31, -96.5)])
+    assert routes[0]['params']['origin'] == '30,-97'
+    assert routes[0]['params']['waypoints'] == '31,-96.5'
+
+
+def test_client_retries_transient_errors(stub_server):
+    """Test that 5xx responses are retried and counted"""
+    StubGoogleHandler.failures_left = 2
+    client = make_client(stub_server)
+
+    assert client.geocode('Austin')
+    stats = client.stats()['geocode']
+    assert stats['calls'] == 3
+    assert stats['retries'] == 2
+    assert stats['errors'] == 2
+
+
+def test_client_gives_up_after_max_retries(stub_server):
+    """Test that persistent failures raise once retries run out"""
+    StubGoogleHandler.failures_left = 10
+    client = make_client(stub_server)
+
+    with pytest.raises(GoogleMapsError) as error:
+        client.geocode('Austin')
+    assert error.value.status == 'HTTP_503'
+    assert len(StubGoogleHandler.requests_seen) == 3
+
+
+def test_client_raises_on_request_denied(stub_server):
+    """Test that non-retriable statuses raise immediately"""
+    client = make_client(stub_server, key='wrong')
+
+    with pytest.raises(GoogleMapsError) as error:
+        client.geocode('Austin')
+    assert error.value.status == 'REQUEST_DENIED'
+    assert len(StubGoogleHandler.requests_seen) == 1
+
+
+def test_client_async_calls(stub_server):
+    """Test that coroutines can fan out calls on the shared client"""
+    client = make_client(stub_server)
+
+    async def geocode_all():
+        return await asyncio.gather(*(client.call_async('geocode', 'Austin') for _ in range(5)))
+
+    results = asyncio.run(geocode_all())
+    assert len(results) == 5
+    assert client.stats()['geocode']['calls'] == 5
+
+
+def test_client_timeout(stub_server):
+    """Test that a per-call timeout is enforced"""
+    client = make_client(stub_server)
+
+    with pytest.raises(GoogleMapsError) as error:
+        client.geocode('slow', timeout=0.05)
+    assert error.value.status == 'TRANSPORT_ERROR'
+
+
+def test_get_client_rejects_placeholder_and_malformed_keys_with_a_warning(monkeypatch, capsys):
+    """Test that only a Maps-shaped key builds a client, and a rejected key is logged once"""
+    from services import google_client
+
+    monkeypatch.setattr(google_client, '_client', None)
+    monkeypatch.setattr(google_client, 'GOOGLE_MAPS_API_KEY', 'AIzaTestKey')
+    assert isinstance(google_client.get_client(), GoogleMapsClient)
+
+    for key in ('put_your_key_here', 'your-api-key-here', 'not-a-maps-key'):
+        monkeypatch.setattr(google_client, '_client', None)
+        monkeypatch.setattr(google_client, 'GOOGLE_MAPS_API_KEY', key)
+        assert google_client.get_client() is None
+        assert google_client.get_client() is None
+        assert capsys.readouterr().out.count('Warning') == 1
+
+    monkeypatch.setattr(google_client, 'GOOGLE_MAPS_API_KEY', '')
+    assert google_client.get_client() is None
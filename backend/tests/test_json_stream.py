@@ -0,0 +1,52 @@
+import json
+
+from utils import json_stream
+from utils.json_stream import stream_json
+
+
+def test_stream_matches_plain_encoding():
+    """Test that iterators, callables and nested dicts stream to the same document json.dumps gives"""
+    seen = []
+
+    def items():
+        for index in range(500):
+            seen.append(index)
+            yield {'id': index, 'name': f"Trip {index}", 'bounds': None}
+
+    chunks = list(stream_json({'success': True, 'trip': {'stops': iter([[1.5, 2], 'x'])},
+                               'trips': items(), 'count': lambda: len(seen)}, chunk_size=1024))
+
+    assert len(chunks) > 1
+    assert json.loads(''.join(chunks)) == {
+        'success': True, 'trip': {'stops': [[1.5, 2], 'x']},
+        'trips': [{'id': index, 'name': f"Trip {index}", 'bounds': None} for index in range(500)],
+        'count': 500
+    }
+
+
+def test_json_fallback_without_orjson(monkeypatch):
+    """Test that the json module is used when orjson is not installed"""
+    monkeypatch.setattr(json_stream, 'orjson', None)
+    document = ''.join(stream_json({'empty': iter([]), 'text': 'café'}))
+    assert document == '{"empty":[],"text":"caf\\u00e9"}'
+
+
+def test_streamed_listing_and_trip_match_plain(make_trip):
+    """Test that stream=True listings and lazy trip stops encode to the plain results"""
+    from models.stop import Stop, StopType
+    from models.trip import Trip
+    from services.trip_service import TripService
+
+    for index in range(3):
+        trip_id = make_trip([Stop(location=(30.0 + stop_index, -97.0), type=StopType.FOOD,
+                                  time=10, cost=stop_index + 0.5) for stop_index in range(index + 1)],
+                            name=f"Trip {index}")
+
+    plain = TripService.get_user_trips(1, include_stops=True)
+    streamed = TripService.get_user_trips(1, include_stops=True, stream=True)
+    assert json.loads(''.join(stream_json(streamed))) == json.loads(json.dumps(plain))
+
+    loaded = Trip.get_from_db(trip_id)
+    assert json.loads(''.join(stream_json(loaded.to_dict(lazy_stops=True)))) == \
+        json.loads(json.dumps(loaded.to_dict()))
+    assert list(TripService.iter_stop_rows(trip_id, batch_size=2))[2]['cost'] == 2.5
@@ -0,0 +1,207 @@
+from services import maps_service
+from services.maps_service import MapsService
+from utils import polyline
+from utils.cache import PersistentCache
+from utils.helpers import normalize_address
+
+
+class FakeGmaps:
+    """Stand-in for googlemaps.Client that records Directions calls"""
+
+    def __init__(self):
+        self.calls = []
+
+    def directions(self, origin, destination, waypoints=None, mode='driving'):
+        self.calls.append((origin, destination, list(waypoints or []), mode))
+        return [{
+            'overview_polyline': {'points': polyline.encode([origin, destination])},
+            'legs': [{'distance': {'value': 1000}, 'duration': {'value': 60}}]
+        }]
+
+
+def use_fake_gmaps(monkeypatch, tmp_path):
+    fake = FakeGmaps()
+    monkeypatch.setattr(maps_service, 'gmaps', fake)
+    monkeypatch.setattr(maps_service, 'directions_cache',
+                        PersistentCache('directions', memory_entries=8,
+                                        db_path=str(tmp_path / 'cache.db')))
+    return fake
+
+
+def test_directions_cached_on_rounded_geometry(monkeypatch, tmp_path):
+    """Test that the same route with jittered coordinates is fetched once"""
+    fake = use_fake_gmaps(monkeypatch, tmp_path)
+
+    first = MapsService.get_directions((38.907201, -77.036901), (40.7128, -74.0060))
+    second = MapsService.get_directions({'latitude': 38.9072014, 'longitude': -77.0369012},
+                                        {'lat': 40.7128, 'lng': -74.006})
+
+    assert first == second
+    assert len(fake.calls) == 1
+    assert maps_service.directions_cache.stats()['hits'] == 1
+
+
+def test_directions_cache_key_includes_waypoints_and_mode():
+    """Test that waypoint order and mode change the cache key"""
+    a, b, c, d = (1, 1), (2, 2), (3, 3), (4, 4)
+    key = MapsService.directions_cache_key(a, d, [b, c])
+
+    assert key != MapsService.directions_cache_key(a, d, [c, b])
+    assert key != MapsService.directions_cache_key(a, d, [b, c], 'walking')
+    assert MapsService.directions_cache_key(' Austin,  TX', 'Dallas') == \
+        MapsService.directions_cache_key('austin, tx', 'dallas')
+
+
+def test_directions_invalidation(monkeypatch, tmp_path):
+    """Test that invalidating a route forces a fresh upstream call"""
+    fake = use_fake_gmaps(monkeypatch, tmp_path)
+
+    MapsService.get_directions((1, 1), (2, 2))
+    MapsService.invalidate_directions((1, 1), (2, 2))
+    MapsService.get_directions((1, 1), (2, 2))
+
+    assert len(fake.calls) == 2
+
+
+def test_adding_a_stop_fetches_only_new_legs(monkeypatch, tmp_path):
+    """Test that per-leg caching only fetches legs touching the new stop"""
+    fake = use_fake_gmaps(monkeypatch, tmp_path)
+    a, b, c, d = (30.0, -97.0), (31.0, -97.5), (32.0, -96.8), (33.0, -96.0)
+
+    MapsService.get_directions(a, d, [b])
+    fake.calls.clear()
+    directions = MapsService.get_directions(a, d, [b, c])
+
+    assert sorted(call[:2] for call in fake.calls) == [(b, c), (c, d)]
+    assert directions['total_distance'] == 3000
+    assert directions['total_duration'] == 180
+    assert len(directions['route']['legs']) == 3
+    assert polyline.decode(directions['polyline']) == [a, b, c, d]
+    assert directions['route']['overview_polyline']['points'] == directions['polyline']
+
+
+def test_polyline_round_trip():
+    """Test encoding and decoding against Google's reference example"""
+    points = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+    assert polyline.encode(points) == '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+    assert polyline.decode('_p~iF~ps|U_ulLnnqC_mqNvxq`@') == points
+
+
+def test_simplify_drops_collinear_points():
+    """Test that Douglas-Peucker keeps only the corners of a path"""
+    path = [(30.0, round(-97.0 + i * 0.01, 2)) for i in range(51)] + [(round(30.0 + i * 0.01, 2), -96.5) for i in range(1, 50)]
+
+    simplified = polyline.simplify(path, tolerance=10)
+
+    assert simplified == [path[0], (30.0, -96.5), path[-1]]
+
+
+def test_projected_directions_are_smaller():
+    """Test that projection and zoom simplification shrink the payload"""
+    import json
+
+    path = [(37.0 + i * 0.001, -122.0 + (i % 7) * 0.00001) for i in range(2000)]
+    encoded = polyline.encode(path)
+    directions = {
+        'route': {'legs': [{'distance': {'value': 5}, 'duration': {'value': 6},
+                            'steps': [{'polyline': {'points': encoded}}]}],
+                  'overview_polyline': {'points': encoded}},
+        'polyline': encoded,
+        'total_distance': 5,
+        'total_duration': 6
+    }
+
+    projected = MapsService.project_directions(
+        directions, MapsService.parse_fields('polyline,total_distance,legs'), zoom=10)
+
+    assert set(projected) == {'polyline', 'total_distance', 'legs'}
+    assert projected['legs'][0]['distance'] == 5
+    assert len(polyline.decode(projected['polyline'])) == 2
+    assert len(json.dumps(projected)) < len(json.dumps(directions)) / 10
+
+
+class FakeGeocoder:
+    """Stand-in for googlemaps.Client that records geocode calls"""
+
+    def __init__(self):
+        self.calls = []
+
+    def geocode(self, address):
+        self.calls.append(address)
+        if 'nowhere' in address.lower():
+            return []
+        return [{'geometry': {'location': {'lat': 30.2672, 'lng': -97.7431}}}]
+
+    def reverse_geocode(self, latlng):
+        self.calls.append(latlng)
+        return [{'formatted_address': '100 Congress Avenue, Austin, TX'}]
+
+
+def use_fake_geocoder(monkeypatch, tmp_path):
+    fake = FakeGeocoder()
+    monkeypatch.setattr(maps_service, 'gmaps', fake)
+    for name in ('geocode_cache', 'reverse_geocode_cache'):
+        monkeypatch.setattr(maps_service, name,
+                            PersistentCache(name, db_path=str(tmp_path / 'cache.db')))
+    return fake
+
+
+def test_geocode_cache_normalizes_addresses(monkeypatch, tmp_path):
+    """Test that spelling variants of one address share a cache entry"""
+    fake = use_fake_geocoder(monkeypatch, tmp_path)
+
+    first = MapsService.geocode('100 Congress Ave., Austin, TX')
+    second = MapsService.geocode('  100 congress avenue austin tx ')
+
+    assert first == second == [30.2672, -97.7431]
+    assert len(fake.calls) == 1
+
+
+def test_non_latin_addresses_keep_their_own_cache_keys(monkeypatch, tmp_path):
+    """Test that addresses in other scripts are neither merged nor emptied"""
+    fake = use_fake_geocoder(monkeypatch, tmp_path)
+
+    MapsService.geocode('ул. Ленина 5')
+    MapsService.geocode('ул. Пушкина 5')
+    assert MapsService.geocode('Москва') is not None
+    assert len(fake.calls) == 3
+
+    assert normalize_address('Köln') == 'köln'
+    assert normalize_address('São Paulo') == 'são paulo'
+    assert normalize_address('St Louis') == 'st louis'
+    assert normalize_address('123 N Main St') == '123 north main street'
+    assert normalize_address('!!!') != normalize_address('???')
+
+
+def test_geocode_failures_are_negative_cached(monkeypatch, tmp_path):
+    """Test that an address with no results is not looked up again"""
+    fake = use_fake_geocoder(monkeypatch, tmp_path)
+
+    assert MapsService.geocode('Nowhere Rd') is None
+    assert MapsService.geocode('nowhere road') is None
+    assert len(fake.calls) == 1
+
+
+def test_reverse_geocode_snaps_to_grid(monkeypatch, tmp_path):
+    """Test that nearby coordinates share a reverse geocode entry"""
+    fake = use_fake_geocoder(monkeypatch, tmp_path)
+
+    MapsService.reverse_geocode(30.26721, -97.74312)
+    MapsService.reverse_geocode('30.26718', '-97.74309')
+
+    assert fake.calls == [(30.2672, -97.7431)]
+
+
+def test_geocode_batch_dedupes_and_keeps_order(monkeypatch, tmp_path):
+    """Test that duplicate addresses are resolved once and errors stay per item"""
+    fake = use_fake_geocoder(monkeypatch, tmp_path)
+
+    results = MapsService.geocode_batch(
+        ['100 Congress Ave', 'Nowhere Rd', '', '100 congress avenue', 'nowhere road'])
+
+    assert sorted(fake.calls) == ['100 Congress Ave', 'Nowhere Rd']
+    assert [result['address'] for result in results] == \
+        ['100 Congress Ave', 'Nowhere Rd', '', '100 congress avenue', 'nowhere road']
+    assert results[0]['latitude'] == results[3]['latitude'] == 30.2672
+    assert results[1]['error'] == results[4]['error'] == 'Geocoding failed'
+    assert results[2]['error'] == 'Address is required'
@@ -0,0 +1,62 @@
+from utils import db, migrations
+
+
+def test_migrate_applies_each_version_once(empty_database):
+    """Test that migrations apply in order, are recorded, and are skipped on a second run"""
+    versions = [version for version, _, _ in migrations.list_migrations()]
+    assert versions == sorted(versions)
+    assert migrations.migrate() == versions
+    assert migrations.migrate() == []
+    with db.connection() as conn:
+        assert migrations.current_version(conn) == versions[-1]
+
+
+def test_migrate_upgrades_legacy_database(empty_database):
+    """Test that a database created before versioning gets its indexes and keeps its rows"""
+    with db.transaction() as conn:
+        conn.execute('CREATE TABLE trips (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, '
+                     'name TEXT NOT NULL, description TEXT, image_url TEXT, created_at TIMESTAMP)')
+        conn.execute("INSERT INTO trips (user_id, name) VALUES (1, 'Old trip')")
+    migrations.migrate()
+    with db.connection() as conn:
+        assert conn.execute('SELECT name FROM trips').fetchone()['name'] == 'Old trip'
+
+
+def test_hot_queries_use_indexes(empty_database):
+    """Test that every hot statement scans before the index migration and none scan after"""
+    migrations.migrate()
+    assert migrations.check_query_plans() == []
+    with db.transaction() as conn:
+        conn.execute('DROP INDEX idx_stops_trip_order')
+    assert ('trip stops', 'SCAN stops') in migrations.check_query_plans()
+
+
+def test_split_statements_keeps_trigger_bodies_whole():
+    """Test that semicolons inside a trigger body do not split the statement"""
+    script = '''
+        CREATE TABLE a (x);
+        CREATE TRIGGER t AFTER INSERT ON a BEGIN
+            UPDATE a SET x = 1;
+            UPDATE a SET x = 2;
+        END;
+    '''
+    statements = migrations.split_statements(script)
+    assert len(statements) == 2
+    assert statements[1].endswith('END;')
+
+
+def test_stop_rank_migration_runs_again_without_rescaling_sparse_orders(make_trip):
+    """Test that re-running 0004 skips the existing version column and only rescales dense orders"""
+    from models.stop import RANK_GAP
+
+    trip_ids = [make_trip([(30.0, -97.0), (31.0, -97.0)], name=name) for name in ('Sparse', 'Dense')]
+    with db.transaction() as conn:
+        conn.execute('UPDATE stops SET stop_order = stop_order / ? - 1 WHERE trip_id = ?', (RANK_GAP, trip_ids[1]))
+        conn.execute('DELETE FROM schema_version WHERE version >= 4')
+
+    assert 4 in migrations.migrate()
+    with db.connection() as conn:
+        for trip_id in trip_ids:
+            orders = [row['stop_order'] for row in conn.execute(
+                'SELECT stop_order FROM stops WHERE trip_id = ? ORDER BY stop_order', (trip_id,))]
+            assert orders == [RANK_GAP, 2 * RANK_GAP]
@@ -0,0 +1,117 @@
+from services import maps_service, pricing_service
+from services.plan_service import PlanService
+from utils import polyline
+from utils.cache import PersistentCache
+
+AUSTIN = [30.2672, -97.7431]
+WACO = [31.5493, -97.1467]
+DALLAS = [32.7767, -96.7970]
+
+
+class FakeGmaps:
+    """Stand-in for googlemaps.Client: every leg is 1km and 60s"""
+
+    def __init__(self):
+        self.calls = []
+
+    def directions(self, origin, destination, waypoints=None, mode='driving'):
+        self.calls.append((origin, destination))
+        return [{
+            'overview_polyline': {'points': polyline.encode([origin, destination])},
+            'legs': [{'distance': {'value': 1000}, 'duration': {'value': 60}}]
+        }]
+
+
+def use_fake_gmaps(monkeypatch, tmp_path):
+    fake = FakeGmaps()
+    monkeypatch.setattr(maps_service, 'gmaps', fake)
+    monkeypatch.setattr(maps_service, 'ROUTING_BACKEND', 'auto')
+    monkeypatch.setattr(maps_service, 'directions_cache',
+                        PersistentCache('directions', db_path=str(tmp_path / 'directions.db')))
+    return fake
+
+
+def use_default_prices(monkeypatch, tmp_path):
+    monkeypatch.setattr(pricing_service, 'gmaps', None)
+    monkeypatch.setattr(pricing_service, 'price_cache',
+                        PersistentCache('place_prices', db_path=str(tmp_path / 'prices.db')))
+
+
+def test_changes_fetch_only_new_legs_and_price_with_leg_distances(monkeypatch, tmp_path):
+    """Test that each change fetches only the legs touching it and the budget uses real leg distances"""
+    fake = use_fake_gmaps(monkeypatch, tmp_path)
+    use_default_prices(monkeypatch, tmp_path)
+
+    plan = PlanService.create_session([{'location': AUSTIN, 'type': 'FOOD'},
+                                       {'location': DALLAS, 'type': 'FUEL'}])
+    assert plan.pop('status') == 201
+    assert len(fake.calls) == 1
+    assert plan['directions']['total_distance'] == 1000
+
+    fake.calls.clear()
+    plan = PlanService.apply_ops(plan['session_id'], [{'op': 'add', 'location': WACO, 'index': 1}],
+                                 revision=0)
+
+    assert sorted(fake.calls) == [(tuple(AUSTIN), tuple(WACO)), (tuple(WACO), tuple(DALLAS))]
+    assert [stop['location'] for stop in plan['stops']] == [AUSTIN, WACO, DALLAS]
+    assert [leg['distance'] for leg in plan['directions']['legs']] == [1000, 1000]
+    # Fake legs are 1km, so no stop is far enough for a distance surcharge
+    assert [stop['estimated_price'] for stop in plan['budget']['stops']] == [20, 15, 60]
+
+    fake.calls.clear()
+    plan = PlanService.apply_ops(plan['session_id'], [{'op': 'move', 'from': 2, 'to': 0},
+                                                      {'op': 'remove', 'index': 2}])
+    assert [stop['location'] for stop in plan['stops']] == [DALLAS, AUSTIN]
+    assert plan['revision'] == 2
+    assert len(fake.calls) == 1
+
+
+def test_budget_falls_back_to_great_circle_without_routes(monkeypatch, tmp_path):
+    """Test that a plan without a routing backend still prices stops by estimated distance"""
+    monkeypatch.setattr(maps_service, 'gmaps', None)
+    monkeypatch.setattr(maps_service, 'road_graph', None)
+    use_default_prices(monkeypatch, tmp_path)
+
+    plan = PlanService.create_session([{'location': AUSTIN, 'type': 'FOOD'},
+                                       {'location': DALLAS, 'type': 'FOOD'}])
+
+    assert plan['directions'] is None
+    # ~293km great-circle x circuity puts a surcharge on the second stop
+    assert plan['budget']['stops'][0]['estimated_price'] == 20
+    assert plan['budget']['stops'][1]['estimated_price'] > 30
+
+
+def test_invalid_ops_and_stale_sessions(monkeypatch, tmp_path):
+    """Test the error statuses for bad ops, missed changes and unknown sessions"""
+    monkeypatch.setattr(maps_service, 'gmaps', None)
+    monkeypatch.setattr(maps_service, 'road_graph', None)
+    use_default_prices(monkeypatch, tmp_path)
+
+    assert PlanService.create_session([{'location': 'Austin, TX'}])['status'] == 400
+    session_id = PlanService.create_session([{'location': AUSTIN}])['session_id']
+
+    assert PlanService.apply_ops(session_id, [{'op': 'remove', 'index': 3}])['status'] == 400
+    assert PlanService.apply_ops(session_id, [{'op': 'add', 'location': DALLAS, 'type': 'HOTEL'}])['status'] == 400
+    assert PlanService.apply_ops(session_id, [{'op': 'add', 'location': DALLAS}], revision=0)['revision'] == 1
+    assert PlanService.apply_ops(session_id, [{'op': 'remove', 'index': 0}], revision=0)['status'] == 409
+
+    assert PlanService.delete_session(session_id) == {'success': True}
+    assert PlanService.apply_ops(session_id, [{'op': 'remove', 'index': 0}])['status'] == 404
+
+
+def test_plans_over_the_stop_limit_answer_413(monkeypatch, tmp_path):
+    """Test that too many stops answers 413 with the limit and leaves the session as it was"""
+    from services import plan_service
+
+    monkeypatch.setattr(maps_service, 'gmaps', None)
+    monkeypatch.setattr(maps_service, 'road_graph', None)
+    monkeypatch.setattr(plan_service, 'PLAN_MAX_STOPS', 2)
+    use_default_prices(monkeypatch, tmp_path)
+
+    result = PlanService.create_session([{'location': AUSTIN}, {'location': WACO}, {'location': DALLAS}])
+    assert result['status'] == 413 and result['max_stops'] == 2
+
+    plan = PlanService.create_session([{'location': AUSTIN}, {'location': WACO}])
+    result = PlanService.apply_ops(plan['session_id'], [{'op': 'add', 'location': DALLAS}])
+    assert result['status'] == 413
+    assert PlanService.apply_ops(plan['session_id'], [{'op': 'remove', 'index': 1}], revision=0)['success']
@@ -0,0 +1,120 @@
+import json
+
+from services import maps_service
+from services.maps_service import MapsService
+from services.road_graph import RoadGraph
+from utils import polyline
+
+
+def grid_graph(size=10, spacing=0.01):
+    """A size x size street grid; row 0 is a fast highway"""
+    nodes = [(30 + row * spacing, -97 + col * spacing) for row in range(size) for col in range(size)]
+    edges = []
+    for row in range(size):
+        for col in range(size):
+            node = row * size + col
+            if col + 1 < size:
+                edges.append([node, node + 1, None, 120 if row == 0 else 40])
+            if row + 1 < size:
+                edges.append([node, node + size, None, 40])
+    return nodes, edges
+
+
+def test_shortest_path_on_grid():
+    """Test that A* finds a path with the expected length"""
+    nodes, edges = grid_graph()
+    graph = RoadGraph.from_edges(nodes, edges)
+
+    path, length, duration = graph.shortest_path(0, 99)
+
+    assert path[0] == 0 and path[-1] == 99
+    assert abs(length - 18 * 1000 * 1.0) < 2500  # 18 blocks of roughly 1km
+    assert duration > 0
+
+
+def test_shortest_path_prefers_fast_roads():
+    """Test that routing minimizes duration rather than distance"""
+    nodes, edges = grid_graph()
+    graph = RoadGraph.from_edges(nodes, edges)
+
+    path, _, _ = graph.shortest_path(10, 19)  # along row 1, next to the highway
+
+    assert 0 in path or 1 in path  # detours onto row 0
+
+
+def test_oneway_edges_and_unreachable():
+    """Test that one-way edges are respected"""
+    graph = RoadGraph.from_edges([(0, 0), (0, 0.01)], [[0, 1, None, 50, True]])
+
+    assert graph.shortest_path(0, 1) is not None
+    assert graph.shortest_path(1, 0) is None
+
+
+def test_graph_file_round_trip(tmp_path):
+    """Test loading JSON graphs and saving/loading the compact npz form"""
+    nodes, edges = grid_graph(4)
+    json_path = tmp_path / 'graph.json'
+    json_path.write_text(json.dumps({'nodes': nodes, 'edges': edges}))
+
+    graph = RoadGraph.load(str(json_path))
+    graph.save_npz(str(tmp_path / 'graph.npz'))
+    reloaded = RoadGraph.load(str(tmp_path / 'graph.npz'))
+
+    assert len(reloaded) == 16
+    assert reloaded.shortest_path(0, 15)[0] == graph.shortest_path(0, 15)[0]
+
+
+def test_local_directions_match_maps_shape(monkeypatch):
+    """Test that offline routing returns the get_directions response shape"""
+    nodes, edges = grid_graph()
+    monkeypatch.setattr(maps_service, 'road_graph', RoadGraph.from_edges(nodes, edges))
+    monkeypatch.setattr(maps_service, 'gmaps', None)
+    monkeypatch.setattr(maps_service, 'ROUTING_BACKEND', 'auto')
+
+    directions = MapsService.get_directions(
+        {'latitude': 30.0, 'longitude': -97.0}, (30.09, -96.91), [(30.05, -96.95)])
+
+    assert set(directions) == {'route', 'polyline', 'total_distance', 'total_duration'}
+    assert len(directions['route']['legs']) == 2
+    assert directions['total_distance'] == sum(leg['distance']['value'] for leg in directions['route']['legs'])
+    points = polyline.decode(directions['polyline'])
+    assert points[0] == (30.0, -97.0) and points[-1] == (30.09, -96.91)
+    assert (30.05, -96.95) in points
+
+
+def test_auto_backend_falls_back_when_upstream_fails(monkeypatch):
+    """Test that an upstream error falls back to the road graph"""
+    nodes, edges = grid_graph(3)
+
+    def fail(*args, **kwargs):
+        raise TimeoutError('upstream timed out')
+
+    monkeypatch.setattr(maps_service, 'road_graph', RoadGraph.from_edges(nodes, edges))
+    monkeypatch.setattr(maps_service, 'gmaps', object())
+    monkeypatch.setattr(maps_service, 'ROUTING_BACKEND', 'auto')
+    monkeypatch.setattr(MapsService, 'get_google_directions', staticmethod(fail))
+
+    directions = MapsService.get_directions((30.0, -97.0), (30.02, -96.98))
+
+    assert directions['route']['summary'] == 'Offline road graph'
+
+
+def test_points_far_from_the_graph_are_not_snapped(monkeypatch):
+    """Test that an origin far outside the graph gets no local route, so auto routing can fall back"""
+    nodes, edges = grid_graph(3)
+    graph = RoadGraph.from_edges(nodes, edges)
+
+    assert graph.nearest_node(30.0, -97.0, max_distance_m=10) == 0
+    assert graph.nearest_node(33.0, -97.0, max_distance_m=2000) is None
+    assert graph.route_leg((30.0, -97.0), (30.02, -96.98)) is not None
+    assert graph.route_leg((33.0, -97.0), (30.02, -96.98)) is None
+
+    def fail(*args, **kwargs):
+        raise TimeoutError('upstream timed out')
+
+    monkeypatch.setattr(maps_service, 'road_graph', graph)
+    monkeypatch.setattr(maps_service, 'gmaps', object())
+    monkeypatch.setattr(maps_service, 'ROUTING_BACKEND', 'auto')
+    monkeypatch.setattr(MapsService, 'get_google_directions', staticmethod(fail))
+
+    assert MapsService.get_directions((33.0, -97.0), (30.02, -96.98)) is None
@@ -0,0 +1,41 @@
+import random
+
+import numpy as np
+
+from services.route_optimizer import RouteOptimizer
+
+
+def test_optimize_keeps_endpoints_fixed():
+    """Test that origin and destination stay first and last"""
+    coordinates = [(30, -97), (35, -90), (31, -96), (34, -91), (32, -95), (36, -89)]
+
+    result = RouteOptimizer.optimize(coordinates)
+
+    assert result['order'][0] == 0
+    assert result['order'][-1] == len(coordinates) - 1
+    assert sorted(result['order']) == list(range(len(coordinates)))
+
+
+def test_optimize_untangles_a_shuffled_line():
+    """Test that stops along a straight line come back in line order"""
+    line = [(30 + i * 0.1, -97.0) for i in range(12)]
+    middle = line[1:-1]
+    random.Random(4).shuffle(middle)
+    coordinates = [line[0]] + middle + [line[-1]]
+
+    result = RouteOptimizer.optimize(coordinates, time_budget_ms=1000)
+
+    assert [coordinates[i] for i in result['order']] == line
+    assert result['optimized_cost'] < result['initial_cost']
+
+
+def test_optimize_respects_time_budget():
+    """Test that a large trip still returns a valid order within the time budget"""
+    rng = np.random.default_rng(7)
+    coordinates = list(zip(rng.uniform(25, 48, 150), rng.uniform(-124, -67, 150)))
+
+    result = RouteOptimizer.optimize(coordinates, time_budget_ms=100)
+
+    assert sorted(result['order']) == list(range(150))
+    assert result['elapsed_ms'] < 1000
+    assert result['optimized_cost'] <= result['initial_cost']
@@ -0,0 +1,124 @@
+import os
+import sys
+
+import pytest
+
+from services import maps_service
+from utils.cache import PersistentCache
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+import simple_server  # noqa: E402
+
+
+@pytest.fixture
+def client(database):
+    return simple_server.app.test_client()
+
+
+class FakeGeocoder:
+    """Stand-in for googlemaps.Client that resolves every address but 'nowhere'"""
+
+    def __init__(self):
+        self.calls = []
+
+    def geocode(self, address):
+        self.calls.append(address)
+        if 'nowhere' in address.lower():
+            return []
+        return [{'geometry': {'location': {'lat': 55.7558, 'lng': 37.6173}}}]
+
+
+def test_geocode_batch_route(client, monkeypatch, tmp_path):
+    """Test that the running server geocodes a batch, including non-Latin addresses"""
+    fake = FakeGeocoder()
+    monkeypatch.setattr(maps_service, 'gmaps', fake)
+    monkeypatch.setattr(maps_service, 'geocode_cache',
+                        PersistentCache('geocode_cache', db_path=str(tmp_path / 'cache.db')))
+
+    response = client.post('/api/maps/geocode/batch',
+                           json={'addresses': ['Москва', 'ул. Ленина 5', 'Nowhere Rd', 'москва']})
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['resolved'] == 3
+    assert [result.get('error') for result in body['results']] == [None, None, 'Geocoding failed', None]
+    assert sorted(fake.calls) == sorted(['Москва', 'ул. Ленина 5', 'Nowhere Rd'])
+
+    assert client.post('/api/maps/geocode/batch', json={'addresses': []}).status_code == 400
+    monkeypatch.setattr(simple_server, 'GEOCODE_BATCH_LIMIT', 2)
+    assert client.post('/api/maps/geocode/batch', json={'addresses': ['a', 'b', 'c']}).status_code == 400
+
+
+def test_optimize_route_applies_order_at_the_loaded_version(client, make_trip):
+    """Test that the running server optimizes a trip and applies the order with a version check"""
+    trip_id = make_trip([(30.0, -97.0), (30.2, -97.0), (30.1, -97.0), (30.3, -97.0)])
+    version = client.get(f'/api/trips/{trip_id}').get_json()['trip']['version']
+
+    stale = client.post(f'/api/trips/{trip_id}/optimize', json={'apply': True, 'version': version - 1})
+    assert stale.status_code == 409
+
+    response = client.post(f'/api/trips/{trip_id}/optimize', json={'apply': True, 'version': version})
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body['order'] == [0, 2, 1, 3] and body['applied']
+    assert body['version'] > version
+
+    stops = client.get(f'/api/trips/{trip_id}').get_json()['stops']
+    assert [stop['latitude'] for stop in stops] == [30.0, 30.1, 30.2, 30.3]
+    assert client.post('/api/trips/999/optimize', json={}).status_code == 404
+
+
+def test_reorder_rejects_a_stale_version(client, make_trip):
+    """Test that a reorder computed from an old copy of the trip answers 409 instead of overwriting"""
+    from services.stop_service import StopService
+    from services.trip_service import TripService
+
+    trip_id = make_trip([(30.0, -97.0), (30.1, -97.0), (30.2, -97.0)])
+    body = client.get(f'/api/trips/{trip_id}').get_json()
+    version, stop_id = body['trip']['version'], body['stops'][1]['id']
+    StopService.edit_stop(stop_id, {'cost': 3})
+
+    result = TripService.reorder_stops(trip_id, [0, 2, 1], version)
+    assert result['status'] == 409
+    assert TripService.reorder_stops(trip_id, [0, 2, 1], result['version'])['success']
+
+
+class FakeDirections:
+    """Stand-in for googlemaps.Client that records Directions calls"""
+
+    def __init__(self):
+        self.calls = []
+
+    def directions(self, origin, destination, waypoints=None, mode='driving'):
+        self.calls.append((origin, destination))
+        return [{'overview_polyline': {'points': ''},
+                 'legs': [{'distance': {'value': 1000}, 'duration': {'value': 60}}]}]
+
+    def stats(self):
+        return {}
+
+
+def test_maps_cache_routes(client, monkeypatch, tmp_path):
+    """Test that the running server reports maps cache stats and drops cached routes"""
+    fake = FakeDirections()
+    monkeypatch.setattr(maps_service, 'gmaps', fake)
+    monkeypatch.setattr(maps_service, 'ROUTING_BACKEND', 'auto')
+    monkeypatch.setattr(maps_service, 'directions_cache',
+                        PersistentCache('directions', db_path=str(tmp_path / 'cache.db')))
+    route = {'origin': {'latitude': 30.0, 'longitude': -97.0},
+             'destination': {'latitude': 31.0, 'longitude': -97.0}}
+
+    client.post('/api/maps/directions', json=route)
+    client.post('/api/maps/directions', json=route)
+    assert client.post('/api/maps/directions', json={**route, 'fields': ['nope']}).status_code == 400
+    assert client.post('/api/maps/directions', json={**route, 'zoom': 'far'}).status_code == 400
+    stats = client.get('/api/maps/cache').get_json()
+    assert stats['directions']['hits'] == 1 and stats['directions']['misses'] == 1
+    assert len(fake.calls) == 1
+
+    assert client.delete('/api/maps/cache', json=route).status_code == 200
+    client.post('/api/maps/directions', json=route)
+    assert len(fake.calls) == 2
+
+    assert client.delete('/api/maps/cache').status_code == 200
+    assert client.get('/api/maps/cache').get_json()['directions']['entries'] == 0
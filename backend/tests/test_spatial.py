@@ -0,0 +1,78 @@
+import pytest
+
+from services.spatial_service import SpatialService, SPATIAL_CANDIDATE_FACTOR
+from utils import db, migrations
+
+
+def test_nearby_ranks_by_distance(make_trip):
+    """Test that stops within the radius come back nearest first and farther ones are left out"""
+    make_trip([(30.30, -97.74), (30.27, -97.74), (30.50, -97.74)], name='Austin loop')
+    make_trip([(32.78, -96.80)], user_id=2, name='Dallas')
+
+    result = SpatialService.nearby(30.2672, -97.7431, 25)
+    assert [stop['latitude'] for stop in result['stops']] == [30.27, 30.30]
+    assert result['stops'][0]['distance_km'] < result['stops'][1]['distance_km'] < 25
+
+    only_user_2 = SpatialService.nearby(30.2672, -97.7431, 400, user_id=2)
+    assert [stop['trip_name'] for stop in only_user_2['stops']] == ['Dallas']
+
+
+def test_nearby_grouped_by_trip(make_trip):
+    """Test that group=trips returns each trip once, ranked by its nearest stop"""
+    near = make_trip([(30.27, -97.74), (30.28, -97.74)], name='Near')
+    far = make_trip([(30.40, -97.74)], name='Far')
+
+    trips = SpatialService.nearby(30.2672, -97.7431, 50, group='trips')['trips']
+    assert [trip['trip_id'] for trip in trips] == [near, far]
+    assert trips[0]['matching_stops'] == 2
+
+
+def test_index_follows_stop_edits(make_trip):
+    """Test that moved and deleted stops are found where they now are"""
+    make_trip([(30.27, -97.74)])
+    with db.transaction() as conn:
+        conn.execute('UPDATE stops SET latitude = 40.71, longitude = -74.0')
+    assert SpatialService.nearby(30.27, -97.74, 10)['count'] == 0
+    assert SpatialService.nearby(40.71, -74.0, 10)['count'] == 1
+    with db.transaction() as conn:
+        conn.execute('DELETE FROM stops')
+    with db.connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM stops_rtree').fetchone()[0] == 0
+
+
+def test_candidates_are_capped_nearest_first(make_trip):
+    """Test that SQL returns at most limit * SPATIAL_CANDIDATE_FACTOR stops (or trips), the nearest ones"""
+    for index in range(10):
+        make_trip([(30.0 + index * 0.01, -97.0), (30.0 + index * 0.01, -97.001)], name=f"Trip {index}")
+
+    stops = SpatialService._candidates(29.0, -98.0, 31.0, -96.0, 30.0, -97.0, 2, None, None)
+    assert len(stops) == 2 * SPATIAL_CANDIDATE_FACTOR
+    assert max(stop['latitude'] for stop in stops) < 30.04
+
+    trip_stops = SpatialService._candidates(29.0, -98.0, 31.0, -96.0, 30.0, -97.0, 1, None, 'trips')
+    assert len({stop['trip_id'] for stop in trip_stops}) == SPATIAL_CANDIDATE_FACTOR
+    assert len(trip_stops) == 2 * SPATIAL_CANDIDATE_FACTOR
+
+    assert SpatialService.nearby(30.0, -97.0, 50, limit=1)['stops'][0]['latitude'] == 30.0
+
+
+def test_viewport_across_antimeridian(make_trip):
+    """Test that a viewport with west > east wraps around longitude 180"""
+    make_trip([(20.0, 179.5), (20.0, -179.5), (20.0, 170.0)], name='Pacific')
+    stops = SpatialService.within(19.0, 179.0, 21.0, -179.0)['stops']
+    assert sorted(stop['longitude'] for stop in stops) == [-179.5, 179.5]
+
+
+def test_bad_queries_are_rejected(database):
+    """Test that out-of-range coordinates, radius and limit raise ValueError"""
+    with pytest.raises(ValueError):
+        SpatialService.nearby(95, 0, 10)
+    with pytest.raises(ValueError):
+        SpatialService.nearby(0, 0, 0)
+    with pytest.raises(ValueError):
+        SpatialService.within(10, 0, 5, 1)
+
+
+def test_box_query_uses_rtree(database):
+    """Test that the bounding-box lookup is served by the R*Tree, not a scan"""
+    assert migrations.check_query_plans({'stops in box': migrations.HOT_QUERIES['stops in box']}) == []
@@ -0,0 +1,48 @@
+import numpy as np
+
+from models.stop import Stop, StopType
+from models.stop_array import StopArray
+from models.trip import Trip
+from utils.geo import leg_distances
+
+ROWS = [
+    {'latitude': 30.2672, 'longitude': -97.7431, 'stop_type': 'FOOD', 'time_minutes': 30, 'cost': 12.1},
+    {'latitude': 32.7767, 'longitude': -96.7970, 'stop_type': 'MISC', 'time_minutes': 45, 'cost': 0.2},
+    {'latitude': 29.7604, 'longitude': -95.3698, 'stop_type': 'FUEL', 'time_minutes': 15, 'cost': 40.0},
+]
+
+
+def test_columns_match_stop_objects():
+    """Test that totals, bounds and legs equal the per-Stop results exactly"""
+    stops = StopArray.from_rows(ROWS)
+    objects = [Stop(location=(row['latitude'], row['longitude']), type=StopType[row['stop_type']],
+                    time=row['time_minutes'], cost=row['cost']) for row in ROWS]
+
+    assert repr(stops.total_cost()) == repr(12.1 + 0.2 + 40.0)
+    assert stops.total_time() == 90 and isinstance(stops.total_time(), int)
+    assert stops.bounds() == (29.7604, -97.7431, 32.7767, -95.3698)
+    assert np.allclose(stops.leg_distances(), leg_distances([stop.location for stop in objects]))
+    assert [stop.to_dict() for stop in stops] == [stop.to_dict() for stop in objects]
+    assert [stop.to_dict() for stop in stops[1:]] == [stop.to_dict() for stop in objects[1:]]
+    assert StopArray.from_stops(objects).bounds() == stops.bounds()
+    assert StopArray().total_cost() == 0 and StopArray().bounds() is None
+
+
+def test_trip_builds_stop_objects_only_when_asked():
+    """Test that a trip keeps columns until .stops is used, then edits go to the list"""
+    trip = Trip(user_id=1, name='Trip')
+    trip.set_stop_array(StopArray.from_rows(ROWS))
+
+    assert trip._stops is None
+    assert trip.total_stops() == 3 and trip.total_time() == 90
+
+    trip.add_stop(Stop(location=(31.0, -97.0), type=StopType.REST, time=5, cost=1))
+    assert trip._stop_array is None
+    assert trip.total_stops() == 4 and trip.total_time() == 95
+    assert trip.bounds()[3] == -95.3698
+
+
+def test_stop_has_no_instance_dict():
+    """Test that Stop stores its fields in slots"""
+    stop = Stop(location=(0.0, 0.0), type=StopType.FOOD)
+    assert not hasattr(stop, '__dict__')
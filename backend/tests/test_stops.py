@@ -13,3 +13,84 @@ def test_update_stop():
 def test_delete_stop():
     """Test that a stop can be deleted"""
     assert True
+
+def numbered_stops(count):
+    from models.stop import Stop, StopType
+    return [Stop(location=(30.0 + index, -97.0), type=StopType.FOOD, cost=index) for index in range(count)]
+
+
+def stop_ids(trip_id):
+    from utils import db
+    with db.connection() as conn:
+        return [row['id'] for row in conn.execute(
+            'SELECT id FROM stops WHERE trip_id = ? ORDER BY stop_order', (trip_id,)).fetchall()]
+
+
+def test_move_stop_writes_one_row(make_trip):
+    """Test that moving a stop changes only that stop's rank"""
+    from services.stop_service import StopService
+    from utils import db
+
+    trip_id = make_trip(numbered_stops(100))
+    ids = stop_ids(trip_id)
+    with db.connection() as conn:
+        before = dict(conn.execute('SELECT id, stop_order FROM stops').fetchall())
+
+    result = StopService.move_stop(ids[90], 3)
+    assert result['success']
+
+    with db.connection() as conn:
+        after = dict(conn.execute('SELECT id, stop_order FROM stops').fetchall())
+    assert [stop_id for stop_id in before if before[stop_id] != after[stop_id]] == [ids[90]]
+    assert stop_ids(trip_id) == ids[:3] + [ids[90]] + ids[3:90] + ids[91:]
+
+
+def test_add_and_delete_keep_order(make_trip):
+    """Test inserting at a position, appending, and deleting without renumbering"""
+    from services.stop_service import StopService
+
+    trip_id = make_trip(numbered_stops(3))
+    ids = stop_ids(trip_id)
+    first = StopService.add_stop(trip_id, {'location': [40.0, -90.0], 'position': 0})['stop']['id']
+    middle = StopService.add_stop(trip_id, {'latitude': 41.0, 'longitude': -90.0, 'position': 2})['stop']['id']
+    last = StopService.add_stop(trip_id, {'location': [42.0, -90.0], 'type': 'fuel', 'cost': 5})['stop']['id']
+    assert stop_ids(trip_id) == [first, ids[0], middle, ids[1], ids[2], last]
+
+    assert StopService.delete_stop(ids[1])['success']
+    assert stop_ids(trip_id) == [first, ids[0], middle, ids[2], last]
+    assert StopService.delete_stop(ids[1])['status'] == 404
+    assert StopService.add_stop(trip_id, {'location': [1, 2], 'type': 'nope'})['status'] == 400
+
+
+def test_crowded_ranks_rebalance(make_trip):
+    """Test that repeatedly inserting into the same gap rebalances instead of colliding"""
+    from services.stop_service import StopService
+    from utils import db
+
+    trip_id = make_trip(numbered_stops(2))
+    ids = stop_ids(trip_id)
+    added = [StopService.add_stop(trip_id, {'location': [0, 0], 'position': 1})['stop']['id'] for _ in range(15)]
+    assert stop_ids(trip_id) == [ids[0]] + added[::-1] + [ids[1]]
+    with db.connection() as conn:
+        ranks = [row[0] for row in conn.execute(
+            'SELECT stop_order FROM stops WHERE trip_id = ? ORDER BY stop_order', (trip_id,)).fetchall()]
+    assert len(set(ranks)) == len(ranks)
+
+
+def test_stale_version_is_rejected(make_trip):
+    """Test that an edit against an old trip version gets a 409 with the current version"""
+    from services.stop_service import StopService
+    from utils import db
+
+    trip_id = make_trip(numbered_stops(2))
+    ids = stop_ids(trip_id)
+    with db.connection() as conn:
+        version = conn.execute('SELECT version FROM trips WHERE id = ?', (trip_id,)).fetchone()[0]
+
+    edited = StopService.edit_stop(ids[0], {'cost': 12.5, 'position': 5}, version)
+    assert edited['success'] and edited['version'] > version
+    assert stop_ids(trip_id) == [ids[1], ids[0]]
+
+    stale = StopService.edit_stop(ids[1], {'cost': 1}, version)
+    assert stale['status'] == 409
+    assert stale['version'] == edited['version']
@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+from utils.cache import VersionedCache
+
+
+def make_cached_trip(make_trip):
+    from models.stop import Stop, StopType
+    return make_trip([Stop(location=(30.0, -97.0), type=StopType.FOOD, cost=5)])
+
+
+def test_cached_reads_skip_the_database_and_return_copies(make_trip):
+    """Test that a second read runs no queries and mutating a result does not touch the cache"""
+    from models.trip import Trip
+    from utils import db
+
+    trip_id = make_cached_trip(make_trip)
+    first = Trip.get_from_db(trip_id)
+    first.set_name('Changed locally')
+    first.stops.clear()
+
+    statements = []
+    with db.connection() as conn:
+        conn.set_trace_callback(statements.append)
+        second = Trip.get_from_db(trip_id)
+        conn.set_trace_callback(None)
+
+    assert statements == []
+    assert second.name == 'Trip' and len(second.stops) == 1
+
+
+def test_every_write_path_invalidates(make_trip):
+    """Test that stop edits, trip updates, reorders and deletes are visible on the next read"""
+    from models.trip import Trip
+    from services.stop_service import StopService
+    from services.trip_service import TripService
+
+    trip_id = make_cached_trip(make_trip)
+    assert Trip.get_from_db(trip_id).total_cost() == 5
+
+    stop_id = StopService.add_stop(trip_id, {'location': [31.0, -97.0], 'cost': 7})['stop']['id']
+    assert Trip.get_from_db(trip_id).total_cost() == 12
+    StopService.edit_stop(stop_id, {'cost': 1})
+    assert Trip.get_from_db(trip_id).total_cost() == 6
+    TripService.reorder_stops(trip_id, [1, 0])
+    assert Trip.get_from_db(trip_id).stops[0].location == (31.0, -97.0)
+    StopService.delete_stop(stop_id)
+    assert len(Trip.get_from_db(trip_id).stops) == 1
+    TripService.update_trip(trip_id, name='Renamed')
+    assert TripService.get_trip(trip_id)['trip']['name'] == 'Renamed'
+    TripService.delete_trip(trip_id)
+    assert Trip.get_from_db(trip_id) is None
+
+
+def test_load_racing_an_invalidation_is_not_stored():
+    """Test that a value loaded while the key was invalidated is returned but not cached"""
+    cache = VersionedCache(max_entries=2)
+
+    def racing_loader():
+        cache.invalidate('trip')
+        return SimpleNamespace(version=1)
+
+    assert cache.get_or_load('trip', racing_loader).version == 1
+    assert len(cache) == 0
+
+    for key in ('a', 'b', 'c'):
+        cache.get_or_load(key, lambda: SimpleNamespace(version=1))
+    assert len(cache) == 2
+    assert cache.get_or_load('a', lambda: None) is None
+
+
+def test_version_check_catches_writes_from_other_processes():
+    """Test that with version_of, a hit whose stored version moved on is reloaded"""
+    versions = {'trip': 1}
+    cache = VersionedCache(version_of=versions.get)
+
+    cache.get_or_load('trip', lambda: SimpleNamespace(version=1, name='old'))
+    versions['trip'] = 2
+    assert cache.get_or_load('trip', lambda: SimpleNamespace(version=2, name='new')).name == 'new'
+    assert cache.get_or_load('trip', lambda: SimpleNamespace(version=3, name='unused')).name == 'new'
+    assert cache.stats()['stale_hits'] == 1
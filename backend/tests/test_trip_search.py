@@ -0,0 +1,51 @@
+def make_trips(make_trip):
+    trips = [
+        (1, 'Grand Canyon loop', 'Hiking near the south rim'),
+        (1, 'Coffee crawl', 'A day of cafés around the Grand Central area'),
+        (2, 'Canyon country', 'Zion and Bryce'),
+    ]
+    return [make_trip(user_id=user_id, name=name, description=description)
+            for user_id, name, description in trips]
+
+
+def test_prefix_search_ranks_name_matches_first(make_trip):
+    """Test that the last word matches as a prefix and name hits outrank description hits"""
+    from services.trip_service import TripService
+
+    canyon, coffee, country = make_trips(make_trip)
+
+    result = TripService.search_trips('gra')
+    assert [trip['id'] for trip in result['trips']] == [canyon, coffee]
+    assert result['trips'][0]['stop_count'] == 0
+
+    assert [trip['id'] for trip in TripService.search_trips('canyon', user_id=2)['trips']] == [country]
+    assert [trip['id'] for trip in TripService.search_trips('cafes')['trips']] == [coffee]
+    assert TripService.search_trips('canyon OR "')['trips'] == []
+    assert not TripService.search_trips('  ')['success']
+
+
+def test_index_follows_updates_and_deletes(make_trip):
+    """Test that renaming and deleting trips keeps the search index in sync"""
+    from services.trip_service import TripService
+    from utils import db
+
+    canyon, coffee, country = make_trips(make_trip)
+    with db.transaction() as conn:
+        conn.execute("UPDATE trips SET name = 'Desert drive' WHERE id = ?", (canyon,))
+        conn.execute('DELETE FROM trips WHERE id = ?', (country,))
+
+    assert [trip['id'] for trip in TripService.search_trips('desert')['trips']] == [canyon]
+    assert [trip['id'] for trip in TripService.search_trips('canyon')['trips']] == []
+    assert TripService.search_trips('bryce')['trips'] == []
+
+
+def test_search_pages(make_trip):
+    """Test that next_offset walks through every match once"""
+    from services.trip_service import TripService
+
+    make_trips(make_trip)
+    first = TripService.search_trips('canyon', limit=1)
+    second = TripService.search_trips('canyon', limit=1, offset=first['next_offset'])
+    assert first['next_offset'] == 1 and second['next_offset'] is None
+    assert first['trips'][0]['id'] != second['trips'][0]['id']
+    assert not TripService.search_trips('canyon', limit=0)['success']
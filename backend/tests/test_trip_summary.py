@@ -0,0 +1,53 @@
+from models.stop import Stop, StopType, RANK_GAP
+from models.trip import Trip, SUMMARY_SELECT
+from utils import db
+
+
+def save_trip(make_trip, stops):
+    return make_trip([Stop(location=(latitude, longitude), type=StopType.FOOD, time=time, cost=cost)
+                      for latitude, longitude, time, cost in stops])
+
+
+def summary(trip_id):
+    with db.connection() as conn:
+        row = conn.execute(f'SELECT {SUMMARY_SELECT} FROM trip_summary WHERE trip_id = ?', (trip_id,)).fetchone()
+    return Trip.summary_from_row(row) if row else None
+
+
+def test_summary_follows_stop_inserts(make_trip):
+    """Test that saving a trip fills in its counts, totals and bounding box"""
+    trip_id = save_trip(make_trip, [(30.0, -97.0, 30, 10.5), (32.0, -96.0, 15, 4.25), (31.0, -98.0, 0, 0)])
+    totals = summary(trip_id)
+    assert totals['stop_count'] == 3
+    assert totals['total_cost'] == 14.75
+    assert totals['total_time'] == 45
+    assert totals['bounds'] == {'southwest': {'lat': 30.0, 'lng': -98.0}, 'northeast': {'lat': 32.0, 'lng': -96.0}}
+
+
+def test_summary_follows_updates_and_deletes(make_trip):
+    """Test that updating and deleting stops shrinks totals and the bounding box"""
+    trip_id = save_trip(make_trip, [(30.0, -97.0, 30, 10), (40.0, -90.0, 15, 5)])
+    with db.transaction() as conn:
+        conn.execute('UPDATE stops SET cost = 20 WHERE trip_id = ? AND stop_order = ?', (trip_id, RANK_GAP))
+        conn.execute('DELETE FROM stops WHERE trip_id = ? AND stop_order = ?', (trip_id, 2 * RANK_GAP))
+    totals = summary(trip_id)
+    assert totals['stop_count'] == 1
+    assert totals['total_cost'] == 20
+    assert totals['bounds']['northeast'] == {'lat': 30.0, 'lng': -97.0}
+
+    with db.transaction() as conn:
+        conn.execute('DELETE FROM stops WHERE trip_id = ?', (trip_id,))
+    assert summary(trip_id)['bounds'] is None
+    with db.transaction() as conn:
+        conn.execute('DELETE FROM trips WHERE id = ?', (trip_id,))
+    assert summary(trip_id) is None
+
+
+def test_listing_serves_totals_without_stops(make_trip):
+    """Test that the trip listing reports totals from trip_summary"""
+    from services.trip_service import TripService
+
+    save_trip(make_trip, [(30.0, -97.0, 30, 10), (31.0, -97.0, 15, 5)])
+    trips = TripService.get_user_trips(1)['trips']
+    assert 'stops' not in trips[0]
+    assert (trips[0]['stop_count'], trips[0]['total_cost'], trips[0]['total_time']) == (2, 15, 45)
@@ -13,3 +13,59 @@ def test_trip_update():
 def test_trip_deletion():
     """Test that a trip can be deleted"""
     assert True
+
+def test_user_trips_load_in_constant_queries(make_trip):
+    """Test that listing a user's trips with stops runs two queries and keeps the Trip.to_dict() keys"""
+    from models.stop import Stop, StopType
+    from models.trip import Trip
+    from services.trip_service import TripService
+    from utils import db
+
+    for index in range(5):
+        make_trip([Stop(location=(30.0 + stop_index, -97.0), type=StopType.FOOD, cost=stop_index)
+                   for stop_index in range(index)], name=f"Trip {index}")
+    make_trip(user_id=2, name='Other')
+
+    statements = []
+    with db.connection() as conn:
+        conn.set_trace_callback(statements.append)
+        trips = TripService.get_user_trips(1, include_stops=True, id_key='trip_id')['trips']
+        conn.set_trace_callback(None)
+
+    assert len(statements) == 2
+    assert len(trips) == 5
+    by_name = {trip['name']: trip for trip in trips}
+    assert [stop['location'] for stop in by_name['Trip 3']['stops']] == [(30.0, -97.0), (31.0, -97.0), (32.0, -97.0)]
+    expected = Trip.get_from_db(by_name['Trip 4']['trip_id']).to_dict()
+    assert {key: by_name['Trip 4'][key] for key in expected} == expected
+
+
+def test_user_trip_pages_follow_cursor(make_trip):
+    """Test that cursor pages cover every trip once, newest first, with only the requested fields"""
+    from models.stop import Stop, StopType
+    from services.trip_service import TripService
+    from utils import db
+
+    for index in range(7):
+        make_trip([Stop(location=(30.0, -97.0), type=StopType.FOOD, cost=index)], name=f"Trip {index}")
+    with db.transaction() as conn:
+        # Same created_at for several trips, so the id tiebreak matters
+        conn.execute("UPDATE trips SET created_at = '2025-01-01 00:00:00' WHERE id <= 4")
+
+    seen, cursor = [], None
+    while True:
+        page = TripService.get_user_trips(1, cursor=cursor, limit=3, fields=['name', 'total_cost'])
+        assert page['success']
+        seen += page['trips']
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+
+    assert [trip['name'] for trip in seen] == [f"Trip {index}" for index in (6, 5, 4, 3, 2, 1, 0)]
+    assert set(seen[0]) == {'id', 'name', 'total_cost'}
+    assert seen[0]['total_cost'] == 6
+
+    with_stops = TripService.get_user_trips(1, limit=1, fields=['name'], include_stops=True)['trips'][0]
+    assert [stop['cost'] for stop in with_stops['stops']] == [6]
+    assert TripService.get_user_trips(1, fields=['password'])['status'] == 400
+    assert TripService.get_user_trips(1, cursor='nonsense')['status'] == 400
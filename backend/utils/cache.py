@@ -0,0 +1,408 @@
+# Cache - SQLite-backed key/value cache with TTL and LRU eviction, and an in-process object cache
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_DB_PATH = os.getenv(
+    'CACHE_DB_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache.db')
+)
+
+# Disk-tier hits record their access time in memory and write the batch
+# once this many keys are pending, or the oldest pending one is this old
+CACHE_ACCESS_FLUSH_ENTRIES = int(os.getenv('CACHE_ACCESS_FLUSH_ENTRIES', 256))
+CACHE_ACCESS_FLUSH_SECONDS = float(os.getenv('CACHE_ACCESS_FLUSH_SECONDS', 30))
+
+
+class PersistentCache:
+    """
+    Key/value cache stored in SQLite so entries survive restarts
+
+    Each cache gets its own namespace inside a shared cache file. Entries are
+    JSON-encoded, expire after a TTL, and are evicted least-recently-used
+    first once the namespace holds max_entries. An expired entry is still
+    served for stale_ttl seconds while a background refresh replaces it.
+    None is a valid cached value ("no results") and uses negative_ttl.
+
+    With memory_entries > 0 a bounded in-process LRU sits in front of the
+    SQLite tier, so hot keys skip the disk read entirely.
+
+    Reads never write: access times of memory and disk hits are batched
+    (CACHE_ACCESS_FLUSH_*) and written before each eviction, so the LRU
+    order stays close without a write lock per hit. Sizes come from a
+    trigger-maintained count in the file, so several worker processes can
+    share one cache file and still evict correctly.
+    """
+
+    def __init__(self, namespace, ttl=86400, stale_ttl=3600, negative_ttl=None,
+                 max_entries=10000, memory_entries=0, db_path=None, clock=time.time):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.db_path = db_path or CACHE_DB_PATH
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._memory = OrderedDict()
+        self._accessed = {}        # key -> last access time not yet written
+        self._accessed_since = None
+        self._counters = {'hits': 0, 'stale_hits': 0, 'misses': 0}
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        ''')
+        self._conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_cache_entries_lru
+            ON cache_entries (namespace, last_access)
+        ''')
+        self._conn.commit()
+        self._create_counts()
+
+    def get_or_load(self, key, loader):
+        """
+        Return the cached value for key, calling loader() on a miss
+
+        Fresh entries are returned directly. Entries past their TTL but
+        inside the stale window are returned as-is and refreshed in the
+        background. Exceptions from loader() propagate and are not cached.
+        """
+        entry = self._read(key)
+        if entry is not None:
+            value, expires_at = entry
+            now = self.clock()
+            if now < expires_at:
+                self._count('hits')
+                return value
+            if now < expires_at + self.stale_ttl:
+                self._count('stale_hits')
+                self._refresh_in_background(key, loader)
+                return value
+
+        self._count('misses')
+        value = loader()
+        self.set(key, value)
+        return value
+
+    def peek(self, key):
+        """
+        Return (True, value) for a fresh entry, (False, None) otherwise
+
+        Never calls a loader; a fresh entry counts as a hit.
+        """
+        entry = self._read(key)
+        if entry is not None and self.clock() < entry[1]:
+            self._count('hits')
+            return True, entry[0]
+        return False, None
+
+    def set(self, key, value):
+        """Store value under key, evicting the least recently used entry if full"""
+        now = self.clock()
+        ttl = self.negative_ttl if value is None else self.ttl
+        with self._lock:
+            self._remember(key, value, now + ttl)
+            self._accessed.pop(key, None)
+            # UPDATE first, so a new key is a plain INSERT that the count
+            # trigger sees; the write lock is held from here to the commit,
+            # keeping the count and eviction consistent across processes
+            encoded = json.dumps(value)
+            updated = self._conn.execute(
+                'UPDATE cache_entries SET value = ?, expires_at = ?, last_access = ? WHERE namespace = ? AND key = ?',
+                (encoded, now + ttl, now, self.namespace, key)
+            ).rowcount
+            if not updated:
+                self._conn.execute('''
+                    INSERT INTO cache_entries (namespace, key, value, expires_at, last_access)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (self.namespace, key, encoded, now + ttl, now))
+            overflow = self._count_entries() - self.max_entries
+            if overflow > 0:
+                # Entries past their stale window go first, then the least recently used
+                self._conn.execute(
+                    'DELETE FROM cache_entries WHERE namespace = ? AND expires_at + ? <= ?',
+                    (self.namespace, self.stale_ttl, now)
+                )
+                overflow = self._count_entries() - self.max_entries
+            if overflow > 0:
+                self._write_accessed()
+                self._conn.execute('''
+                    DELETE FROM cache_entries WHERE namespace = ? AND key IN (
+                        SELECT key FROM cache_entries WHERE namespace = ? AND key != ?
+                        ORDER BY last_access LIMIT ?
+                    )
+                ''', (self.namespace, self.namespace, key, overflow))
+            self._conn.commit()
+
+    def delete(self, key):
+        """Remove a single entry"""
+        with self._lock:
+            self._memory.pop(key, None)
+            self._accessed.pop(key, None)
+            self._conn.execute(
+                'DELETE FROM cache_entries WHERE namespace = ? AND key = ?',
+                (self.namespace, key)
+            )
+            self._conn.commit()
+
+    def clear(self):
+        """Remove every entry in this namespace"""
+        with self._lock:
+            self._memory.clear()
+            self._accessed.clear()
+            self._conn.execute('DELETE FROM cache_entries WHERE namespace = ?', (self.namespace,))
+            self._conn.commit()
+
+    def stats(self):
+        """Return hit/miss counters and current sizes"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['entries'] = self._count_entries()
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['stale_hits']) / lookups, 4) if lookups else 0
+        return stats
+
+    def __len__(self):
+        with self._lock:
+            return self._count_entries()
+
+    def flush(self):
+        """Write pending access times now"""
+        with self._lock:
+            self._write_accessed()
+            self._conn.commit()
+
+    def _count_entries(self):
+        """Entries in this namespace across every process (caller holds the lock)"""
+        row = self._conn.execute(
+            'SELECT entries FROM cache_counts WHERE namespace = ?', (self.namespace,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _create_counts(self):
+        """
+        Per-namespace entry counts kept by triggers on cache_entries
+
+        Reading the size is then one primary-key lookup instead of a COUNT(*)
+        over the namespace on every insert. Counts are seeded from the table
+        the first time the triggers are created for a cache file.
+        """
+        self._conn.isolation_level = None
+        try:
+            self._conn.execute('BEGIN IMMEDIATE')
+            exists = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'cache_entries_count_insert'"
+            ).fetchone()
+            if not exists:
+                self._conn.execute('''
+                    CREATE TABLE IF NOT EXISTS cache_counts (
+                        namespace TEXT PRIMARY KEY,
+                        entries INTEGER NOT NULL
+                    )
+                ''')
+                self._conn.execute('DELETE FROM cache_counts')
+                self._conn.execute('''
+                    INSERT INTO cache_counts (namespace, entries)
+                    SELECT namespace, COUNT(*) FROM cache_entries GROUP BY namespace
+                ''')
+                self._conn.execute('''
+                    CREATE TRIGGER cache_entries_count_insert AFTER INSERT ON cache_entries BEGIN
+                        INSERT INTO cache_counts (namespace, entries) VALUES (NEW.namespace, 1)
+                        ON CONFLICT (namespace) DO UPDATE SET entries = entries + 1;
+                    END
+                ''')
+                self._conn.execute('''
+                    CREATE TRIGGER cache_entries_count_delete AFTER DELETE ON cache_entries BEGIN
+                        UPDATE cache_counts SET entries = entries - 1 WHERE namespace = OLD.namespace;
+                    END
+                ''')
+            self._conn.execute('COMMIT')
+        except Exception:
+            self._conn.execute('ROLLBACK')
+            raise
+        finally:
+            self._conn.isolation_level = ''
+
+    def _write_accessed(self):
+        """Write pending access times; the caller commits (caller holds the lock)"""
+        if not self._accessed:
+            return
+        self._conn.executemany(
+            'UPDATE cache_entries SET last_access = MAX(last_access, ?) WHERE namespace = ? AND key = ?',
+            [(accessed, self.namespace, key) for key, accessed in self._accessed.items()]
+        )
+        self._accessed.clear()
+        self._accessed_since = None
+
+    def _mark_accessed(self, key, now):
+        """Record a disk-tier hit, writing the batch once it is big or old enough (caller holds the lock)"""
+        self._accessed[key] = now
+        if self._accessed_since is None:
+            self._accessed_since = now
+        if len(self._accessed) >= CACHE_ACCESS_FLUSH_ENTRIES or now - self._accessed_since >= CACHE_ACCESS_FLUSH_SECONDS:
+            self._write_accessed()
+            self._conn.commit()
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def _remember(self, key, value, expires_at):
+        """Put an entry in the in-memory tier (caller holds the lock)"""
+        if self.memory_entries <= 0:
+            return
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _read(self, key):
+        """Return (value, expires_at) for key and mark it as recently used"""
+        now = self.clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now < entry[1]:
+                self._memory.move_to_end(key)
+                # Hot keys are served from memory; record the use so disk
+                # eviction does not treat them as cold
+                self._mark_accessed(key, now)
+                return entry
+
+            row = self._conn.execute(
+                'SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?',
+                (self.namespace, key)
+            ).fetchone()
+            if row is None:
+                return None
+
+            value, expires_at = row
+            if now >= expires_at + self.stale_ttl:
+                # Left for eviction to remove, so a read never writes
+                self._memory.pop(key, None)
+                return None
+
+            self._mark_accessed(key, now)
+            value = json.loads(value)
+            self._remember(key, value, expires_at)
+        return value, expires_at
+
+    def _refresh_in_background(self, key, loader):
+        """Reload a stale entry on a worker thread, at most once per key at a time"""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self.set(key, loader())
+            except Exception as e:
+                print(f"Cache refresh failed for {self.namespace}:{key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+
+class VersionedCache:
+    """
+    Bounded in-process LRU of built objects that carry a version attribute
+
+    Values are deep-copied in and out, so callers can mutate what they get
+    without touching the cached copy. Writers call invalidate(key) after
+    their change has committed. A load that overlaps any invalidation is
+    returned but not stored, so a read racing a write can never put the
+    pre-write object back.
+
+    invalidate() only reaches this process. With version_of (key -> current
+    version in the database, None if gone), every hit is checked against the
+    stored version first, which also catches writes made by other worker
+    processes at the cost of one primary-key lookup.
+    """
+
+    def __init__(self, max_entries=1024, version_of=None):
+        self.max_entries = max_entries
+        self.version_of = version_of
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._epoch = 0
+        self._counters = {'hits': 0, 'stale_hits': 0, 'misses': 0}
+
+    def get_or_load(self, key, loader):
+        """
+        Return a copy of the cached value for key, calling loader() on a miss
+
+        None from loader() means "not found" and is not cached.
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            epoch = self._epoch
+
+        if value is not None:
+            if self.version_of is None or self.version_of(key) == value.version:
+                self._count('hits')
+                return copy.deepcopy(value)
+            self._count('stale_hits')
+            with self._lock:
+                if self._entries.get(key) is value:
+                    del self._entries[key]
+        else:
+            self._count('misses')
+
+        value = loader()
+        if value is not None:
+            stored = copy.deepcopy(value)
+            with self._lock:
+                if self._epoch == epoch:
+                    self._entries[key] = stored
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key):
+        """Drop key and refuse to store loads that started before this call"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._epoch += 1
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._epoch += 1
+
+    def stats(self):
+        """Return hit/miss counters and the current size"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['stale_hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0
+        return stats
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _count(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
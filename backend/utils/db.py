@@ -0,0 +1,131 @@
+# Database - pooled SQLite connections shared by models, services and both servers
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DATABASE_PATH = os.getenv(
+    'DATABASE_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database.db')
+)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 16))
+DB_BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', 5000))
+DB_CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', 16384))
+DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', 256 * 1024 * 1024))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 256))
+
+
+class ConnectionPool:
+    """
+    Pool of SQLite connections tuned for concurrent web workers
+
+    Connections are opened once and reused. Each has WAL journaling (so
+    readers never wait on a writer), synchronous=NORMAL, a larger page
+    cache, memory-mapped I/O, a busy timeout, and sqlite3's per-connection
+    prepared-statement cache.
+
+    A thread that already holds a connection gets the same one back from
+    nested connection()/transaction() calls, so helpers that call other
+    helpers share one connection and one transaction.
+    """
+
+    def __init__(self, path, size=DB_POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._local = threading.local()
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,  # autocommit; writes use transaction()
+            check_same_thread=False,
+            cached_statements=DB_STATEMENT_CACHE_SIZE
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA cache_size = -{DB_CACHE_SIZE_KB}')
+        conn.execute(f'PRAGMA mmap_size = {DB_MMAP_SIZE}')
+        conn.execute(f'PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of the block"""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._open()
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run the block in a write transaction, committing on success and
+        rolling back on error. Nested calls join the outer transaction.
+        """
+        with self.connection() as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def close(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pool = ConnectionPool(DATABASE_PATH)
+
+
+def connection():
+    """Context manager yielding a pooled connection to the app database"""
+    return _pool.connection()
+
+
+def transaction():
+    """Context manager yielding a pooled connection inside a write transaction"""
+    return _pool.transaction()
+
+
+def configure(path):
+    """Point the shared pool at a different database file (used by tests and scripts)"""
+    global _pool, DATABASE_PATH
+    _pool.close()
+    DATABASE_PATH = path
+    _pool = ConnectionPool(path)
@@ -0,0 +1,39 @@
+# ETag - strong validators for versioned trip responses
+import hashlib
+from flask import Response
+
+
+def trip_etag(trip_id, version):
+    """ETag of a trip at a given trips.version"""
+    return f"trip-{trip_id}-v{version}"
+
+
+def listing_etag(user_id, version, args):
+    """
+    ETag of one page of a user's trip listing
+
+    The same version can serve different pages and projections, so the
+    query parameters are part of the tag.
+    """
+    query = '&'.join(f"{key}={value}" for key, value in sorted(args.items(multi=True)))
+    digest = hashlib.sha1(query.encode()).hexdigest()[:12]
+    return f"trips-{user_id}-v{version}-{digest}"
+
+
+def tag(response, etag):
+    """Set the ETag on a response and make clients revalidate before reusing it"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def not_modified(request, etag):
+    """
+    Empty 304 response when the client already holds etag
+
+    Returns:
+        Response, or None when the full response has to be sent
+    """
+    if request.if_none_match.contains_weak(etag):
+        return tag(Response(status=304), etag)
+    return None
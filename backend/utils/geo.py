@@ -0,0 +1,179 @@
+# Geo utilities - coordinate bucketing and distance helpers
+import numpy as np
+
+_GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash_encode(latitude, longitude, precision=7):
+    """
+    Encode coordinates as a geohash cell
+
+    Nearby points share the same cell, so the geohash works as a cache
+    bucket for "roughly the same place". Precision 7 is a ~150m cell.
+
+    Args:
+        latitude: Latitude in degrees
+        longitude: Longitude in degrees
+        precision: Number of base32 characters in the result
+
+    Returns:
+        Geohash string
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(geohash) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lng_range[0] = mid
+            else:
+                bits = bits << 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits = bits << 1
+                lat_range[1] = mid
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(_GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(geohash)
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Typical ratio of road distance to great-circle distance in the US
+DEFAULT_CIRCUITY = 1.2
+
+
+def _as_radians(coordinates):
+    points = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+    return np.radians(points[:, 0]), np.radians(points[:, 1])
+
+
+def distances_from(latitude, longitude, coordinates):
+    """
+    Great-circle distance from one point to each of many points
+
+    Args:
+        latitude: Latitude of the origin in degrees
+        longitude: Longitude of the origin in degrees
+        coordinates: Sequence of (lat, lng) pairs, or an (n, 2) array
+
+    Returns:
+        NumPy array of n distances in kilometers
+    """
+    lat, lng = _as_radians(coordinates)
+    origin_lat = np.radians(latitude)
+    dlat = lat - origin_lat
+    dlng = lng - np.radians(longitude)
+    a = np.sin(dlat / 2) ** 2 + np.cos(origin_lat) * np.cos(lat) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    Smallest latitude/longitude box containing every point within radius_km
+
+    Longitudes are not wrapped: near the antimeridian west may be below -180
+    or east above 180. Near the poles the box spans all longitudes.
+
+    Returns:
+        (south, west, north, east) in degrees
+    """
+    delta_lat = np.degrees(radius_km / EARTH_RADIUS_KM)
+    south = max(-90.0, latitude - delta_lat)
+    north = min(90.0, latitude + delta_lat)
+    if south <= -90.0 or north >= 90.0:
+        return south, -180.0, north, 180.0
+    delta_lng = np.degrees(np.arcsin(min(1.0, np.sin(radius_km / EARTH_RADIUS_KM) / np.cos(np.radians(latitude)))))
+    return south, longitude - delta_lng, north, longitude + delta_lng
+
+
+def haversine_matrix(coordinates, circuity=1.0):
+    """
+    Pairwise great-circle distances between all points in one vectorized pass
+
+    Args:
+        coordinates: Sequence of (lat, lng) pairs, or an (n, 2) array
+        circuity: Factor applied to approximate road distance
+
+    Returns:
+        (n, n) NumPy array of distances in kilometers
+    """
+    lat, lng = _as_radians(coordinates)
+    dlat = lat[:, None] - lat[None, :]
+    dlng = lng[:, None] - lng[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0))) * circuity
+
+
+def leg_distances(coordinates, circuity=1.0):
+    """
+    Distance from each point to the next one
+
+    Args:
+        coordinates: Sequence of (lat, lng) pairs, or an (n, 2) array
+        circuity: Factor applied to approximate road distance
+
+    Returns:
+        NumPy array of n - 1 distances in kilometers
+    """
+    lat, lng = _as_radians(coordinates)
+    dlat = np.diff(lat)
+    dlng = np.diff(lng)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0))) * circuity
+
+
+def arrival_distances(coordinates, circuity=1.0):
+    """
+    Distance traveled to reach each point from the previous one (0 for the first)
+
+    Returns:
+        NumPy array of n distances in kilometers
+    """
+    if len(coordinates) == 0:
+        return np.zeros(0)
+    return np.concatenate(([0.0], leg_distances(coordinates, circuity)))
+
+
+def batch_arrival_distances(trips, circuity=1.0):
+    """
+    arrival_distances for many trips computed in a single pass
+
+    All trips are concatenated into one array, legs are computed once, and
+    the legs that would join the end of one trip to the start of the next
+    are zeroed out before splitting the result back per trip.
+
+    Args:
+        trips: Sequence of coordinate sequences, one per trip
+        circuity: Factor applied to approximate road distance
+
+    Returns:
+        List of NumPy arrays, one per trip
+    """
+    lengths = [len(trip) for trip in trips]
+    total = sum(lengths)
+    if total == 0:
+        return [np.zeros(0) for _ in trips]
+
+    points = np.concatenate([np.asarray(trip, dtype=np.float64).reshape(-1, 2) for trip in trips])
+    distances = arrival_distances(points, circuity)
+    starts = np.cumsum([0] + lengths[:-1])
+    distances[starts[np.asarray(lengths) > 0]] = 0.0
+    return np.split(distances, np.cumsum(lengths)[:-1])
@@ -1 +1,96 @@
 # Helpers - utility functions for common operations
+import re
+
+# Abbreviations expanded before geocode cache lookups. Each group is only
+# expanded where it can appear in an address, so a lone "s" or "e" in a
+# place name is left alone.
+STREET_SUFFIXES = {
+    'st': 'street',
+    'ave': 'avenue',
+    'av': 'avenue',
+    'rd': 'road',
+    'blvd': 'boulevard',
+    'dr': 'drive',
+    'ln': 'lane',
+    'ct': 'court',
+    'pl': 'place',
+    'sq': 'square',
+    'pkwy': 'parkway',
+    'hwy': 'highway',
+    'fwy': 'freeway',
+    'expy': 'expressway',
+    'cir': 'circle',
+    'ter': 'terrace',
+    'trl': 'trail',
+}
+
+DIRECTIONS = {
+    'n': 'north',
+    's': 'south',
+    'e': 'east',
+    'w': 'west',
+    'ne': 'northeast',
+    'nw': 'northwest',
+    'se': 'southeast',
+    'sw': 'southwest',
+}
+
+UNIT_DESIGNATORS = {
+    'apt': 'apartment',
+    'ste': 'suite',
+}
+
+PLACE_PREFIXES = {
+    'mt': 'mount',
+    'ft': 'fort',
+}
+
+_ADDRESS_TOKEN = re.compile(r"\w+(?:'\w+)*")
+_UNIT_WORDS = set(UNIT_DESIGNATORS) | set(UNIT_DESIGNATORS.values()) | {'unit'}
+
+
+def normalize_address(address):
+    """
+    Canonical form of an address for cache keys
+
+    Casefolds, drops punctuation and collapses whitespace for any script,
+    and expands common abbreviations where they sit in the address, so
+    "123 Main St." and "123  main street" share a key. Text with no word
+    characters keeps its own (whitespace-collapsed) form rather than
+    collapsing to a key shared with other inputs.
+    """
+    text = str(address)
+    segments = []
+    for segment in text.casefold().split(','):
+        tokens = _ADDRESS_TOKEN.findall(segment)
+        if tokens:
+            segments.append(' '.join(_expand_tokens(tokens)))
+    return ' '.join(segments) or ' '.join(text.split())
+
+
+def _expand_tokens(tokens):
+    """Expand abbreviations in one comma-separated part of an address"""
+    expanded = list(tokens)
+    last = len(tokens) - 1
+    # Directions trailing the street ("Main St NW")
+    tail = last
+    while tail > 0 and tokens[tail] in DIRECTIONS:
+        tail -= 1
+
+    for index, token in enumerate(tokens):
+        following = tokens[index + 1] if index < last else None
+        if token in STREET_SUFFIXES and index > 0 and (index >= tail or following in _UNIT_WORDS):
+            expanded[index] = STREET_SUFFIXES[token]
+        elif token in DIRECTIONS and index > 0 and (
+                index > tail or (index == 1 and tokens[0].isdigit() and following is not None)):
+            expanded[index] = DIRECTIONS[token]
+        elif token in UNIT_DESIGNATORS and index > 0 and following is not None:
+            expanded[index] = UNIT_DESIGNATORS[token]
+        elif token in PLACE_PREFIXES and index == 0 and following is not None:
+            expanded[index] = PLACE_PREFIXES[token]
+    return expanded
+
+
+def snap_coordinates(latitude, longitude, precision=4):
+    """Round coordinates onto a grid (precision 4 is ~11m) and format them as a cache key"""
+    return f"{round(float(latitude), precision):.{precision}f},{round(float(longitude), precision):.{precision}f}"
@@ -0,0 +1,72 @@
+# JSON stream - chunked JSON responses written item by item from database rows
+import json
+import os
+from flask import Response, stream_with_context
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Encoded text is buffered up to about this many characters per chunk
+STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', 64 * 1024))
+
+
+def dumps(value):
+    """Compact JSON text for value, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value, separators=(',', ':'))
+
+
+def stream_json(template, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yield a JSON object as text chunks without building the whole document
+
+    Keys are written in template order. Values are encoded as follows:
+    - an iterator or generator becomes an array, encoded one item at a time
+      and never collected into a list
+    - a callable is called when its key is reached, so it can report what
+      an earlier iterator found (a count, a cursor)
+    - a dict is written the same way, so it can hold iterators too
+    - anything else is encoded with dumps
+
+    Args:
+        template: Dictionary describing the response
+        chunk_size: Characters to buffer before yielding a chunk
+
+    Yields:
+        str chunks that together form one JSON document
+    """
+    buffer = []
+    size = 0
+    for piece in _encode(template):
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def streamed_response(template):
+    """Flask response that streams template with stream_json"""
+    return Response(stream_with_context(stream_json(template)), mimetype='application/json')
+
+
+def _encode(value):
+    if isinstance(value, dict):
+        yield '{'
+        for index, (key, item) in enumerate(value.items()):
+            yield (',' if index else '') + dumps(str(key)) + ':'
+            yield from _encode(item() if callable(item) else item)
+        yield '}'
+    elif hasattr(value, '__next__'):
+        yield '['
+        for index, item in enumerate(value):
+            yield (',' if index else '') + dumps(item)
+        yield ']'
+    else:
+        yield dumps(value)
@@ -0,0 +1,157 @@
+# Migrations - versioned schema scripts and a query plan check for hot statements
+import os
+import re
+import sqlite3
+from utils import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+# Statements on request paths that must be served by an index, not a table scan
+HOT_QUERIES = {
+    'user trips': 'SELECT * FROM trips WHERE user_id = ? ORDER BY created_at DESC',
+    'user trip stops': '''
+        SELECT stops.* FROM stops JOIN trips ON trips.id = stops.trip_id
+        WHERE trips.user_id = ? ORDER BY stops.trip_id, stops.stop_order
+    ''',
+    'user trip listing': '''
+        SELECT trips.*, trip_summary.* FROM trips LEFT JOIN trip_summary ON trip_summary.trip_id = trips.id
+        WHERE trips.user_id = ? ORDER BY trips.created_at DESC
+    ''',
+    'user trips page': '''
+        SELECT * FROM trips WHERE user_id = ? AND (created_at, id) < (?, ?)
+        ORDER BY created_at DESC, id DESC LIMIT ?
+    ''',
+    'user version': 'SELECT version FROM user_versions WHERE user_id = ?',
+    'trip stops': 'SELECT * FROM stops WHERE trip_id = ? ORDER BY stop_order',
+    'delete trip stops': 'DELETE FROM stops WHERE trip_id = ?',
+    'login': 'SELECT * FROM users WHERE email = ? AND password = ?',
+    'admin users page': 'SELECT id, email FROM users WHERE id > ? ORDER BY id LIMIT ?',
+    'admin trips': 'SELECT * FROM trips WHERE user_id IN (?, ?) ORDER BY user_id, created_at DESC',
+    'stops in box': '''
+        SELECT stops.* FROM stops_rtree JOIN stops ON stops.id = stops_rtree.id
+        WHERE stops_rtree.min_latitude <= ? AND stops_rtree.max_latitude >= ?
+          AND stops_rtree.min_longitude <= ? AND stops_rtree.max_longitude >= ?
+        ORDER BY (stops.latitude - ?) * (stops.latitude - ?) + (stops.longitude - ?) * (stops.longitude - ?)
+        LIMIT ?
+    ''',
+    'trip search': '''
+        SELECT trips.* FROM trips_fts JOIN trips ON trips.id = trips_fts.rowid
+        WHERE trips_fts MATCH ? AND trips.user_id = ? ORDER BY bm25(trips_fts)
+    ''',
+}
+
+# A virtual table "scan" with constraints in its index string is an index lookup
+_VIRTUAL_LOOKUP = re.compile(r'VIRTUAL TABLE INDEX \d+:\S')
+
+_FILENAME = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+# Statements keep the comment lines above them, so match at any line start
+_ADD_COLUMN = re.compile(r'^\s*ALTER\s+TABLE\s+\S+\s+ADD\s', re.IGNORECASE | re.MULTILINE)
+
+
+def list_migrations(directory=MIGRATIONS_DIR):
+    """
+    Migration scripts in the order they apply
+
+    Scripts are named NNNN_description.sql and the number is the schema
+    version the script brings the database to.
+
+    Returns:
+        List of (version, name, path) tuples sorted by version
+    """
+    migrations = []
+    for filename in os.listdir(directory):
+        match = _FILENAME.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    return sorted(migrations)
+
+
+def split_statements(script):
+    """Split a SQL script into complete statements (trigger bodies stay whole)"""
+    statements = []
+    pending = ''
+    for piece in script.split(';'):
+        pending += piece + ';'
+        if sqlite3.complete_statement(pending):
+            if pending.strip(' \t\n;'):
+                statements.append(pending.strip())
+            pending = ''
+    return statements
+
+
+def current_version(conn):
+    """Highest applied schema version, 0 for a fresh database"""
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+
+def migrate(directory=MIGRATIONS_DIR):
+    """
+    Apply every migration newer than the database's schema version
+
+    Each script runs in its own transaction together with its schema_version
+    row, so a failing script leaves the database at the previous version.
+    The schema_version table keeps a script from running twice, but every
+    script is also safe to re-run: statements use IF NOT EXISTS, and an
+    ALTER TABLE ... ADD COLUMN for a column that is already there is
+    skipped, since SQLite has no IF NOT EXISTS for it. So the scripts still
+    apply cleanly to databases created before versioning existed.
+
+    Returns:
+        List of versions applied
+    """
+    with db.transaction() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+    applied = []
+    for version, name, path in list_migrations(directory):
+        with open(path) as script_file:
+            statements = split_statements(script_file.read())
+        with db.transaction() as conn:
+            if version <= current_version(conn):
+                continue
+            for statement in statements:
+                try:
+                    conn.execute(statement)
+                except sqlite3.OperationalError as e:
+                    if not (_ADD_COLUMN.search(statement) and 'duplicate column name' in str(e)):
+                        raise
+            conn.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)', (version, name))
+        print(f"Applied migration {version:04d}_{name}")
+        applied.append(version)
+    return applied
+
+
+def check_query_plans(queries=None):
+    """
+    Run EXPLAIN QUERY PLAN on the hot statements and warn about table scans
+
+    Args:
+        queries: Mapping of name to SQL; defaults to HOT_QUERIES
+
+    Returns:
+        List of (name, plan detail) for every scan found
+    """
+    # A separate connection without a statement cache: a cached EXPLAIN is
+    # not re-prepared after a schema change and would report the old plan
+    conn = sqlite3.connect(db.DATABASE_PATH, cached_statements=0)
+    scans = []
+    try:
+        for name, sql in (queries or HOT_QUERIES).items():
+            params = (None,) * sql.count('?')
+            for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall():
+                detail = row[3]
+                if (detail.startswith('SCAN') and 'CONSTANT ROW' not in detail
+                        and not _VIRTUAL_LOOKUP.search(detail)):
+                    scans.append((name, detail))
+                    print(f"Warning: query '{name}' does a table scan: {detail}")
+    finally:
+        conn.close()
+    return scans
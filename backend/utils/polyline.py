@@ -0,0 +1,181 @@
+# Polyline - encode, decode and simplify Google's encoded polyline format
+import math
+from functools import lru_cache
+import numpy as np
+from utils.geo import EARTH_RADIUS_KM
+
+# Douglas-Peucker segments longer than this are scored with NumPy
+_VECTORIZE_ABOVE = 64
+
+# Ground meters per screen pixel at zoom 0 on the equator (Web Mercator)
+METERS_PER_PIXEL_AT_ZOOM_0 = 156543.03392
+
+
+def decode(encoded):
+    """
+    Decode a Google encoded polyline
+
+    Args:
+        encoded: Encoded polyline string
+
+    Returns:
+        List of (lat, lng) tuples
+    """
+    points = []
+    index = 0
+    lat = 0
+    lng = 0
+    length = len(encoded)
+
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            result = 0
+            shift = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / 1e5, lng / 1e5))
+
+    return points
+
+
+def encode(points):
+    """
+    Encode (lat, lng) points as a Google encoded polyline
+
+    Args:
+        points: Iterable of (lat, lng) pairs
+
+    Returns:
+        Encoded polyline string
+    """
+    chunks = []
+    prev_lat = 0
+    prev_lng = 0
+
+    for lat, lng in points:
+        lat = int(round(lat * 1e5))
+        lng = int(round(lng * 1e5))
+        for delta in (lat - prev_lat, lng - prev_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        prev_lat = lat
+        prev_lng = lng
+
+    return ''.join(chunks)
+
+
+def join(encoded_polylines):
+    """
+    Stitch encoded polylines end to end into one encoded polyline
+
+    A point shared by the end of one polyline and the start of the next
+    is kept once.
+    """
+    points = []
+    for encoded in encoded_polylines:
+        decoded = decode(encoded)
+        if points and decoded and points[-1] == decoded[0]:
+            decoded = decoded[1:]
+        points.extend(decoded)
+    return encode(points)
+
+
+def tolerance_for_zoom(zoom, latitude=0.0, pixels=1.0):
+    """
+    Simplification tolerance in meters that is invisible at a map zoom level
+
+    Args:
+        zoom: Google Maps zoom level (0 = whole world, ~21 = building)
+        latitude: Latitude the route is drawn at; meters per pixel shrink toward the poles
+        pixels: How many screen pixels of error to allow
+
+    Returns:
+        Tolerance in meters
+    """
+    meters_per_pixel = METERS_PER_PIXEL_AT_ZOOM_0 * math.cos(math.radians(latitude)) / (2 ** zoom)
+    return meters_per_pixel * pixels
+
+
+def simplify(points, tolerance):
+    """
+    Douglas-Peucker simplification
+
+    Points are projected to a local equirectangular plane so the tolerance
+    is in meters. The first and last points are always kept.
+
+    Args:
+        points: List of (lat, lng) tuples
+        tolerance: Maximum distance in meters a dropped point may lie from the result
+
+    Returns:
+        Simplified list of (lat, lng) tuples
+    """
+    if len(points) < 3 or tolerance <= 0:
+        return list(points)
+
+    coords = np.asarray(points, dtype=np.float64)
+    mean_lat = math.radians(float(coords[:, 0].mean()))
+    radius = EARTH_RADIUS_KM * 1000
+    y = np.radians(coords[:, 0]) * radius
+    x = np.radians(coords[:, 1]) * radius * math.cos(mean_lat)
+
+    xs = x.tolist()
+    ys = y.tolist()
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        dx = xs[end] - xs[start]
+        dy = ys[end] - ys[start]
+        length = math.hypot(dx, dy)
+        if end - start > _VECTORIZE_ABOVE:
+            px = x[start + 1:end] - xs[start]
+            py = y[start + 1:end] - ys[start]
+            distances = np.abs(dx * py - dy * px) / length if length else np.hypot(px, py)
+            farthest = int(np.argmax(distances))
+            max_distance = float(distances[farthest])
+            index = start + 1 + farthest
+        else:
+            # Small segments: plain Python beats NumPy call overhead
+            max_distance = -1.0
+            index = start + 1
+            x0, y0 = xs[start], ys[start]
+            for i in range(start + 1, end):
+                px = xs[i] - x0
+                py = ys[i] - y0
+                distance = abs(dx * py - dy * px) / length if length else math.hypot(px, py)
+                if distance > max_distance:
+                    max_distance = distance
+                    index = i
+        if max_distance > tolerance:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+@lru_cache(maxsize=256)
+def simplify_for_zoom(encoded, zoom):
+    """Decode, simplify to one pixel at zoom, and re-encode a polyline (memoized)"""
+    points = decode(encoded)
+    if not points:
+        return encoded
+    latitude = sum(lat for lat, _ in points) / len(points)
+    return encode(simplify(points, tolerance_for_zoom(zoom, latitude)))
@@ -168,56 +168,24 @@ async function removeStop(index, stopId = null) {
   showMessage(`Stop removed`);
 }
 
-async function calculateTripBudget() {
-  /**
-   * Call backend budget API to calculate trip costs
-   * Uses Places API to get real price levels
-   */
-  if (window.tripMarkers.length === 0) {
+function applyBudget(budget) {
+  // Prices each marker from the budget returned with the plan (real leg distances)
+  if (!budget || !budget.success) {
     return;
   }
 
-  try {
-    // Prepare stops data for budget calculation
-    const stops_data = window.tripMarkers.map(marker => ({
-      location: [marker.position.lat().toFixed(4), marker.position.lng().toFixed(4)],
-      type: 'MISC'  // Default type, can be customized later
-    }));
-
-    // Call backend budget API
-    const response = await fetch(`${API_URL}/budget/calculate`, {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({
-        stops: stops_data,
-        distances: []  // Can add distances later if needed
-      })
-    });
-
-    const data = await response.json();
+  budget.stops.forEach((stop_data, index) => {
+    if (index < window.tripMarkers.length) {
+      window.tripMarkers[index].stopPrice = stop_data.estimated_price;
+    }
+  });
 
-    if (response.ok && data.success) {
-      // Update each marker with calculated price
-      data.stops.forEach((stop_data, index) => {
-        if (index < window.tripMarkers.length) {
-          window.tripMarkers[index].stopPrice = stop_data.estimated_price;
-        }
-      });
+  // Update UI with new prices
+  updateStopListUI();
 
-      // Update UI with new prices
-      updateStopListUI();
-      
-      // Update total cost display
-      const costEl = document.getElementById("cost");
-      costEl.innerText = `$${data.total_cost.toFixed(2)}`;
-      
-      console.log('Trip budget calculated:', data);
-    } else {
-      console.error('Budget calculation failed:', data.error);
-    }
-  } catch (error) {
-    console.error('Error calculating budget:', error);
-  }
+  // Update total cost display
+  const costEl = document.getElementById("cost");
+  costEl.innerText = `$${budget.total_cost.toFixed(2)}`;
 }
 
 function updateEstimates(time, distance) {
@@ -240,57 +208,159 @@ function updateEstimates(time, distance) {
   costEl.innerText = `$${totalCost.toFixed(2)}`;
 }
 
-async function fetchDirections() {
-  if (window.tripMarkers.length < 2) {
-    updateEstimates(0, 0);
-    return null
-  };
+// Get coordinates - AdvancedMarkerElement stores position as LatLng or LatLngLiteral
+function getCoords(marker) {
+  const pos = marker.position;
+  // Check if it's a LatLng object with lat/lng methods
+  if (pos && typeof pos.lat === 'function') {
+    return { latitude: pos.lat(), longitude: pos.lng() };
+  }
+  // Check if it's a LatLngLiteral object with lat/lng properties
+  if (pos && typeof pos.lat === 'number') {
+    return { latitude: pos.lat, longitude: pos.lng };
+  }
+  // Fallback - try toJSON() if available
+  if (pos && typeof pos.toJSON === 'function') {
+    const json = pos.toJSON();
+    return { latitude: json.lat, longitude: json.lng };
+  }
+  console.error("Could not extract coordinates from marker:", marker);
+  return { latitude: 0, longitude: 0 };
+}
 
-  try {
-    // Get coordinates - AdvancedMarkerElement stores position as LatLng or LatLngLiteral
-    const getCoords = (marker) => {
-      const pos = marker.position;
-      // Check if it's a LatLng object with lat/lng methods
-      if (pos && typeof pos.lat === 'function') {
-        return { latitude: pos.lat(), longitude: pos.lng() };
-      }
-      // Check if it's a LatLngLiteral object with lat/lng properties
-      if (pos && typeof pos.lat === 'number') {
-        return { latitude: pos.lat, longitude: pos.lng };
-      }
-      // Fallback - try toJSON() if available
-      if (pos && typeof pos.toJSON === 'function') {
-        const json = pos.toJSON();
-        return { latitude: json.lat, longitude: json.lng };
-      }
-      console.error("Could not extract coordinates from marker:", marker);
-      return { latitude: 0, longitude: 0 };
-    };
+// Plan session on the server: it keeps the stops we last sent, so each marker
+// change is sent as add/remove ops and the route and budget come back together
+// maxStops is learned from the server; larger trips use the stateless endpoints
+const planSession = { id: null, revision: 0, stops: [], directions: null, budget: null, maxStops: Infinity };
 
-    const originCoords = getCoords(window.tripMarkers[0]);
-    const destCoords = getCoords(window.tripMarkers[window.tripMarkers.length-1]);
-    
-    console.log("Origin:", originCoords);
-    console.log("Destination:", destCoords);
+function markerStops() {
+  return window.tripMarkers.map(marker => {
+    const coords = getCoords(marker);
+    return { location: [coords.latitude, coords.longitude], type: 'MISC' };
+  });
+}
+
+function sameStop(a, b) {
+  return a.location[0] === b.location[0] && a.location[1] === b.location[1] && a.type === b.type;
+}
+
+function planOps(previous, current) {
+  // Stops matching at both ends are unchanged; the ones between are removed and re-added
+  let start = 0;
+  while (start < previous.length && start < current.length && sameStop(previous[start], current[start])) {
+    start++;
+  }
+  let end = 0;
+  while (end < previous.length - start && end < current.length - start &&
+         sameStop(previous[previous.length - 1 - end], current[current.length - 1 - end])) {
+    end++;
+  }
+
+  const ops = [];
+  for (let i = start; i < previous.length - end; i++) {
+    ops.push({ op: 'remove', index: start });
+  }
+  current.slice(start, current.length - end).forEach((stop, offset) => {
+    ops.push({ op: 'add', index: start + offset, location: stop.location, type: stop.type });
+  });
+  return ops;
+}
 
-    const response = await fetch(`${API_URL}/maps/directions`, {
+async function planWithoutSession(stops) {
+  // Route and budget for trips over the session stop limit, one request each
+  const coords = stops.map(stop => ({ latitude: stop.location[0], longitude: stop.location[1] }));
+  const [directionsResponse, budgetResponse] = await Promise.all([
+    fetch(`${API_URL}/maps/directions`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify({
-        origin: originCoords,
-        destination: destCoords,
-        waypoints: window.tripMarkers.slice(1, -1).map(marker => getCoords(marker)),
-        mode: 'driving',
+        origin: coords[0],
+        destination: coords[coords.length - 1],
+        waypoints: coords.slice(1, -1),
+        mode: 'driving'
       })
+    }),
+    fetch(`${API_URL}/budget/calculate`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ stops: stops })
+    })
+  ]);
+  const directions = await directionsResponse.json();
+  const budget = await budgetResponse.json();
+
+  Object.assign(planSession, {
+    id: null,
+    stops: [],
+    directions: directionsResponse.ok ? directions.directions : null,
+    budget: budgetResponse.ok ? budget : null
+  });
+  applyBudget(planSession.budget);
+  return planSession;
+}
+
+async function syncPlan() {
+  const stops = markerStops();
+  if (stops.length > planSession.maxStops) {
+    return planWithoutSession(stops);
+  }
+  const ops = planSession.id ? planOps(planSession.stops, stops) : null;
+  if (ops && ops.length === 0) {
+    return planSession;
+  }
+
+  let response = null;
+  if (ops && ops.length <= stops.length) {
+    response = await fetch(`${API_URL}/plan/sessions/${planSession.id}`, {
+      method: 'PATCH',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ ops: ops, revision: planSession.revision })
     });
+  }
+  if (!response || response.status === 404 || response.status === 409) {
+    // No session yet, too many changes, or the server lost ours: start again from every stop
+    response = await fetch(`${API_URL}/plan/sessions`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ stops: stops, mode: 'driving' })
+    });
+  }
 
-    const data = await response.json();
-    console.log("Directions API response:", data);
+  const data = await response.json();
+  if (response.status === 413) {
+    // Too many stops for a plan session
+    planSession.maxStops = data.max_stops;
+    return planWithoutSession(stops);
+  }
+  if (!response.ok || !data.success) {
+    throw new Error(data.error || 'Failed to update trip plan');
+  }
+
+  Object.assign(planSession, {
+    id: data.session_id,
+    revision: data.revision,
+    stops: stops,
+    directions: data.directions,
+    budget: data.budget
+  });
+  applyBudget(data.budget);
+  return planSession;
+}
+
+async function fetchDirections() {
+  if (window.tripMarkers.length < 2) {
+    updateEstimates(0, 0);
+    return null
+  };
+
+  try {
+    const plan = await syncPlan();
+    console.log("Plan session response:", plan);
     
-    if (response.ok && data.directions) {
-      return data.directions;
+    if (plan.directions) {
+      return plan.directions;
     } else {
-      throw new Error(data.error || 'Failed to fetch directions');
+      throw new Error('No route between these stops');
     }
   } catch (error) {
     console.error("Failed to fetch directions:", error);
@@ -325,9 +395,6 @@ async function drawRoute(data=null) { //Draws the route for the current markers
   window.map.fitBounds(bounds);
 
   updateEstimates(data['total_duration'], data['total_distance']);
-  
-  // Calculate trip budget using backend API
-  await calculateTripBudget();
 
   return polyline;
 }
@@ -343,9 +410,12 @@ function placeMarker(latLng) {
     title: `Stop at (${latLng.lat().toFixed(4)}, ${latLng.lng().toFixed(4)})`,
     content: pin.element,
     gmpClickable: true,
+    gmpDraggable: true,
   });
 
   const infoWindow = new google.maps.InfoWindow();
+
+  marker.addListener('dragend', () => moveMarker(marker));
   
   marker.addListener('click', ({ domEvent, latLng }) => {
     // Find the index of this marker in tripMarkers
@@ -391,6 +461,70 @@ function placeMarker(latLng) {
   return marker;
 }
 
+async function redrawRoute() {
+  if (window.polyline) {
+    window.polyline.setMap(null);
+    window.polyline = null;
+  }
+  if (window.tripMarkers.length >= 2) {
+    try {
+      const directions = await fetchDirections();
+      window.polyline = await drawRoute(directions);
+    } catch (error) {
+      console.error("Error redrawing route:", error);
+    }
+  }
+}
+
+// A dragged stop of a saved trip is written straight away, checked against the
+// trip version we loaded; a 409 means someone else changed the trip first
+async function moveMarker(marker) {
+  const coords = getCoords(marker);
+  marker.title = `Stop at (${coords.latitude.toFixed(4)}, ${coords.longitude.toFixed(4)})`;
+
+  if (marker.stopId && window.trip) {
+    try {
+      const response = await fetch(`${API_URL}/stops/${marker.stopId}`, {
+        method: 'PATCH',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          location: [coords.latitude, coords.longitude],
+          version: window.trip.version
+        })
+      });
+      const data = await response.json();
+
+      if (response.status === 409) {
+        showMessage("This trip was changed somewhere else; showing the latest version", true);
+        await reloadTrip();
+        return;
+      }
+      if (!response.ok) {
+        throw new Error(data.error || 'Failed to move stop');
+      }
+      window.trip.version = data.version;
+    } catch (error) {
+      console.error('Error moving stop:', error);
+      showMessage("Could not save the stop's new position", true);
+    }
+  }
+
+  updateStopListUI();
+  await redrawRoute();
+}
+
+async function reloadTrip() {
+  window.tripMarkers.forEach(marker => { marker.map = null; });
+  window.tripMarkers = [];
+  document.getElementById("stops-list").innerHTML = '';
+
+  window.trip = await fetchUserTrip();
+  if (window.trip && window.trip.stops && window.trip.stops.length > 0) {
+    initializeMarkersFromTrip();
+  }
+  await redrawRoute();
+}
+
 function panTo(latLng, zoomLevel) {
   window.map.panTo(latLng);
   if (window.map.getZoom() < 8)
@@ -22,24 +22,31 @@ try {
         throw new Error("User not logged in");
     }
 
-    const response = await fetch(`${API_URL}/trips/user/${user_id}`, {
-        method: 'GET',
-        headers: { 'Content-Type': 'application/json' },
-    });
-    const data = await response.json();
-
     const tripList = document.getElementById('product-card-wrapper');
-    if (response.ok) {
+    const newTripDiv = createNewTripCard(); // Card to create new trip at the end
+    tripList.appendChild(newTripDiv);
+
+    // Trips come a page at a time (newest first) with only the fields the cards show
+    let cursor = null;
+    do {
+        const params = new URLSearchParams({ fields: 'id,name,description,image_url' });
+        if (cursor) params.set('cursor', cursor);
+        const response = await fetch(`${API_URL}/trips/user/${user_id}?${params}`, {
+            method: 'GET',
+            headers: { 'Content-Type': 'application/json' },
+        });
+        const data = await response.json();
+
+        if (!response.ok) {
+            showMessage("Failed to fetch trips", true);
+            break;
+        }
         data.trips.forEach(trip => {
             const tripDiv = createTripCard(trip); //Existing trips
-            tripList.appendChild(tripDiv); 
+            tripList.insertBefore(tripDiv, newTripDiv);
         });
-    } else {
-        showMessage("Failed to fetch trips", true);
-    }
-
-    const newTripDiv = createNewTripCard(); // Card to create new trip at the end
-    tripList.appendChild(newTripDiv); 
+        cursor = data.next_cursor;
+    } while (cursor);
 } catch (error) {
     showMessage("Error: " + error.message, true);
 }
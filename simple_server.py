@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
 import sqlite3
 import hashlib
@@ -8,28 +8,30 @@ import sys
 app = Flask(__name__, static_folder='frontend')
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
-# Database setup - Use backend database
-BACKEND_DB_PATH = os.path.join(os.path.dirname(__file__), 'backend', 'database.db')
+# Database setup - Use backend database through the shared connection pool
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+from utils import db, migrations
+from utils.etag import listing_etag, not_modified, tag, trip_etag
+from utils.json_stream import streamed_response
+from services.admin_service import AdminService
+from services.stop_service import StopService
+from services.spatial_service import SpatialService, SPATIAL_DEFAULT_LIMIT
+from services.trip_service import TripService, TRIP_SEARCH_DEFAULT_LIMIT
+from models.stop import RANK_GAP
+from models.trip import Trip, invalidate_trip
+from services.route_optimizer import RouteOptimizer, METRICS, DEFAULT_TIME_BUDGET_MS
+from services.maps_service import MapsService, GEOCODE_BATCH_LIMIT
+from services.pricing_service import PricingService
+from services.plan_service import PlanService
 
 def init_db():
-    """Initialize the backend database for trips"""
-    backend_dir = os.path.join(os.path.dirname(__file__), 'backend')
-    db_path = os.path.join(backend_dir, 'database.db')
-    
-    if not os.path.exists(db_path):
-        print("Initializing backend database...")
-        init_script = os.path.join(backend_dir, 'init_trips_db.py')
-        os.system(f"cd {backend_dir} && python init_trips_db.py")
+    """Bring the backend database schema up to date and check the hot query plans"""
+    migrations.migrate()
+    migrations.check_query_plans()
 
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
-# Helper function to get backend database connection
-def get_backend_db():
-    conn = sqlite3.connect(BACKEND_DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
-
 # API Routes
 @app.route('/api/health', methods=['GET'])
 def health():
@@ -55,21 +57,10 @@ def register():
     hashed_password = hash_password(password)
     
     try:
-        conn = get_backend_db()
-        cursor = conn.cursor()
-        # Create users table if it doesn't exist
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        cursor.execute('INSERT INTO users (email, password) VALUES (?, ?)', 
-                      (email, hashed_password))
-        conn.commit()
-        conn.close()
+        with db.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute('INSERT INTO users (email, password) VALUES (?, ?)', 
+                          (email, hashed_password))
         return jsonify({'message': 'User registered successfully'}), 201
     except sqlite3.IntegrityError:
         return jsonify({'error': 'Email already exists'}), 400
@@ -88,11 +79,10 @@ def login():
     hashed_password = hash_password(password)
     
     try:
-        conn = get_backend_db()
-        cursor = conn.cursor()
-        user = cursor.execute('SELECT * FROM users WHERE email = ? AND password = ?', 
-                             (email, hashed_password)).fetchone()
-        conn.close()
+        with db.connection() as conn:
+            cursor = conn.cursor()
+            user = cursor.execute('SELECT * FROM users WHERE email = ? AND password = ?', 
+                                 (email, hashed_password)).fetchone()
         
         if user:
             return jsonify({
@@ -107,17 +97,43 @@ def login():
 # Trip API Routes (integrated from backend)
 @app.route('/api/trips/user/<int:user_id>', methods=['GET'])
 def get_user_trips(user_id):
+    """
+    One page of a user's trips, newest first
+    
+    Query params: cursor (next_cursor from the previous page), limit,
+    fields (comma separated listing fields), include=stops and stream=1
+    (chunked response, same JSON).
+    """
     try:
-        conn = get_backend_db()
-        cursor = conn.cursor()
-        trips = cursor.execute('SELECT * FROM trips WHERE user_id = ?', (user_id,)).fetchall()
-        conn.close()
-        return jsonify({
-            'success': True,
-            'trips': [dict(trip) for trip in trips]
-        }), 200
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        options = TripService.parse_listing_query(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    etag = listing_etag(user_id, TripService.user_version(user_id), request.args)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    
+    result = TripService.get_user_trips(user_id, **options)
+    status = result.pop('status', 200)
+    if status != 200:
+        return jsonify(result), status
+    response = streamed_response(result) if options['stream'] else jsonify(result)
+    return tag(response, etag), status
+
+@app.route('/api/trips/search', methods=['GET'])
+def search_trips():
+    """Full-text search over trip names and descriptions, best match first"""
+    try:
+        result = TripService.search_trips(
+            request.args.get('q', ''),
+            user_id=request.args.get('user_id', type=int),
+            limit=int(request.args.get('limit', TRIP_SEARCH_DEFAULT_LIMIT)),
+            offset=int(request.args.get('offset', 0))
+        )
+        return jsonify(result), 200 if result['success'] else 400
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
 
 @app.route('/api/trips/save', methods=['POST'])
 def save_trip():
@@ -131,27 +147,25 @@ def save_trip():
         if not trip_name:
             return jsonify({'success': False, 'error': 'Trip name is required'}), 400
         
-        conn = get_backend_db()
-        cursor = conn.cursor()
-        
-        # Insert trip
-        cursor.execute('''
-            INSERT INTO trips (user_id, name, description, created_at)
-            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-        ''', (user_id, trip_name, trip_description))
-        
-        trip_id = cursor.lastrowid
+        with db.transaction() as conn:
+            cursor = conn.cursor()
         
-        # Insert stops
-        for idx, stop in enumerate(stops):
+            # Insert trip
             cursor.execute('''
-                INSERT INTO stops (trip_id, latitude, longitude, stop_type, time_minutes, cost, stop_order)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (trip_id, stop.get('location', [0, 0])[0], stop.get('location', [0, 0])[1], 
-                  stop.get('type', 'MISC'), 0, stop.get('cost', 0), idx))
+                INSERT INTO trips (user_id, name, description, created_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ''', (user_id, trip_name, trip_description))
         
-        conn.commit()
-        conn.close()
+            trip_id = cursor.lastrowid
+        
+            # Insert stops
+            for idx, stop in enumerate(stops):
+                cursor.execute('''
+                    INSERT INTO stops (trip_id, latitude, longitude, stop_type, time_minutes, cost, stop_order)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (trip_id, stop.get('location', [0, 0])[0], stop.get('location', [0, 0])[1], 
+                      stop.get('type', 'MISC'), 0, stop.get('cost', 0), (idx + 1) * RANK_GAP))
+        invalidate_trip(trip_id)
         
         return jsonify({
             'success': True,
@@ -164,33 +178,43 @@ def save_trip():
 @app.route('/api/trips/<int:trip_id>', methods=['GET'])
 def get_trip(trip_id):
     try:
-        conn = get_backend_db()
-        cursor = conn.cursor()
-        
-        trip = cursor.execute('SELECT * FROM trips WHERE id = ?', (trip_id,)).fetchone()
-        if not trip:
-            return jsonify({'success': False, 'error': 'Trip not found'}), 404
-        
-        stops = cursor.execute('SELECT * FROM stops WHERE trip_id = ?', (trip_id,)).fetchall()
-        conn.close()
-        
-        return jsonify({
+        with db.connection() as conn:
+            cursor = conn.cursor()
+        
+            trip = cursor.execute('SELECT * FROM trips WHERE id = ?', (trip_id,)).fetchone()
+            if not trip:
+                return jsonify({'success': False, 'error': 'Trip not found'}), 404
+            # Read before the stops, so a concurrent edit can only make the tag older than the body
+            etag = trip_etag(trip_id, trip['version'])
+            cached = not_modified(request, etag)
+            if cached:
+                return cached
+            if request.args.get('stream') == '1':
+                # Stops are written as they are read, never held as one list
+                return tag(streamed_response({
+                    'success': True,
+                    'trip': dict(trip),
+                    'stops': TripService.iter_stop_rows(trip_id)
+                }), etag), 200
+        
+            stops = cursor.execute('SELECT * FROM stops WHERE trip_id = ? ORDER BY stop_order', (trip_id,)).fetchall()
+        
+        return tag(jsonify({
             'success': True,
             'trip': dict(trip),
             'stops': [dict(stop) for stop in stops]
-        }), 200
+        }), etag), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/trips/<int:trip_id>', methods=['DELETE'])
 def delete_trip(trip_id):
     try:
-        conn = get_backend_db()
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM stops WHERE trip_id = ?', (trip_id,))
-        cursor.execute('DELETE FROM trips WHERE id = ?', (trip_id,))
-        conn.commit()
-        conn.close()
+        with db.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM stops WHERE trip_id = ?', (trip_id,))
+            cursor.execute('DELETE FROM trips WHERE id = ?', (trip_id,))
+        invalidate_trip(trip_id)
         
         return jsonify({
             'success': True,
@@ -199,56 +223,153 @@ def delete_trip(trip_id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-# AI-ASSISTED: GitHub Copilot - Delete single stop endpoint with reordering
+@app.route('/api/trips/<int:trip_id>/optimize', methods=['POST'])
+def optimize_trip(trip_id):
+    """Reorder a trip's intermediate stops to minimize distance or duration"""
+    try:
+        data = request.get_json(silent=True) or {}
+        metric = data.get('metric', 'distance')
+        time_budget_ms = data.get('time_budget_ms', DEFAULT_TIME_BUDGET_MS)
+        
+        if metric not in METRICS:
+            return jsonify({'success': False, 'error': f"metric must be one of {', '.join(METRICS)}"}), 400
+        
+        trip = Trip.get_from_db(trip_id)
+        if not trip:
+            return jsonify({'success': False, 'error': 'Trip not found'}), 404
+        # The order is computed from this copy of the trip, so it is only
+        # applied while the trip is still at the same version
+        version = data.get('version')
+        if version is not None and int(version) != trip.version:
+            return jsonify({'success': False, 'error': 'Trip was changed by another edit; reload it and try again',
+                            'version': trip.version}), 409
+        
+        coordinates = [stop.get_location() for stop in trip.stops]
+        result = RouteOptimizer.optimize(coordinates, metric, int(time_budget_ms))
+        stops = [trip.stops[index].to_dict() for index in result['order']]
+        
+        applied = False
+        version = trip.version
+        if data.get('apply') and result['order'] != list(range(len(coordinates))):
+            saved = TripService.reorder_stops(trip_id, result['order'], trip.version)
+            if not saved['success']:
+                status = saved.pop('status', 500)
+                return jsonify(saved), status
+            applied = True
+            version = saved['version']
+        
+        return jsonify({**result, 'success': True, 'stops': stops, 'applied': applied, 'version': version}), 200
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"Optimize trip error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Single-stop edits; each writes one stop row and takes an optional trip version
+@app.route('/api/trips/<int:trip_id>/stops', methods=['POST'])
+def add_stop(trip_id):
+    """Add a stop to a trip at an optional position"""
+    data = request.get_json(silent=True) or {}
+    result = StopService.add_stop(trip_id, data, data.get('version'))
+    status = result.pop('status', 201)
+    return jsonify(result), status
+
+@app.route('/api/stops/<int:stop_id>', methods=['PATCH'])
+def edit_stop(stop_id):
+    """Move a stop (position) and/or change its location, type, time or cost"""
+    data = request.get_json(silent=True) or {}
+    result = StopService.edit_stop(stop_id, data, data.get('version'))
+    status = result.pop('status', 200)
+    return jsonify(result), status
+
 @app.route('/api/stops/<int:stop_id>', methods=['DELETE'])
 def delete_stop(stop_id):
     """Delete a single stop from a trip"""
+    data = request.get_json(silent=True) or {}
+    result = StopService.delete_stop(stop_id, data.get('version', request.args.get('version')))
+    status = result.pop('status', 200)
+    return jsonify(result), status
+
+# Location queries over saved stops (R*Tree index)
+@app.route('/api/stops/nearby', methods=['GET'])
+def nearby_stops():
+    """Saved stops (or trips, with group=trips) within radius_km of lat,lng, nearest first"""
     try:
-        conn = get_backend_db()
-        cursor = conn.cursor()
-        
-        # Get the trip_id before deleting
-        stop = cursor.execute('SELECT trip_id, stop_order FROM stops WHERE id = ?', (stop_id,)).fetchone()
-        if not stop:
-            conn.close()
-            return jsonify({'success': False, 'error': 'Stop not found'}), 404
-        
-        trip_id = stop['trip_id']
-        deleted_order = stop['stop_order']
-        
-        # Delete the stop
-        cursor.execute('DELETE FROM stops WHERE id = ?', (stop_id,))
-        
-        # Reorder remaining stops
-        cursor.execute('''
-            UPDATE stops 
-            SET stop_order = stop_order - 1 
-            WHERE trip_id = ? AND stop_order > ?
-        ''', (trip_id, deleted_order))
-        
-        conn.commit()
-        conn.close()
-        
+        result = SpatialService.nearby(
+            float(request.args['lat']),
+            float(request.args['lng']),
+            float(request.args.get('radius_km', 25)),
+            limit=int(request.args.get('limit', SPATIAL_DEFAULT_LIMIT)),
+            user_id=request.args.get('user_id', type=int),
+            group=request.args.get('group')
+        )
+        return jsonify(result), 200
+    except KeyError as e:
+        return jsonify({'success': False, 'error': f"Missing query parameter: {e.args[0]}"}), 400
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/stops/within', methods=['GET'])
+def stops_within():
+    """Saved stops (or trips, with group=trips) inside a south/west/north/east viewport"""
+    try:
+        result = SpatialService.within(
+            float(request.args['south']),
+            float(request.args['west']),
+            float(request.args['north']),
+            float(request.args['east']),
+            limit=int(request.args.get('limit', SPATIAL_DEFAULT_LIMIT)),
+            user_id=request.args.get('user_id', type=int),
+            group=request.args.get('group')
+        )
+        return jsonify(result), 200
+    except KeyError as e:
+        return jsonify({'success': False, 'error': f"Missing query parameter: {e.args[0]}"}), 400
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Maps API Routes (integrated from backend)
+@app.route('/api/maps/geocode/batch', methods=['POST'])
+def geocode_addresses():
+    # Geocode a list of addresses in one request; results come back in input order
+    try:
+        data = request.get_json(silent=True) or {}
+        addresses = data.get('addresses')
+        if not isinstance(addresses, list) or not addresses:
+            return jsonify({'success': False, 'error': 'A list of addresses is required'}), 400
+        if len(addresses) > GEOCODE_BATCH_LIMIT:
+            return jsonify({'success': False, 'error': f'At most {GEOCODE_BATCH_LIMIT} addresses per request'}), 400
+        
+        results = MapsService.geocode_batch(addresses)
         return jsonify({
             'success': True,
-            'message': 'Stop deleted successfully'
+            'results': results,
+            'resolved': sum(1 for result in results if 'error' not in result)
         }), 200
     except Exception as e:
+        print(f"Batch geocode error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-# Maps API Routes (integrated from backend)
 @app.route('/api/maps/directions', methods=['POST'])
 def get_directions():
     try:
-        sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
-        from services.maps_service import MapsService
-        
         data = request.get_json()
         origin = data.get('origin')
         destination = data.get('destination')
         waypoints = data.get('waypoints', [])
         mode = data.get('mode', 'driving')
         
+        # Only the fields the map needs; an optional zoom simplifies the polyline
+        try:
+            fields = MapsService.parse_fields(data.get('fields') or ['polyline', 'total_distance', 'total_duration'])
+            zoom = float(data['zoom']) if data.get('zoom') is not None else None
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
         print(f"DEBUG - Origin: {origin}")
         print(f"DEBUG - Destination: {destination}")
         print(f"DEBUG - Waypoints: {waypoints}")
@@ -272,11 +393,7 @@ def get_directions():
         if directions:
             return jsonify({
                 'success': True,
-                'directions': {
-                    'polyline': directions.get('polyline'),
-                    'total_distance': directions.get('total_distance'),
-                    'total_duration': directions.get('total_duration')
-                }
+                'directions': MapsService.project_directions(directions, fields, zoom)
             }), 200
         else:
             return jsonify({'success': False, 'error': 'Could not calculate directions'}), 400
@@ -284,48 +401,81 @@ def get_directions():
         print(f"Directions error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/maps/cache', methods=['GET'])
+def get_maps_cache_stats():
+    # Hit/miss counters for the maps caches and upstream latency per endpoint
+    try:
+        return jsonify({'success': True, **MapsService.cache_stats()}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/maps/cache', methods=['DELETE'])
+def clear_maps_cache():
+    # Drop cached directions, either one route (same body as /api/maps/directions) or all of them
+    try:
+        data = request.get_json(silent=True) or {}
+        origin = data.get('origin')
+        destination = data.get('destination')
+        
+        if origin and destination:
+            MapsService.invalidate_directions(origin, destination,
+                                              data.get('waypoints'), data.get('mode', 'driving'))
+        else:
+            MapsService.clear_directions_cache()
+        
+        return jsonify({'success': True, 'message': 'Directions cache cleared'}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # Budget API Routes (integrated from backend)
 @app.route('/api/budget/calculate', methods=['POST'])
 def calculate_budget():
     try:
-        sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
-        from services.pricing_service import PricingService
-        
         data = request.get_json()
         stops = data.get('stops', [])
         
-        result_stops = []
-        total_cost = 0
+        if not stops:
+            return jsonify({'success': False, 'error': 'No stops provided'}), 400
         
-        for stop in stops:
-            price = PricingService.calculate_stop_price(
-                stop.get('location', [0, 0])[0],
-                stop.get('location', [0, 0])[1],
-                stop.get('type', 'MISC'),
-                []
-            )
-            result_stops.append({
-                'location': stop.get('location'),
-                'type': stop.get('type'),
-                'estimated_price': price
-            })
-            total_cost += price
+        # Stops are priced concurrently with a per-request deadline
+        result = PricingService.calculate_trip_budget(stops, data.get('distances'))
         
-        return jsonify({
-            'success': True,
-            'stops': result_stops,
-            'total_cost': total_cost
-        }), 200
+        return jsonify(result), 200
     except Exception as e:
         print(f"Budget calculation error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Plan sessions: the map sends each marker change and gets route and budget back together
+@app.route('/api/plan/sessions', methods=['POST'])
+def create_plan_session():
+    try:
+        data = request.get_json(silent=True) or {}
+        result = PlanService.create_session(data.get('stops'), data.get('mode', 'driving'), data.get('zoom'))
+        status = result.pop('status', 200)
+        return jsonify(result), status
+    except Exception as e:
+        print(f"Plan session error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/plan/sessions/<session_id>', methods=['PATCH', 'DELETE'])
+def update_plan_session(session_id):
+    try:
+        if request.method == 'DELETE':
+            result = PlanService.delete_session(session_id)
+        else:
+            data = request.get_json(silent=True) or {}
+            # A single change can be sent on its own instead of in an ops list
+            ops = data.get('ops') if 'ops' in data else [data]
+            result = PlanService.apply_ops(session_id, ops, data.get('revision'), data.get('zoom'))
+        status = result.pop('status', 200)
+        return jsonify(result), status
+    except Exception as e:
+        print(f"Plan session error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/budget/default-price', methods=['GET'])
 def get_default_prices():
     try:
-        sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
-        from services.pricing_service import PricingService
-        
         prices = {}
         for stop_type in ['FOOD', 'REST', 'FUEL', 'ENTERTAINMENT', 'MISC']:
             prices[stop_type] = PricingService.get_default_price(stop_type)
@@ -363,78 +513,20 @@ def admin_login():
 
 @app.route('/api/admin/users', methods=['GET'])
 def get_all_users():
-    """Get all users with their trips for admin dashboard"""
+    """
+    Get users with their trips, streamed as JSON
+    
+    Query params: after_id and limit for keyset pagination (all users when
+    limit is omitted), email to filter by substring, min_trips to filter by
+    trip count.
+    """
     try:
-        conn = get_backend_db()
-        cursor = conn.cursor()
-        
-        # Get all users
-        users = cursor.execute('SELECT id, email FROM users ORDER BY id').fetchall()
-        
-        users_data = []
-        for user in users:
-            user_id = user['id']
-            user_email = user['email']
-            
-            # Get all trips for this user
-            trips = cursor.execute(
-                'SELECT id, name, description, image_url, created_at FROM trips WHERE user_id = ? ORDER BY created_at DESC',
-                (user_id,)
-            ).fetchall()
-            
-            trips_data = []
-            for trip in trips:
-                # Get stops for this trip
-                stops = cursor.execute(
-                    'SELECT latitude, longitude, stop_type, time_minutes, cost FROM stops WHERE trip_id = ? ORDER BY stop_order',
-                    (trip['id'],)
-                ).fetchall()
-                
-                trips_data.append({
-                    'trip_id': trip['id'],
-                    'name': trip['name'],
-                    'description': trip['description'] or '',
-                    'image_url': trip['image_url'] if 'image_url' in trip.keys() else '',
-                    'created_at': trip['created_at'],
-                    'stops': [
-                        {
-                            'latitude': s['latitude'],
-                            'longitude': s['longitude'],
-                            'type': s['stop_type'],
-                            'time': s['time_minutes'],
-                            'cost': s['cost']
-                        } for s in stops
-                    ],
-                    'total_cost': sum(s['cost'] for s in stops)
-                })
-            
-            users_data.append({
-                'user_id': user_id,
-                'email': user_email,
-                'trips': trips_data,
-                'trip_count': len(trips_data)
-            })
-        
-        conn.close()
-        
-        # Summary stats
-        total_users = len(users_data)
-        total_trips = sum(u['trip_count'] for u in users_data)
-        total_stops = sum(len(t['stops']) for u in users_data for t in u['trips'])
-        
-        print(f"Admin Dashboard: {total_users} users, {total_trips} trips, {total_stops} stops")
-        
-        return jsonify({
-            'users': users_data,
-            'stats': {
-                'total_users': total_users,
-                'total_trips': total_trips,
-                'total_stops': total_stops
-            }
-        }), 200
-    except Exception as e:
-        print(f"Admin users error: {e}")
-        return jsonify({'error': str(e)}), 500
+        options = AdminService.parse_query(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return Response(stream_with_context(AdminService.stream_users_json(**options)),
+                    mimetype='application/json')
 
 # Serve frontend
 @app.route('/')